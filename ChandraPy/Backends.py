@@ -0,0 +1,357 @@
+from ChandraPy import Events as ev
+from ChandraPy import Spatial as spatial
+from ChandraPy import Tracing as tracing
+from ChandraPy import Utilities as utils
+import contextlib
+import numpy as np
+import os
+
+class BackendUnavailable(RuntimeError):
+    """Raised when the selected backend can't run a step, such as reprocessing with the 'python' backend, which needs CIAO."""
+
+class CiaoBackend:
+    """Runs every step through the CIAO tools in 'ciao_contrib.runtool', each call a subprocess reading and writing files. It needs a CIAO
+       installation, and it's the only backend that can create source regions, reprocess and barycentre observations.
+    """
+
+    name = "ciao"
+
+    def environment(self):
+        """Returns a context manager giving the calls inside it their own CIAO parameter files."""
+
+        from ciao_contrib.runtool import new_pfiles_environment
+
+        return new_pfiles_environment()
+
+    def region_events(self, event_file, region_file, columns, filters, outfile):
+        """Returns the events inside a region file and the ranges in 'filters', by copying them to 'outfile' with 'dmcopy'.
+
+        Args:
+            event_file (str): Absolute path to event file.
+            region_file (str): Absolute path to region file.
+            columns (list): Names of the columns to be returned.
+            filters (dict): Dictionary mapping column names to inclusive (min, max) ranges.
+            outfile (str): Absolute path to the filtered event file.
+
+        Returns:
+            tuple(events, outfile): Tuple containing a dictionary of arrays of the events and the absolute path to the filtered event file.
+        """
+
+        from ciao_contrib.runtool import dmcopy
+
+        dmcopy.punlearn()
+        tracing.count("CIAO Calls")
+        dmcopy(infile = f"{event_file}[sky=region({region_file})]" + "".join(f"[{column}={low}:{high}]" for column, (low, high) in filters.items()), outfile = outfile, clobber = "yes")
+
+        return ev.read_events(outfile, columns), outfile
+
+    def sky_position(self, event_file):
+        """Returns the mean position of the events and its off-axis angle and azimuth, with 'dmstat' and 'dmcoords'.
+
+        Args:
+            event_file (str): Absolute path to event file.
+
+        Returns:
+            tuple(ra, dec, theta, phi): Tuple containing RA and Dec (deg), off-axis angle (arcmin) and azimuth (deg).
+        """
+
+        from ciao_contrib.runtool import dmcoords, dmstat
+
+        tracing.count("CIAO Calls")
+        dmstat(infile = f"{event_file}[cols ra,dec]")
+        ra, dec = dmstat.out_mean.split(",")[:2]
+        tracing.count("CIAO Calls")
+        dmcoords(infile = f"{event_file}", option = "cel", ra = ra, dec = dec)
+
+        return float(ra), float(dec), float(dmcoords.theta), float(dmcoords.phi)
+
+    def edit_header(self, file, key, value):
+        """Adds or replaces a keyword in the header of the first table of a file with 'dmhedit'.
+
+        Args:
+            file (str): Absolute path to file.
+            key (str): Name of keyword.
+            value (str/int/float): Value of keyword.
+        """
+
+        from ciao_contrib.runtool import dmhedit
+
+        tracing.count("CIAO Calls")
+        dmhedit(infile = file, operation = "add", key = key, value = value)
+
+    def psf_radius(self, event_file, ra, dec, outfile):
+        """Returns the radius enclosing half of the PSF at a position with 'psfsize_srcs'.
+
+        Args:
+            event_file (str): Absolute path to event file.
+            ra (str): RA in sexagecimal format (hh:mm:ss.s).
+            dec (str): Dec in sexagecimal format with sign (+dd:mm:ss.s).
+            outfile (str): Absolute path to the intermediate table, which is removed.
+
+        Returns:
+            float: Radius (pixels).
+        """
+
+        from astropy.io import fits
+        from ciao_contrib.runtool import psfsize_srcs
+
+        psfsize_srcs.punlearn()
+        tracing.count("CIAO Calls")
+        psfsize_srcs(infile = event_file, pos = f"{ra} {dec}", outfile = outfile, ecf = 0.5, clobber = "yes", verbose = 0)
+        with fits.open(outfile) as hdul:
+            radius = float(hdul[1].data["R"])
+        os.remove(outfile)
+
+        return radius
+
+    def make_region(self, event_file, shape, region_file):
+        """Converts a region in celestial coordinates to physical coordinates with 'dmmakereg', saving it as a CIAO ASCII region file.
+
+        Args:
+            event_file (str): Absolute path to event file, whose WCS is used.
+            shape (str): Region such as 'circle(hh:mm:ss,+dd:mm:ss,radius)'.
+            region_file (str): Absolute path to region file.
+        """
+
+        from ciao_contrib.runtool import dmmakereg
+
+        dmmakereg.punlearn()
+        tracing.count("CIAO Calls")
+        dmmakereg(region = shape, outfile = region_file, kernel = "ascii", wcsfile = event_file, verbose = 0, clobber = "yes")
+
+    def find_obsids(self, source, radius = None, detailed = False):
+        """Returns the table of Obs. IDs covering a source from 'find_chandra_obsid'.
+
+        Args:
+            source (str): Name of the source, or its position as 'ra dec'.
+            radius (int/float, optional): Search radius (arcmin). Defaults to None, in which case the default of 'find_chandra_obsid' is used.
+            detailed (bool, optional): Whether the table also has the pointing and roll of each observation. Defaults to False.
+
+        Returns:
+            str: Table printed by 'find_chandra_obsid'.
+        """
+
+        from ciao_contrib.runtool import find_chandra_obsid
+
+        find_chandra_obsid.punlearn()
+        tracing.count("CIAO Calls")
+        if radius is None:
+            return find_chandra_obsid(source, detailed = detailed)
+        return find_chandra_obsid(source, radius = radius, detailed = detailed)
+
+    def reprocess(self, obs_dir):
+        """Reprocesses a downloaded Obs. ID with 'chandra_repro' into '{obs_dir}/repro'.
+
+        Args:
+            obs_dir (str): Absolute path to the directory of the Obs. ID.
+        """
+
+        from ciao_contrib.runtool import chandra_repro
+
+        tracing.count("CIAO Calls")
+        chandra_repro(obs_dir, clobber = "yes")
+
+    def barycenter(self, infile, orbit_file, outfile, ra, dec):
+        """Applies the barycentric correction to a file with 'axbary'.
+
+        Args:
+            infile (str): Absolute path to file to be corrected.
+            orbit_file (str): Absolute path to orbit ephemeris file.
+            outfile (str): Absolute path to corrected file.
+            ra (float): RA of the target (deg).
+            dec (float): Dec of the target (deg).
+        """
+
+        from ciao_contrib.runtool import axbary
+
+        axbary.punlearn()
+        tracing.count("CIAO Calls")
+        axbary(infile = infile, orbitfile = orbit_file, outfile = outfile, ra = ra, dec = dec, clobber = "yes")
+
+def _sexagecimal(value, hours = False):
+    parts = [float(part) for part in value.split(":")]
+    degrees = abs(parts[0]) + parts[1] / 60 + parts[2] / 3600
+
+    return (-1 if value.strip().startswith("-") else 1) * degrees * (15 if hours else 1)
+
+def _sky_wcs(event_file):
+    #Tangent plane WCS of the x and y columns, as ((crpix, cdelt, crval) of x, (crpix, cdelt, crval) of y), and the headers holding the pointing
+    from astropy.io import fits
+
+    with fits.open(event_file) as hdul:
+        header = hdul["EVENTS"].header
+        primary = hdul[0].header
+    names = {header[key].lower(): key[5:] for key in header if key.startswith("TTYPE")}
+    wcs = tuple((header[f"TCRPX{names[column]}"], header[f"TCDLT{names[column]}"], header[f"TCRVL{names[column]}"]) for column in ["x", "y"])
+
+    return wcs, header, primary
+
+def _off_axis(header, primary, ra, dec):
+    #Off-axis angle and azimuth (radians, deg) of a position (radians) from the pointing and roll
+    keyword = lambda name: float(header.get(name, primary.get(name)))
+    ra_pnt, dec_pnt = np.radians([keyword("RA_PNT"), keyword("DEC_PNT")])
+    theta = np.arccos(np.clip(np.sin(dec) * np.sin(dec_pnt) + np.cos(dec) * np.cos(dec_pnt) * np.cos(ra - ra_pnt), -1, 1))
+    position_angle = np.arctan2(np.sin(ra - ra_pnt), np.cos(dec_pnt) * np.tan(dec) - np.sin(dec_pnt) * np.cos(ra - ra_pnt))
+
+    return theta, (np.degrees(position_angle) - keyword("ROLL_PNT")) % 360
+
+def _sky_to_world(wcs, x, y):
+    #Sky pixels to RA and Dec (radians) through the tangent plane projection
+    (x_crpix, x_cdelt, ra_0), (y_crpix, y_cdelt, dec_0) = wcs
+    xi, eta = np.radians((x - x_crpix) * x_cdelt), np.radians((y - y_crpix) * y_cdelt)
+    ra_0, dec_0 = np.radians([ra_0, dec_0])
+    denominator = np.cos(dec_0) - eta * np.sin(dec_0)
+
+    return ra_0 + np.arctan2(xi, denominator), np.arctan2(np.sin(dec_0) + eta * np.cos(dec_0), np.hypot(xi, denominator))
+
+def _world_to_sky(wcs, ra, dec):
+    #RA and Dec (radians) to sky pixels, the inverse of '_sky_to_world'
+    (x_crpix, x_cdelt, ra_0), (y_crpix, y_cdelt, dec_0) = wcs
+    ra_0, dec_0 = np.radians([ra_0, dec_0])
+    cos_c = np.sin(dec_0) * np.sin(dec) + np.cos(dec_0) * np.cos(dec) * np.cos(ra - ra_0)
+    xi = np.cos(dec) * np.sin(ra - ra_0) / cos_c
+    eta = (np.cos(dec_0) * np.sin(dec) - np.sin(dec_0) * np.cos(dec) * np.cos(ra - ra_0)) / cos_c
+
+    return x_crpix + np.degrees(xi) / x_cdelt, y_crpix + np.degrees(eta) / y_cdelt
+
+class PythonBackend(CiaoBackend):
+    """Runs header reads, region creation and filtering in-process with astropy and NumPy, without subprocesses
+       or intermediate files. PSF sizes are approximated from the off-axis angle rather than taken from CIAO's calibration data. Steps that
+       can't run without CIAO (finding Obs. IDs in the archive, reprocessing and barycentring) raise BackendUnavailable.
+    """
+
+    name = "python"
+
+    def environment(self):
+        """Returns a context manager that does nothing, since no parameter files are used."""
+
+        return contextlib.nullcontext()
+
+    def region_events(self, event_file, region_file, columns, filters, outfile):
+        """Returns the events inside the circle of a region file and the ranges in 'filters', through the sky index of the event file.
+
+        Args:
+            event_file (str): Absolute path to event file.
+            region_file (str): Absolute path to region file.
+            columns (list): Names of the columns to be returned.
+            filters (dict): Dictionary mapping column names to inclusive (min, max) ranges.
+            outfile (str): Unused, no filtered event file is written.
+
+        Returns:
+            tuple(events, outfile): Tuple containing a dictionary of arrays of the events and None.
+        """
+
+        return spatial.extract_circles(event_file, [utils.read_region(region_file)], columns, filters)[0], None
+
+    def sky_position(self, event_file):
+        """Returns the mean position of the events and its off-axis angle and azimuth. The sky pixels are converted to RA and Dec with the
+           tangent plane WCS of the x and y columns. The off-axis angle and azimuth are measured from the pointing ('RA_PNT', 'DEC_PNT') and
+           roll ('ROLL_PNT') rather than from the optical axis, so they can differ from 'dmcoords' by a fraction of an arcminute.
+
+        Args:
+            event_file (str): Absolute path to event file.
+
+        Returns:
+            tuple(ra, dec, theta, phi): Tuple containing RA and Dec (deg), off-axis angle (arcmin) and azimuth (deg).
+        """
+
+        statistics = ev.column_statistics(event_file, ["x", "y"])
+        wcs, header, primary = _sky_wcs(event_file)
+        ra, dec = _sky_to_world(wcs, statistics["x"]["mean"], statistics["y"]["mean"])
+        theta, phi = _off_axis(header, primary, ra, dec)
+
+        return float(np.degrees(ra) % 360), float(np.degrees(dec)), float(np.degrees(theta) * 60), float(phi)
+
+    def edit_header(self, file, key, value):
+        """Adds or replaces a keyword in the header of the first table of a file.
+
+        Args:
+            file (str): Absolute path to file.
+            key (str): Name of keyword.
+            value (str/int/float): Value of keyword.
+        """
+
+        from astropy.io import fits
+
+        fits.setval(file, key, value = value, ext = 1)
+
+    def psf_radius(self, event_file, ra, dec, outfile):
+        """Returns an approximation of the radius enclosing half of the PSF at a position. The PSF is taken to grow with the square of the
+           off-axis angle, from 0.5" on-axis to 5.5" at 10', roughly as the 1.5 keV PSF of 'psfsize_srcs' does, which can differ by an
+           arcsecond or so. The off-axis angle is measured from the pointing, as in 'sky_position'.
+
+        Args:
+            event_file (str): Absolute path to event file.
+            ra (str): RA in sexagecimal format (hh:mm:ss.s).
+            dec (str): Dec in sexagecimal format with sign (+dd:mm:ss.s).
+            outfile (str): Unused, no intermediate table is written.
+
+        Returns:
+            float: Radius (pixels).
+        """
+
+        wcs, header, primary = _sky_wcs(event_file)
+        theta, _ = _off_axis(header, primary, np.radians(_sexagecimal(ra, hours = True)), np.radians(_sexagecimal(dec)))
+        radius = 0.5 + 5 * (np.degrees(theta) * 6) ** 2
+
+        return float(radius / (abs(wcs[0][1]) * 3600))
+
+    def make_region(self, event_file, shape, region_file):
+        """Converts a circle in celestial coordinates to physical coordinates with the tangent plane WCS of the x and y columns, saving it as
+           a CIAO ASCII region file like 'dmmakereg' does.
+
+        Args:
+            event_file (str): Absolute path to event file, whose WCS is used.
+            shape (str): Region such as 'circle(hh:mm:ss,+dd:mm:ss,radius)', with the radius in physical pixels.
+            region_file (str): Absolute path to region file.
+        """
+
+        name, arguments = shape.strip().rstrip(")").split("(")
+        if name.lower() != "circle":
+            raise ValueError(f"Only circles can be converted by the 'python' backend, got {shape}")
+        ra, dec, radius = arguments.split(",")
+        wcs, _, _ = _sky_wcs(event_file)
+        x, y = _world_to_sky(wcs, np.radians(_sexagecimal(ra, hours = True)), np.radians(_sexagecimal(dec)))
+        with open(region_file, "w") as file:
+            file.write("# Region file format: CIAO version 1.0\n")
+            file.write(f"circle({x:.8g},{y:.8g},{float(radius):.8g})\n")
+
+    def find_obsids(self, source, radius = None, detailed = False):
+        raise BackendUnavailable("Finding Obs. IDs needs the 'ciao' backend, or an offline catalog ('Catalog.import_observations')")
+
+    def reprocess(self, obs_dir):
+        raise BackendUnavailable("Reprocessing needs the 'ciao' backend")
+
+    def barycenter(self, infile, orbit_file, outfile, ra, dec):
+        raise BackendUnavailable("Barycentring needs the 'ciao' backend")
+
+backends = {"ciao": CiaoBackend, "python": PythonBackend}
+_active = os.environ.get("CHANDRAPY_BACKEND", "ciao")
+
+def set_backend(name):
+    """Selects the backend used from now on in this process. Batch functions take a 'backend' argument and set it in each worker.
+
+    Args:
+        name (str): Name of the backend, 'ciao' or 'python'.
+    """
+
+    global _active
+    if name not in backends:
+        raise ValueError(f"Unknown backend {name}, expected one of {', '.join(backends)}")
+    _active = name
+
+def get_backend(name = None):
+    """Returns a backend. The default is 'ciao', or the value of the environment variable 'CHANDRAPY_BACKEND'.
+
+    Args:
+        name (str, optional): Name of the backend, 'ciao' or 'python'. Defaults to None, in which case the one selected with 'set_backend' is returned.
+
+    Returns:
+        CiaoBackend/PythonBackend: The backend.
+    """
+
+    name = name or _active
+    if name not in backends:
+        raise ValueError(f"Unknown backend {name}, expected one of {', '.join(backends)}")
+
+    return backends[name]()
@@ -0,0 +1,494 @@
+from ChandraPy import Backends as backends
+from ChandraPy import Download as d
+from ChandraPy import Lightcurves as lc
+from ChandraPy import Manifest as manifest
+from ChandraPy import Store as store
+from ChandraPy import Tracing as tracing
+from ChandraPy import Utilities as utils
+import concurrent.futures
+import multiprocessing
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+import time
+import traceback
+
+#Resolved before any job points the temporary directory at its own scratch directory, so later jobs in the same worker don't nest inside a removed one
+_system_tempdir = tempfile.gettempdir()
+
+def _isolated_scratch(scratch_dir, prefix):
+    """Creates a scratch directory for one job and points this process' temporary files and CIAO work path at it.
+
+    Args:
+        scratch_dir (str): Absolute path to the directory under which scratch directories are created. If None, the system temporary directory is used.
+        prefix (str): Prefix of the scratch directory name.
+
+    Returns:
+        str: Absolute path to the scratch directory.
+    """
+
+    scratch = tempfile.mkdtemp(prefix = prefix, dir = scratch_dir or _system_tempdir)
+    os.environ["ASCDS_WORK_PATH"] = scratch
+    os.environ["TMPDIR"] = scratch
+    tempfile.tempdir = scratch
+
+    return scratch
+
+def download_job(data_dir, obs_id, scratch_dir = None, event_store = False, trace = False):
+    """Downloads and reprocesses one Obs. ID inside its own parameter file environment and scratch directory. Runs inside a worker process.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        scratch_dir (str, optional): Absolute path to the directory under which scratch directories are created. Defaults to None.
+        event_store (bool, optional): Whether to also write a columnar copy of the event file. Defaults to False.
+        trace (bool, optional): Whether to record the job's stages with 'Tracing' and return them. Defaults to False.
+
+    Returns:
+        dict: Dictionary with keys 'Observation ID', 'Status' ('Done'/'Error'), 'Error', 'Elapsed' (s) and, if traced, 'Trace' (list of stage records).
+    """
+
+    obs_id = str(obs_id)
+    start = time.time()
+    scratch = _isolated_scratch(scratch_dir, f"{obs_id}_")
+    result = {"Observation ID": obs_id, "Status": "Done", "Error": "", "Elapsed": 0.}
+    if trace:
+        tracing.enable()
+
+    try:
+        with tracing.job(obs_id), backends.get_backend("ciao").environment():
+            d.download_and_reprocess_obsid(data_dir, obs_id, event_store)
+    except Exception:
+        result["Status"] = "Error"
+        result["Error"] = traceback.format_exc()
+    finally:
+        shutil.rmtree(scratch, ignore_errors = True)
+
+    result["Elapsed"] = time.time() - start
+    if trace:
+        result["Trace"] = tracing.disable()
+
+    return result
+
+def stage_job(data_dir, obs_id, stage, scratch_dir = None, event_store = False, trace = False):
+    """Runs one download/reprocessing stage of an Obs. ID inside its own parameter file environment and scratch directory. Runs inside a worker process.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        stage (str): Name of the stage, one of 'Download.stages'.
+        scratch_dir (str, optional): Absolute path to the directory under which scratch directories are created. Defaults to None.
+        event_store (bool, optional): Whether the 'tidy' stage also writes the columnar event store. Defaults to False.
+        trace (bool, optional): Whether to record the stage with 'Tracing'. Defaults to False.
+
+    Returns:
+        list: Stage records of the job if it was traced, otherwise an empty list.
+    """
+
+    scratch = _isolated_scratch(scratch_dir, f"{obs_id}_{stage}_")
+    if trace:
+        tracing.enable()
+    try:
+        with backends.get_backend("ciao").environment():
+            d.run_stage(data_dir, obs_id, stage, event_store)
+    finally:
+        shutil.rmtree(scratch, ignore_errors = True)
+
+    return tracing.disable() if trace else []
+
+def download_pipeline(data_dir, obs_ids, fetch_workers = 4, repro_workers = None, barycenter_workers = None, scratch_dir = None, event_store = False, callback = None):
+    """Downloads and reprocesses a list of Obs. IDs as a pipeline of stages ('Download.stages'), each with its own pool of workers, so
+       downloads of later Obs. IDs overlap with the reprocessing of earlier ones. Every Obs. ID records its progress in a state file, and
+       Obs. IDs from an interrupted run resume at the first stage they didn't complete. Completed Obs. IDs are skipped. While tracing is
+       enabled with 'Tracing.enable', the stages run by the workers are added to the trace.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_ids (list): List of Obs. IDs.
+        fetch_workers (int, optional): Number of simultaneous downloads. Defaults to 4.
+        repro_workers (int, optional): Number of worker processes running chandra_repro. Defaults to None, in which case the number of CPUs is used.
+        barycenter_workers (int, optional): Number of worker processes running axbary. Defaults to None, in which case the number of CPUs is used.
+        scratch_dir (str, optional): Absolute path to the directory under which scratch directories are created. Defaults to None, in which case the system temporary directory is used.
+        event_store (bool, optional): Whether to also write a columnar copy of each event file. Defaults to False.
+        callback (callable, optional): Function called with each Obs. ID's result dictionary as soon as it finishes, for example to print progress. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with one row per Obs. ID and columns 'Observation ID', 'Status' ('Done'/'Error'), 'Stage' (stage that failed, if any), 'Error' and 'Elapsed' (s), in the order of 'obs_ids'.
+    """
+
+    obs_ids = list(dict.fromkeys(str(obs_id) for obs_id in obs_ids))
+    os.makedirs(data_dir, exist_ok = True)
+    results = {}
+    started = {}
+
+    #Workers are started from a server process, forking this one while download threads run can deadlock them
+    context = multiprocessing.get_context("forkserver")
+    #Workers are forked from a server that has already imported ChandraPy, instead of each importing it again
+    context.set_forkserver_preload(["ChandraPy.Batch"])
+    fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers = fetch_workers)
+    repro_pool = concurrent.futures.ProcessPoolExecutor(max_workers = repro_workers or os.cpu_count(), mp_context = context)
+    barycenter_pool = concurrent.futures.ProcessPoolExecutor(max_workers = barycenter_workers or os.cpu_count(), mp_context = context)
+    #Downloads and tidying don't call CIAO tools, so they run in threads of this process
+    pools = {"fetch": fetch_pool, "repro": repro_pool, "barycenter": barycenter_pool, "tidy": fetch_pool}
+
+    def submit(obs_id, stage):
+        if stage in ("fetch", "tidy"):
+            return pools[stage].submit(d.run_stage, data_dir, obs_id, stage, event_store)
+        return pools[stage].submit(stage_job, data_dir, obs_id, stage, scratch_dir, event_store, tracing.enabled())
+
+    def finish(obs_id, status, stage = "", error = ""):
+        results[obs_id] = {"Observation ID": obs_id, "Status": status, "Stage": stage, "Error": error, "Elapsed": time.time() - started[obs_id]}
+        if callback is not None:
+            callback(results[obs_id])
+
+    try:
+        running = {}
+        for obs_id in obs_ids:
+            started[obs_id] = time.time()
+            stage = d.next_stage(data_dir, obs_id)
+            if stage is None:
+                finish(obs_id, "Done")
+            else:
+                running[submit(obs_id, stage)] = (obs_id, stage)
+
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                obs_id, stage = running.pop(future)
+                try:
+                    tracing.extend(future.result())
+                except Exception:
+                    finish(obs_id, "Error", stage, traceback.format_exc())
+                    continue
+                stage = d.next_stage(data_dir, obs_id)
+                if stage is None:
+                    finish(obs_id, "Done")
+                else:
+                    running[submit(obs_id, stage)] = (obs_id, stage)
+    finally:
+        for pool in (fetch_pool, repro_pool, barycenter_pool):
+            pool.shutdown()
+
+    return pd.DataFrame([results[obs_id] for obs_id in obs_ids], columns = ["Observation ID", "Status", "Stage", "Error", "Elapsed"])
+
+def lightcurve_job(source, obs_id, data_dir, output_dir, binsize, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, scratch_dir = None, remove_failed = True, image_format = "svg", dpi = None, render = True, lightcurve_store = True, backend = None, trace = False, incremental = False, previous = None):
+    """Creates the region file and light curves of one source in one Obs. ID inside its own working directory, parameter file environment
+       and scratch directory. Runs inside a worker process. With 'incremental', only the stages from 'Manifest.stale_stages' run, starting
+       from the computed result the last run saved as '{source}_{Obs. ID}_state.pkl', so for example a new likelihood threshold only merges
+       the Bayesian Blocks again and redraws the figure.
+
+    Args:
+        source (str): Name of source in J2000 sexagecimal format.
+        obs_id (str): The Obs. ID Number.
+        data_dir (str): Absolute path to directory where data is saved in directories named by Obs. ID.
+        output_dir (str): Absolute path to directory where the outputs are saved in '{output_dir}/{source}/{Obs. ID}'.
+        binsize (int/float): Size of bins (s).
+        p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
+        seed (int, optional): Seed used by numpy to space out events within frame readout times. Defaults to 1.
+        scratch_dir (str, optional): Absolute path to the directory under which scratch directories are created. Defaults to None.
+        remove_failed (bool, optional): Whether to remove the working directory of jobs that are empty or fail. Defaults to True.
+        image_format (str, optional): Format of the saved figure ('svg', 'png', etc.). Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+        render (bool/str, optional): True to draw the figure in the job, False to only save the CSV files, or 'deferred' to save the computed
+                                     result with 'Lightcurves.save_result' for 'render_job' to draw later. Defaults to True.
+        lightcurve_store (bool, optional): Whether to also append the light curves to the source's store from 'Store.store_path'. Defaults to True.
+        backend (str, optional): Name of the backend from 'Backends.backends' used by the job. Defaults to None, in which case the worker's current backend is kept.
+        trace (bool, optional): Whether to record the job's stages with 'Tracing' and return them. Defaults to False.
+        incremental (bool, optional): Whether to only run the stages invalidated since the last run. Defaults to False.
+        previous (dict, optional): Entry of the Obs. ID in the source's manifest from 'Manifest.read_manifest', None if it wasn't processed before. Defaults to None.
+
+    Returns:
+        dict: Dictionary with keys 'Source', 'Observation ID', 'Status' ('Done'/'Unchanged'/'Empty'/'Error'), 'Error', 'Elapsed' (s), 'Result File' (path of the saved result, or None),
+              if incremental, 'Manifest' (the Obs. ID's new manifest entry, None if it failed) and, if traced, 'Trace' (list of stage records).
+    """
+
+    obs_id = str(obs_id)
+    start = time.time()
+    obs_dir = os.path.join(output_dir, source, obs_id)
+    obs_data_dir = os.path.join(data_dir, obs_id)
+    os.makedirs(obs_dir, exist_ok = True)
+    scratch = _isolated_scratch(scratch_dir, f"{source}_{obs_id}_")
+    result = {"Source": source, "Observation ID": obs_id, "Status": "Done", "Error": "", "Elapsed": 0., "Result File": None}
+    if trace:
+        tracing.enable()
+
+    if incremental:
+        with tracing.stage("manifest"):
+            inputs = manifest.job_inputs(os.path.join(obs_data_dir, f"{obs_id}_evt2.fits"), source, binsize, p0, likelihood_threshold, seed, image_format, dpi, previous)
+            stale = manifest.stale_stages(previous, inputs, obs_dir, render)
+        entry = {"Status": "Done", "Inputs": inputs, "Stages": dict((previous or {}).get("Stages", {}))}
+    else:
+        stale = list(manifest.stages)
+    state_file = os.path.join(obs_dir, f"{source}_{obs_id}_state.pkl")
+
+    try:
+        if backend is not None:
+            backends.set_backend(backend)
+        with tracing.job(f"{source}/{obs_id}"):
+            computed = None
+            with backends.get_backend().environment():
+                if "region" in stale:
+                    utils.save_source_region(obs_dir, obs_data_dir, source)
+                if stale and "compute" not in stale:
+                    computed = lc.load_result(state_file)
+                    if not hasattr(computed, "off_axis_angle"):
+                        #Results saved before the off-axis angle was kept can't be rendered on their own, so they're computed again
+                        stale = manifest.stages[manifest.stages.index("compute"):len(manifest.stages) if "render" in stale else -1]
+                if "compute" in stale:
+                    computed = lc.compute_lightcurves(obs_dir, obs_data_dir, source, binsize, p0, likelihood_threshold, seed)
+                    if computed is None:
+                        result["Status"] = "Empty"
+                elif "merge" in stale:
+                    lc.merge_lightcurve_blocks(computed, likelihood_threshold)
+            if not stale:
+                result["Status"] = "Unchanged"
+            elif computed is not None:
+                if lightcurve_store and ("compute" in stale or "merge" in stale):
+                    with tracing.stage("store.append"):
+                        store.append_result(store.store_path(output_dir, source), computed)
+                if incremental:
+                    lc.save_result(computed, state_file)
+                if render == "deferred":
+                    result["Result File"] = lc.save_result(computed)
+                elif render:
+                    lc.render_lightcurves(computed, image_format, dpi)
+    except Exception:
+        result["Status"] = "Error"
+        result["Error"] = traceback.format_exc()
+    finally:
+        shutil.rmtree(scratch, ignore_errors = True)
+
+    if incremental:
+        #Outputs are recorded relative to the Obs. ID directory, for the stages that ran, the others keep what they recorded before
+        outputs = {"region": [f"{source}_{obs_id}.reg"],
+                   "compute": [f"{source}_{obs_id}.csv", f"{source}_{obs_id}_state.pkl"] + ([f"{source}_{obs_id}_hr.csv"] if computed is not None and computed.hardness is not None else []),
+                   "merge": [f"{source}_{obs_id}_bb.csv"],
+                   "render": [f"{source}_{obs_id}.{image_format}"]
+                   }
+        entry["Stages"].update({stage: outputs[stage] for stage in stale})
+        if result["Status"] == "Empty":
+            entry = {"Status": "Empty", "Inputs": inputs, "Stages": {}}
+        elif result["Status"] == "Unchanged":
+            entry = dict(previous, Inputs = inputs)
+        result["Manifest"] = entry if result["Status"] != "Error" else None
+
+    if result["Status"] in ("Empty", "Error") and remove_failed:
+        shutil.rmtree(obs_dir, ignore_errors = True)
+
+    result["Elapsed"] = time.time() - start
+    if trace:
+        result["Trace"] = tracing.disable()
+
+    return result
+
+def render_job(result_file, image_format = "svg", dpi = None, remove_result = True, backend = None, trace = False):
+    """Draws the light curve figure of a result saved by 'Lightcurves.save_result'. Runs inside a worker process.
+
+    Args:
+        result_file (str): Absolute path to the saved result.
+        image_format (str, optional): Format of the saved figure ('svg', 'png', etc.). Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+        remove_result (bool, optional): Whether to remove the saved result once the figure is drawn. Defaults to True.
+        backend (str, optional): Name of the backend from 'Backends.backends' used by the job. Defaults to None, in which case the worker's current backend is kept.
+        trace (bool, optional): Whether to record the job's stages with 'Tracing' and return them. Defaults to False.
+
+    Returns:
+        dict: Dictionary with keys 'Result File', 'Status' ('Done'/'Error'), 'Error', 'Elapsed' (s) and, if traced, 'Trace' (list of stage records).
+    """
+
+    start = time.time()
+    result = {"Result File": result_file, "Status": "Done", "Error": "", "Elapsed": 0.}
+    if trace:
+        tracing.enable()
+
+    try:
+        if backend is not None:
+            backends.set_backend(backend)
+        #Named like the job that computed the result, so its rendering is counted with it
+        label = "/".join(os.path.basename(result_file).rsplit("_result", 1)[0].rsplit("_", 1))
+        with tracing.job(label), backends.get_backend().environment():
+            lc.render_lightcurves(result_file, image_format, dpi)
+        if remove_result:
+            os.remove(result_file)
+    except Exception:
+        result["Status"] = "Error"
+        result["Error"] = traceback.format_exc()
+
+    result["Elapsed"] = time.time() - start
+    if trace:
+        result["Trace"] = tracing.disable()
+
+    return result
+
+def render_batch(result_files, image_format = "svg", dpi = None, max_workers = None, remove_results = True, callback = None, backend = None):
+    """Draws the light curve figures of results saved by 'Lightcurves.save_result' in a pool of worker processes, for example after a
+       'run_batch' with render = 'deferred' once the CSV files have been checked. While tracing is enabled with 'Tracing.enable', the stages
+       run by the workers are added to the trace.
+
+    Args:
+        result_files (list): Absolute paths to the saved results.
+        image_format (str, optional): Format of the saved figures ('svg', 'png', etc.). Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+        max_workers (int, optional): Number of worker processes. Defaults to None, in which case the number of CPUs is used.
+        remove_results (bool, optional): Whether to remove each saved result once its figure is drawn. Defaults to True.
+        callback (callable, optional): Function called with each result dictionary as soon as it finishes. Defaults to None.
+        backend (str, optional): Name of the backend from 'Backends.backends' used by the workers. Defaults to None, in which case the current one is used.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with one row per result file and columns 'Result File', 'Status', 'Error' and 'Elapsed', in the order of 'result_files'.
+    """
+
+    result_files = list(result_files)
+    results = [None] * len(result_files)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(render_job, result_file, image_format, dpi, remove_results, backend or backends.get_backend().name, tracing.enabled()): i for i, result_file in enumerate(result_files)}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+                tracing.extend(results[i].pop("Trace", None))
+            except Exception:
+                results[i] = {"Result File": result_files[i], "Status": "Error", "Error": traceback.format_exc(), "Elapsed": 0.}
+            if callback is not None:
+                callback(results[i])
+
+    return pd.DataFrame(results, columns = ["Result File", "Status", "Error", "Elapsed"])
+
+def run_batch(jobs, data_dir, output_dir, binsize, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, max_workers = None, scratch_dir = None, download = True, remove_failed = True, callback = None, event_store = False, image_format = "svg", dpi = None, render = True, render_workers = None, lightcurve_store = True, backend = None, trace_file = None, incremental = False):
+    """Generates light curves for a list of (source, Obs. ID) jobs in a pool of worker processes. Every job works in its own output directory,
+       CIAO parameter file environment and scratch directory, so jobs don't interfere with each other. Missing Obs. IDs are downloaded first,
+       once each through 'download_pipeline', even if several jobs share them. With 'incremental', every source's manifest ('Manifest.read_manifest')
+       records what each Obs. ID was processed from, so rerunning a batch skips the Obs. IDs whose event file and parameters are unchanged,
+       and only runs the stages a change invalidates for the others.
+
+    Args:
+        jobs (list): List of tuples (source, Obs. ID), with sources in J2000 sexagecimal format.
+        data_dir (str): Absolute path to directory where data is saved in directories named by Obs. ID, such as '{main_data_dir}/{galaxy}'.
+        output_dir (str): Absolute path to directory where the outputs are saved in '{output_dir}/{source}/{Obs. ID}'.
+        binsize (int/float): Size of bins (s).
+        p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
+        seed (int, optional): Seed used by numpy to space out events within frame readout times. Defaults to 1.
+        max_workers (int, optional): Number of worker processes. Defaults to None, in which case the number of CPUs is used.
+        scratch_dir (str, optional): Absolute path to the directory under which scratch directories are created. Defaults to None, in which case the system temporary directory is used.
+        download (bool, optional): Whether to download and reprocess Obs. IDs whose event file is missing. Defaults to True.
+        remove_failed (bool, optional): Whether to remove the output directory of jobs that are empty or fail. Defaults to True.
+        callback (callable, optional): Function called with each job's result dictionary as soon as it finishes, for example to print progress. Defaults to None.
+        event_store (bool, optional): Whether downloaded Obs. IDs also get a columnar copy of the event file, which the jobs then extract from without CIAO. Defaults to False.
+        image_format (str, optional): Format of the saved figures, a raster format such as 'png' is recommended for large batches. Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+        render (bool/str, optional): True to draw figures in the jobs, False to only save the CSV files, or 'deferred' to draw them in a
+                                     separate pool of 'render_workers' processes while later jobs are still computing. Defaults to True.
+        render_workers (int, optional): Number of worker processes drawing figures when render is 'deferred'. Defaults to None, in which case 'max_workers' is used.
+        lightcurve_store (bool, optional): Whether to also append the light curves of every source to its store from 'Store.store_path', which
+                                           is compacted once the batch is done. Defaults to True.
+        backend (str, optional): Name of the backend from 'Backends.backends' used by the jobs, 'ciao' or 'python'. Defaults to None, in which case the current one is used.
+        trace_file (str, optional): Absolute path to a JSON file where the timings of every stage of every job are written in the Chrome trace
+                                    event format, see 'Tracing.write_trace' and 'Tracing.summary'. Defaults to None, in which case the
+                                    batch is only traced if tracing was already enabled with 'Tracing.enable'.
+        incremental (bool, optional): Whether to skip the Obs. IDs and stages that are up to date with the source's manifest, and update it. Jobs
+                                      that are skipped have status 'Unchanged'. Defaults to False.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with one row per job and columns 'Source', 'Observation ID', 'Status', 'Error' and 'Elapsed', in the order of 'jobs'.
+    """
+
+    jobs = [(source, str(obs_id)) for source, obs_id in jobs]
+    backend = backend or backends.get_backend().name
+    if trace_file is not None:
+        tracing.enable()
+    trace = tracing.enabled()
+    max_workers = max_workers or os.cpu_count()
+    os.makedirs(data_dir, exist_ok = True)
+    results = [None] * len(jobs)
+
+    failed_downloads = {}
+    if download:
+        missing = sorted({obs_id for _, obs_id in jobs if d.next_stage(data_dir, obs_id) is not None})
+        if missing:
+            downloads = download_pipeline(data_dir, missing, repro_workers = max_workers, barycenter_workers = max_workers, scratch_dir = scratch_dir, event_store = event_store)
+            for _, download_result in downloads[downloads["Status"] != "Done"].iterrows():
+                failed_downloads[download_result["Observation ID"]] = download_result["Error"]
+
+    manifests = {source: manifest.read_manifest(output_dir, source) for source in {source for source, _ in jobs}} if incremental else {}
+
+    def record(i, entry):
+        #Only the parent writes manifests, so jobs of the same source don't race on the file
+        source, obs_id = jobs[i]
+        if entry is None:
+            manifests[source].pop(obs_id, None)
+        else:
+            manifests[source][obs_id] = entry
+        manifest.write_manifest(output_dir, source, manifests[source])
+
+    def finish(i):
+        results[i].pop("Result File", None)
+        if callback is not None:
+            callback(results[i])
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor, \
+         concurrent.futures.ProcessPoolExecutor(max_workers = render_workers or max_workers) as render_executor:
+        futures = {}
+        render_futures = {}
+        for i, (source, obs_id) in enumerate(jobs):
+            if obs_id in failed_downloads:
+                results[i] = {"Source": source, "Observation ID": obs_id, "Status": "Error", "Error": failed_downloads[obs_id], "Elapsed": 0.}
+                finish(i)
+                continue
+            previous = manifests[source].get(obs_id) if incremental else None
+            if previous is not None:
+                #Checked without hashing the event file, a job whose file looks modified hashes it and may still find it unchanged
+                inputs = manifest.job_inputs(os.path.join(data_dir, obs_id, f"{obs_id}_evt2.fits"), source, binsize, p0, likelihood_threshold, seed, image_format, dpi, previous, content = False)
+                if not manifest.stale_stages(previous, inputs, os.path.join(output_dir, source, obs_id), render):
+                    results[i] = {"Source": source, "Observation ID": obs_id, "Status": "Unchanged", "Error": "", "Elapsed": 0.}
+                    finish(i)
+                    continue
+            futures[executor.submit(lightcurve_job, source, obs_id, data_dir, output_dir, binsize, p0, likelihood_threshold, seed, scratch_dir, remove_failed, image_format, dpi, render, lightcurve_store, backend, trace,
+                                    incremental, previous)] = i
+
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+                tracing.extend(results[i].pop("Trace", None))
+            except Exception:
+                #A worker process that dies takes its job with it, the rest of the batch carries on
+                source, obs_id = jobs[i]
+                results[i] = {"Source": source, "Observation ID": obs_id, "Status": "Error", "Error": traceback.format_exc(), "Elapsed": 0.}
+            if incremental:
+                record(i, results[i].pop("Manifest", None))
+            if results[i].get("Result File") is not None:
+                render_futures[render_executor.submit(render_job, results[i]["Result File"], image_format, dpi, True, backend, trace)] = i
+            else:
+                finish(i)
+
+        for future in concurrent.futures.as_completed(render_futures):
+            i = render_futures[future]
+            try:
+                render_result = future.result()
+                tracing.extend(render_result.pop("Trace", None))
+            except Exception:
+                render_result = {"Status": "Error", "Error": traceback.format_exc(), "Elapsed": 0.}
+            results[i]["Elapsed"] += render_result["Elapsed"]
+            if render_result["Status"] != "Done":
+                results[i]["Status"] = "Error"
+                results[i]["Error"] = render_result["Error"]
+                if incremental and jobs[i][1] in manifests[jobs[i][0]]:
+                    manifests[jobs[i][0]][jobs[i][1]]["Stages"].pop("render", None)
+                    record(i, manifests[jobs[i][0]][jobs[i][1]])
+            finish(i)
+
+    #Parts appended by the jobs are packed once per source, so reading a source's light curves back is a few memory-mapped reads
+    if lightcurve_store:
+        for source in sorted({result["Source"] for result in results if result["Status"] == "Done"}):
+            with tracing.stage("store.compact", source):
+                store.compact(store.store_path(output_dir, source))
+
+    if trace_file is not None:
+        tracing.write_trace(trace_file, tracing.disable())
+
+    return pd.DataFrame(results, columns = ["Source", "Observation ID", "Status", "Error", "Elapsed"])
@@ -0,0 +1,289 @@
+from ChandraPy import order, values
+import numpy as np
+import pandas as pd
+
+def time_bin_edges(tstart, tstop, binsize, timedel):
+    """Returns time bin edges starting at 'tstart', with the binsize snapped down to a multiple of 'TIMEDEL' like 'dmextract' is called with.
+       Raises ValueError if the binsize is shorter than 'TIMEDEL'.
+
+    Args:
+        tstart (float): Value of 'TSTART' in event file header (s).
+        tstop (float): Value of 'TSTOP' in event file header (s).
+        binsize (int/float): Size of bins (s).
+        timedel (float): Value of 'TIMEDEL' in event file header (s).
+
+    Returns:
+        numpy.ndarray: Array of bin edges (s). The last bin may be partial and end at 'tstop'.
+    """
+
+    step = float(binsize) // timedel * timedel
+    if step <= 0:
+        raise ValueError(f"Bin size {binsize}s is shorter than TIMEDEL ({timedel}s)")
+    nbins = max(int(np.ceil((tstop - tstart) / step)), 1)
+    edges = tstart + step * np.arange(nbins + 1)
+    edges[-1] = min(edges[-1], tstop)
+
+    return edges
+
+def gti_exposure(bin_edges, gti_start, gti_stop, dtcor = 1.0):
+    """Returns the time covered by the good time intervals inside each bin, computed for all bins at once.
+
+    Args:
+        bin_edges (numpy.ndarray): Array of bin edges (s).
+        gti_start (numpy.ndarray): Array of GTI start times (s).
+        gti_stop (numpy.ndarray): Array of GTI stop times (s).
+        dtcor (float, optional): Dead time correction factor applied to the exposure. Defaults to 1.0.
+
+    Returns:
+        numpy.ndarray: Array of exposure per bin (s).
+    """
+
+    gti_start = np.asarray(gti_start, dtype = float)
+    gti_stop = np.asarray(gti_stop, dtype = float)
+    if len(gti_start) == 0:
+        return np.diff(bin_edges) * dtcor
+
+    sort = np.argsort(gti_start)
+    gti_start = gti_start[sort]
+    gti_stop = gti_stop[sort]
+    lengths = gti_stop - gti_start
+    covered = np.concatenate(([0.], np.cumsum(lengths)))
+
+    #Total GTI time elapsed before each edge, differenced into per-bin exposure
+    index = np.searchsorted(gti_start, bin_edges, side = "right") - 1
+    inside = np.clip(bin_edges - gti_start[np.maximum(index, 0)], 0, lengths[np.maximum(index, 0)])
+    elapsed = np.where(index >= 0, covered[np.maximum(index, 0)] + inside, 0.)
+
+    return np.diff(elapsed) * dtcor
+
+def live_exposure(bin_edges, gti_start, gti_stop, dtcor = 1.0, dead_time = None):
+    """Returns the exposure of each bin, the time covered by the good time intervals inside it multiplied by the dead time factor. Bins can
+       be any edges, such as a regular grid or Bayesian Blocks, and bins partially covered by the GTIs get their fractional exposure. With
+       'dead_time', the factor varies with time: each sample of the dead time factor file holds until halfway to the next one, and the
+       product of that step function with the GTIs is integrated over every bin at once from its cumulative sum.
+
+    Args:
+        bin_edges (numpy.ndarray): Array of bin edges (s).
+        gti_start (numpy.ndarray): Array of GTI start times (s).
+        gti_stop (numpy.ndarray): Array of GTI stop times (s).
+        dtcor (float, optional): Constant dead time correction factor, used if 'dead_time' isn't given. Defaults to 1.0.
+        dead_time (tuple, optional): Tuple of arrays (times, dtf) with the 'TIME' and 'DTF' columns of a dead time factor file. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Array of exposure per bin (s).
+    """
+
+    bin_edges = np.asarray(bin_edges, dtype = float)
+    if dead_time is None or len(dead_time[0]) == 0:
+        return gti_exposure(bin_edges, gti_start, gti_stop, dtcor)
+
+    if len(gti_start) == 0:
+        gti_start, gti_stop = bin_edges[:1], bin_edges[-1:]
+    points, rates = live_time_segments(gti_start, gti_stop, dtcor, dead_time)
+    if len(points) < 2:
+        return np.zeros(len(bin_edges) - 1)
+
+    #Live time elapsed before each edge, differenced into per-bin exposure
+    return np.diff(elapsed_live_time(points, rates, bin_edges))
+
+def live_time_segments(gti_start, gti_stop, dtcor = 1.0, dead_time = None):
+    """Returns the rate at which live time accumulates as a step function: 0 outside the good time intervals, and the dead time factor inside
+       them, where each sample of the dead time factor file holds until halfway to the next one.
+
+    Args:
+        gti_start (numpy.ndarray): Array of GTI start times (s).
+        gti_stop (numpy.ndarray): Array of GTI stop times (s).
+        dtcor (float, optional): Constant dead time correction factor, used if 'dead_time' isn't given. Defaults to 1.0.
+        dead_time (tuple, optional): Tuple of arrays (times, dtf) with the 'TIME' and 'DTF' columns of a dead time factor file. Defaults to None.
+
+    Returns:
+        tuple(points, rates): Tuple containing the sorted breakpoints (s) and the rate between each breakpoint and the next, which has one value fewer.
+    """
+
+    gti_start = np.asarray(gti_start, dtype = float)
+    gti_stop = np.asarray(gti_stop, dtype = float)
+    sort = np.argsort(gti_start)
+    gti_start = gti_start[sort]
+    gti_stop = gti_stop[sort]
+
+    if dead_time is None or len(dead_time[0]) == 0:
+        times, dtf = np.zeros(1), np.full(1, float(dtcor))
+    else:
+        times, dtf = (np.asarray(column, dtype = float) for column in dead_time)
+        sort = np.argsort(times)
+        times = times[sort]
+        dtf = dtf[sort]
+    midpoints = (times[1:] + times[:-1]) / 2
+
+    #Live time rate is constant between consecutive breakpoints: in or out of a GTI, times the factor of the nearest sample
+    points = np.unique(np.concatenate((gti_start, gti_stop, midpoints)))
+    starts = points[:-1]
+    gti = np.searchsorted(gti_start, starts, side = "right") - 1
+    good = (gti >= 0) & (starts < gti_stop[np.maximum(gti, 0)])
+    rates = np.where(good, dtf[np.searchsorted(midpoints, starts, side = "right")], 0.)
+
+    return points, rates
+
+def elapsed_live_time(points, rates, times):
+    """Returns the live time elapsed from the first breakpoint to each time, the integral of the step function from 'live_time_segments'.
+       It maps times onto a time axis on which gaps take no time, where the events of an exposure-weighted light curve arrive uniformly.
+
+    Args:
+        points (numpy.ndarray): Array of sorted breakpoints (s).
+        rates (numpy.ndarray): Array of rates between consecutive breakpoints.
+        times (numpy.ndarray): Array of times (s), clipped to the breakpoints.
+
+    Returns:
+        numpy.ndarray: Array of live time elapsed at each time (s).
+    """
+
+    times = np.asarray(times, dtype = float)
+    cumulative = np.concatenate(([0.], np.cumsum(rates * np.diff(points))))
+    index = np.clip(np.searchsorted(points, times, side = "right") - 1, 0, len(rates) - 1)
+
+    return cumulative[index] + rates[index] * (np.clip(times, points[0], points[-1]) - points[index])
+
+def live_time_inverse(points, rates, elapsed):
+    """Returns the times at which given amounts of live time have elapsed, the inverse of 'elapsed_live_time'. A time falling at the boundary
+       of a gap is mapped to the end of the gap, where live time starts accumulating again.
+
+    Args:
+        points (numpy.ndarray): Array of sorted breakpoints (s).
+        rates (numpy.ndarray): Array of rates between consecutive breakpoints.
+        elapsed (numpy.ndarray): Array of live times elapsed since the first breakpoint (s).
+
+    Returns:
+        numpy.ndarray: Array of times (s).
+    """
+
+    elapsed = np.asarray(elapsed, dtype = float)
+    cumulative = np.concatenate(([0.], np.cumsum(rates * np.diff(points))))
+    index = np.clip(np.searchsorted(cumulative, elapsed, side = "right") - 1, 0, len(rates) - 1)
+    offset = np.divide(elapsed - cumulative[index], rates[index], out = np.zeros(len(elapsed)), where = rates[index] > 0)
+
+    return np.minimum(points[index] + offset, points[-1])
+
+def multiband_lightcurve(times, energies, tstart, tstop, binsize, timedel, gti_start = (), gti_stop = (), dtcor = 1.0, bands = values, dead_time = None):
+    """Generates binned light curves for all energy bands with one bin size, with the same columns 'dmextract' is used to produce. A single
+       bin size case of 'multiband_lightcurves'.
+
+    Args:
+        times (numpy.ndarray): Array of photon arrival times (s), typically 'time' column of the region event list.
+        energies (numpy.ndarray): Array of photon energies (eV), typically 'energy' column of the region event list.
+        tstart (float): Value of 'TSTART' in event file header (s).
+        tstop (float): Value of 'TSTOP' in event file header (s).
+        binsize (int/float): Size of bins (s).
+        timedel (float): Value of 'TIMEDEL' in event file header (s).
+        gti_start (numpy.ndarray, optional): Array of GTI start times (s). Defaults to (), in which case bins are fully exposed.
+        gti_stop (numpy.ndarray, optional): Array of GTI stop times (s). Defaults to ().
+        dtcor (float, optional): Dead time correction factor applied to the exposure. Defaults to 1.0.
+        bands (pandas.core.frame.DataFrame, optional): Summary of energy bands with columns 'Band', 'Energy Min' and 'Energy Max'. Defaults to 'ChandraPy.values'.
+        dead_time (tuple, optional): Tuple of arrays (times, dtf) from a dead time factor file, used instead of 'dtcor' by 'live_exposure'. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns given by 'ChandraPy.order', trimmed to the first and last bins with non-zero exposure.
+    """
+
+    return multiband_lightcurves(times, energies, tstart, tstop, [binsize], timedel, gti_start, gti_stop, dtcor, bands, dead_time)[binsize]
+
+def _lightcurve_table(bin_edges, counts, exposure, band_names):
+    exposed = exposure > 0
+    rates = np.divide(counts, exposure[:, None], out = np.zeros_like(counts), where = exposed[:, None])
+
+    df = pd.DataFrame({"Bin": np.arange(1, len(exposure) + 1), "Time": (bin_edges[:-1] + bin_edges[1:]) / 2})
+    for i, band in enumerate(band_names):
+        df[f"{band} Count Rate"] = rates[:, i]
+        df[f"{band} Counts"] = counts[:, i]
+
+    broadband = band_names.index("Broadband")
+    df["Count Rate Error"] = np.divide(np.sqrt(counts[:, broadband]), exposure, out = np.zeros_like(exposure), where = exposed)
+    df["Exposure"] = exposure
+
+    if exposed.any():
+        valid = np.flatnonzero(exposed)
+        df = df.iloc[valid[0]:valid[-1] + 1].reset_index(drop = True)
+    df["Bin"] = range(1, len(df) + 1)
+
+    return df[[column for column in order if column in df.columns]]
+
+def _cumulative_counts(sorted_times, bin_edges):
+    #Events before each edge, differenced into per-bin counts. The last bin includes its right edge, as in np.histogram.
+    before = np.searchsorted(sorted_times, bin_edges, side = "left")
+    before[-1] = np.searchsorted(sorted_times, bin_edges[-1], side = "right")
+
+    return np.diff(before)
+
+def multiband_lightcurves(times, energies, tstart, tstop, binsizes, timedel, gti_start = (), gti_stop = (), dtcor = 1.0, bands = values, dead_time = None):
+    """Generates the light curves of every energy band for several bin sizes from one event list. The events of each band are sorted once,
+       and the counts of any bin are differences of their cumulative counts at the bin edges, so every bin size after the first costs a
+       binary search per edge. Bin sizes are snapped down to multiples of 'TIMEDEL' as in 'time_bin_edges', so all the grids are
+       coarsenings of the frame grid.
+
+    Args:
+        times (numpy.ndarray): Array of photon arrival times (s).
+        energies (numpy.ndarray): Array of photon energies (eV), or None for HRC, in which case only the Broadband light curve of all the events is made.
+        tstart (float): Value of 'TSTART' in event file header (s).
+        tstop (float): Value of 'TSTOP' in event file header (s).
+        binsizes (list): Sizes of bins (s).
+        timedel (float): Value of 'TIMEDEL' in event file header (s).
+        gti_start (numpy.ndarray, optional): Array of GTI start times (s). Defaults to (), in which case bins are fully exposed.
+        gti_stop (numpy.ndarray, optional): Array of GTI stop times (s). Defaults to ().
+        dtcor (float, optional): Dead time correction factor applied to the exposure. Defaults to 1.0.
+        bands (pandas.core.frame.DataFrame, optional): Summary of energy bands with columns 'Band', 'Energy Min' and 'Energy Max'. Defaults to 'ChandraPy.values'.
+        dead_time (tuple, optional): Tuple of arrays (times, dtf) from a dead time factor file, used instead of 'dtcor' by 'live_exposure'. Defaults to None.
+
+    Returns:
+        dict: Dictionary mapping each bin size, as given, to a Pandas DataFrame like the one returned by 'multiband_lightcurve'.
+    """
+
+    times = np.asarray(times, dtype = float)
+    order_by_time = np.argsort(times, kind = "stable")
+    times = times[order_by_time]
+    if energies is None:
+        band_names = ["Broadband"]
+        band_times = [times]
+    else:
+        energies = np.asarray(energies, dtype = float)[order_by_time]
+        energy_min = np.asarray(bands["Energy Min"], dtype = float)
+        energy_max = np.asarray(bands["Energy Max"], dtype = float)
+        #Bands can overlap (Broadband contains the others), so each is selected on its own. Only the highest boundary is inclusive, as in np.histogram
+        highest = max(energy_min.max(), energy_max.max())
+        band_names = list(bands["Band"])
+        band_times = [times[(energies >= low) & ((energies < high) | ((energies == high) & (high == highest)))] for low, high in zip(energy_min, energy_max)]
+
+    lightcurves = {}
+    computed = {}
+    for binsize in binsizes:
+        step = float(binsize) // timedel * timedel
+        if step not in computed:
+            bin_edges = time_bin_edges(tstart, tstop, binsize, timedel)
+            counts = np.column_stack([_cumulative_counts(band, bin_edges) for band in band_times]).astype(float)
+            exposure = live_exposure(bin_edges, gti_start, gti_stop, dtcor, dead_time)
+            computed[step] = _lightcurve_table(bin_edges, counts, exposure, band_names)
+            lightcurves[binsize] = computed[step]
+        else:
+            lightcurves[binsize] = computed[step].copy()
+
+    return lightcurves
+
+def net_rates(counts, background_counts, exposure, scale):
+    """Returns background-subtracted count rates of bins or blocks of every band at once. Background counts are scaled to the source's area,
+       and errors add the Poisson variances of the source and scaled background counts.
+
+    Args:
+        counts (numpy.ndarray): Array of source counts, with one row per bin and optionally one column per band.
+        background_counts (numpy.ndarray): Array of background counts of the same shape.
+        exposure (numpy.ndarray): Array of exposure per bin (s).
+        scale (float): Ratio of the source area to the background area.
+
+    Returns:
+        tuple(background_rates, net_rates, errors): Tuple of arrays shaped like 'counts', with the scaled background count rates, net count rates and net count rate errors (cts/s), which are 0 for unexposed bins.
+    """
+
+    counts = np.asarray(counts, dtype = float)
+    background = scale * np.asarray(background_counts, dtype = float)
+    exposure = np.asarray(exposure, dtype = float).reshape((-1,) + (1,) * (counts.ndim - 1))
+    exposed = np.broadcast_to(exposure > 0, counts.shape)
+    rate = lambda values: np.divide(values, exposure, out = np.zeros(counts.shape), where = exposed)
+
+    return rate(background), rate(counts - background), rate(np.sqrt(counts + scale * background))
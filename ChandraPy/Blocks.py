@@ -0,0 +1,260 @@
+import concurrent.futures
+import functools
+import math
+import numpy as np
+
+def _absorb(block, into, counts, left, right, prev_block, next_block, merge_log, merge_pass):
+    """Merges a block into its previous or next neighbour in the linked list of blocks, in constant time.
+
+    Args:
+        block (int): Index of the block to be removed.
+        into (int): Index of the neighbouring block that absorbs it.
+        counts (numpy.ndarray): Array of counts per block.
+        left (numpy.ndarray): Array of left edges per block (s).
+        right (numpy.ndarray): Array of right edges per block (s).
+        prev_block (numpy.ndarray): Array of indices of the previous block, -1 for the first block.
+        next_block (numpy.ndarray): Array of indices of the next block, -1 for the last block.
+        merge_log (list): List to which a record of the merge is appended.
+        merge_pass (int): Which merge pass is running (1 for short/low-count blocks, 2 for the likelihood merge).
+    """
+
+    merge_log.append({"Pass": merge_pass, "Block": block, "Merged Into": into, "Start": left[block], "Stop": right[block], "Counts": counts[block]})
+    counts[into] += counts[block]
+    if into == prev_block[block]:
+        right[into] = right[block]
+    else:
+        left[into] = left[block]
+
+    if prev_block[block] != -1:
+        next_block[prev_block[block]] = next_block[block]
+    if next_block[block] != -1:
+        prev_block[next_block[block]] = prev_block[block]
+
+def _poisson_log_likelihood(counts, rate, interval):
+    """Returns the log-likelihood of observing a block's counts given a neighbouring block's count rate.
+
+    Args:
+        counts (int/float): Counts in the block.
+        rate (float): Count rate of the neighbouring block (cts/s).
+        interval (float): Length of the block (s).
+
+    Returns:
+        float: Poisson log-likelihood.
+    """
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return (-1 * math.lgamma(counts + 1)) + (counts * np.log(rate * interval)) - (rate * interval)
+
+def merge_blocks(bin_edges, counts, likelihood_threshold = np.log(1e-3), min_interval = 20, min_counts = 5, max_merge_interval = 100):
+    """Merges Bayesian Blocks segments using the two passes of ChandraPy: first blocks that are too short or have too few counts and stand
+       out as a spike, then short blocks whose counts are likely under a neighbour's rate. Blocks are kept in an array-backed doubly linked
+       list, so every merge costs O(1) instead of rebuilding the arrays.
+
+    Args:
+        bin_edges (numpy.ndarray): Array of bin edges created by bayesian blocks (s).
+        counts (numpy.ndarray): Array of counts in each block.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not. Defaults to ln(0.001).
+        min_interval (int/float, optional): Blocks shorter than this are candidates for the first pass (s). Defaults to 20.
+        min_counts (int, optional): Blocks with fewer counts than this are candidates for the first pass. Defaults to 5.
+        max_merge_interval (int/float, optional): Blocks shorter than this are candidates for the likelihood pass (s). Defaults to 100.
+
+    Returns:
+        tuple(bin_edges, counts, merge_log): Tuple containing the merged bin edges, the merged counts, and a list of dictionaries recording every merge in order.
+    """
+
+    bin_edges = np.asarray(bin_edges, dtype = float)
+    counts = np.array(counts)
+    n = len(counts)
+    if n == 0:
+        return bin_edges, counts, []
+
+    left = bin_edges[:-1].copy()
+    right = bin_edges[1:].copy()
+    prev_block = np.arange(-1, n - 1)
+    next_block = np.arange(1, n + 1)
+    next_block[-1] = -1
+    merge_log = []
+    head = 0
+
+    def interval(i):
+        return right[i] - left[i]
+
+    def rate(i):
+        return counts[i] / interval(i)
+
+    #A single remaining block has no neighbour to merge into, so each pass stops there
+    if n > 1:
+        i = head
+        while i != -1 and not (prev_block[i] == -1 and next_block[i] == -1):
+            if interval(i) < min_interval or counts[i] < min_counts:
+                if prev_block[i] == -1:
+                    if rate(i) > rate(next_block[i]) and not counts[i] > counts[next_block[i]]:
+                        into = next_block[i]
+                        _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 1)
+                        head = i = into
+                    else:
+                        i = next_block[i]
+                elif next_block[i] == -1:
+                    if rate(i) > rate(prev_block[i]) and not counts[i] > counts[prev_block[i]]:
+                        into = prev_block[i]
+                        _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 1)
+                        i = into
+                    else:
+                        break
+                else:
+                    right_diff = rate(next_block[i]) - rate(i)
+                    left_diff = rate(prev_block[i]) - rate(i)
+                    if rate(i) > rate(prev_block[i]) and rate(i) > rate(next_block[i]) and not (counts[i] > counts[prev_block[i]] and counts[i] > counts[next_block[i]]):
+                        if abs(left_diff) < abs(right_diff):
+                            into = prev_block[i]
+                            _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 1)
+                            i = into
+                        else:
+                            into = next_block[i]
+                            _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 1)
+                            i = next_block[into]
+                    else:
+                        i = next_block[i]
+            else:
+                i = next_block[i]
+
+        i = head
+        while i != -1 and not (prev_block[i] == -1 and next_block[i] == -1):
+            if interval(i) < max_merge_interval:
+                if prev_block[i] == -1:
+                    if rate(i) > rate(next_block[i]):
+                        ln_next_likelihood = _poisson_log_likelihood(counts[i], rate(next_block[i]), interval(i))
+                        if not ln_next_likelihood < likelihood_threshold:
+                            into = next_block[i]
+                            _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 2)
+                            head = i = into
+                        else:
+                            i = next_block[i]
+                    else:
+                        i = next_block[i]
+                elif next_block[i] == -1:
+                    if rate(i) > rate(prev_block[i]):
+                        ln_previous_likelihood = _poisson_log_likelihood(counts[i], rate(prev_block[i]), interval(i))
+                        if not ln_previous_likelihood < likelihood_threshold:
+                            into = prev_block[i]
+                            _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 2)
+                            i = into
+                        else:
+                            break
+                    else:
+                        break
+                else:
+                    if rate(i) > rate(prev_block[i]) and rate(i) > rate(next_block[i]):
+                        ln_next_likelihood = _poisson_log_likelihood(counts[i], rate(next_block[i]), interval(i))
+                        ln_previous_likelihood = _poisson_log_likelihood(counts[i], rate(prev_block[i]), interval(i))
+                        if not np.max([ln_previous_likelihood, ln_next_likelihood]) < likelihood_threshold:
+                            if ln_previous_likelihood > ln_next_likelihood:
+                                into = prev_block[i]
+                                _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 2)
+                                i = into
+                            else:
+                                into = next_block[i]
+                                _absorb(i, into, counts, left, right, prev_block, next_block, merge_log, 2)
+                                i = next_block[into]
+                        else:
+                            i = next_block[i]
+                    else:
+                        i = next_block[i]
+            else:
+                i = next_block[i]
+
+    remaining = []
+    i = head
+    while i != -1:
+        remaining.append(i)
+        i = next_block[i]
+    remaining = np.array(remaining, dtype = int)
+
+    return np.append(left[remaining], right[remaining[-1]]), counts[remaining], merge_log
+
+def bayesian_blocks(times, p0 = 0.05, max_candidates = None, tolerance = 1e-10):
+    """Computes Bayesian Blocks segmentation of an event list with the 'events' fitness, giving the same change points as
+       'astropy.stats.bayesian_blocks(times, fitness = "events", p0 = p0)'. Candidate change points that can no longer be optimal are pruned
+       (PELT, Killick et al. 2012), so light curves with many changes run in close to linear time instead of O(N^2).
+
+    Args:
+        times (numpy.ndarray): Array of photon arrival times (s).
+        p0 (int/float, optional): Value of p0 for the prior on the number of blocks. Defaults to 0.05.
+        max_candidates (int, optional): If given, at most this many of the most recent candidate change points are kept, bounding memory and
+                                        time to O(N * max_candidates). The result is then approximate for blocks longer than that many events. Defaults to None.
+        tolerance (float, optional): Relative margin by which a candidate must be worse before it is pruned, guarding against rounding. Defaults to 1e-10.
+
+    Returns:
+        numpy.ndarray: Array of bin edges (s).
+    """
+
+    times = np.asarray(times, dtype = float)
+    if times.ndim != 1:
+        raise ValueError("times must be a one-dimensional array")
+
+    t, inverse = np.unique(times, return_inverse = True)
+    x = np.ones_like(t) if len(t) == len(times) else np.bincount(inverse).astype(float)
+    n = len(t)
+    edges = np.concatenate([t[:1], 0.5 * (t[1:] + t[:-1]), t[-1:]])
+    block_length = t[-1] - edges
+    cumulative = np.concatenate(([0.], np.cumsum(x)))
+    ncp_prior = 4 - np.log(73.53 * p0 * (n ** -0.478))
+
+    best = np.zeros(n, dtype = float)
+    last = np.zeros(n, dtype = int)
+    candidates = np.array([0])
+    previous_best = np.array([0.])
+
+    for r in range(n):
+        n_k = cumulative[r + 1] - cumulative[candidates]
+        t_k = block_length[candidates] - block_length[r + 1]
+        fit = n_k * np.log(n_k / t_k)
+        a_r = (fit - ncp_prior) + previous_best
+        i_max = np.argmax(a_r)
+        last[r] = candidates[i_max]
+        best[r] = a_r[i_max]
+
+        #A candidate strictly worse than the best before paying for its block can never win later, since splitting a block never lowers its fitness
+        keep = a_r + ncp_prior >= best[r] - tolerance * max(1., abs(best[r]))
+        candidates = candidates[keep]
+        previous_best = previous_best[keep]
+        if max_candidates is not None and len(candidates) >= max_candidates:
+            candidates = candidates[-(max_candidates - 1):] if max_candidates > 1 else candidates[:0]
+            previous_best = previous_best[len(previous_best) - len(candidates):]
+        candidates = np.append(candidates, r + 1)
+        previous_best = np.append(previous_best, best[r])
+
+    change_points = np.zeros(n, dtype = int)
+    i_cp = n
+    ind = n
+    while i_cp > 0:
+        i_cp -= 1
+        change_points[i_cp] = ind
+        if ind == 0:
+            break
+        ind = last[ind - 1]
+    if i_cp == 0:
+        change_points[i_cp] = 0
+    change_points = change_points[i_cp:]
+
+    return edges[change_points]
+
+def bayesian_blocks_batch(event_lists, p0 = 0.05, max_candidates = None, max_workers = None):
+    """Computes Bayesian Blocks segmentation for many event lists, optionally spread over a pool of processes.
+
+    Args:
+        event_lists (list): List of arrays of photon arrival times (s).
+        p0 (int/float, optional): Value of p0 for the prior on the number of blocks. Defaults to 0.05.
+        max_candidates (int, optional): See 'bayesian_blocks'. Defaults to None.
+        max_workers (int, optional): Number of worker processes. Defaults to None, in which case the event lists are segmented in this process.
+
+    Returns:
+        list: List of arrays of bin edges (s), in the same order as 'event_lists'.
+    """
+
+    segment = functools.partial(bayesian_blocks, p0 = p0, max_candidates = max_candidates)
+    if max_workers is None or max_workers <= 1:
+        return [segment(times) for times in event_lists]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        return list(executor.map(segment, event_lists))
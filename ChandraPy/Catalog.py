@@ -0,0 +1,272 @@
+from ChandraPy import Backends as backends
+from ChandraPy import Tracing as tracing
+import datetime
+import numpy as np
+import os
+import pandas as pd
+import shlex
+import sqlite3
+
+#Radius of the field of view of each detector (arcmin), half the diagonal of its whole array. A source is matched to an observation if it's
+#within this radius of the pointing, which includes some observations it falls off the active chips of, as 'find_chandra_obsid' does
+field_radius = {"ACIS-I": 12.0,
+                "ACIS-S": 25.5,
+                "HRC-I": 21.5,
+                "HRC-S": 50.0
+                }
+
+#Columns of the tables returned by the catalog, and the names 'find_chandra_obsid' gives them
+columns = {"obsid": "Observation ID",
+           "ra": "RA",
+           "dec": "Dec",
+           "inst": "Instrument",
+           "grat": "Grating",
+           "time": "Exposure",
+           "obsdate": "Date",
+           "target": "Target"
+           }
+
+_schema = """
+CREATE TABLE IF NOT EXISTS observations (obsid INTEGER PRIMARY KEY, ra REAL NOT NULL, dec REAL NOT NULL, instrument TEXT, grating TEXT, exposure REAL, obsdate TEXT, target TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS footprints USING rtree(obsid, min_x, max_x, min_y, max_y, min_z, max_z);
+CREATE TABLE IF NOT EXISTS cones (ra REAL NOT NULL, dec REAL NOT NULL, radius REAL NOT NULL, fetched TEXT NOT NULL);
+"""
+
+def source_position(source):
+    """Returns the position of a source from its name.
+
+    Args:
+        source (str): Name of source in J2000 sexagecimal format, such as 'J004212.00+411500.0'.
+
+    Returns:
+        tuple(ra, dec): Tuple containing RA and Dec (deg).
+    """
+
+    coords = source.split("J")[1]
+    sign = "+" if "+" in coords else "-"
+    ra_raw, dec_raw = coords.split(sign)
+    ra = 15 * (float(ra_raw[0:2]) + float(ra_raw[2:4]) / 60 + float(ra_raw[4:]) / 3600)
+    dec = float(dec_raw[0:2]) + float(dec_raw[2:4]) / 60 + float(dec_raw[4:]) / 3600
+
+    return ra, dec if sign == "+" else -dec
+
+def _unit_vectors(ra, dec):
+    ra, dec = np.radians(np.asarray(ra, dtype = float)), np.radians(np.asarray(dec, dtype = float))
+
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis = -1)
+
+def _separation(vectors, others):
+    #Angle between unit vectors (arcmin), from the chord between them so small separations keep their precision
+    chord = np.linalg.norm(vectors - others, axis = -1)
+
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2, 0, 1))) * 60
+
+def _angle(value, hours = False):
+    value = str(value)
+    if ":" not in value and " " not in value.strip():
+        return float(value)
+    parts = [float(part) for part in value.replace(":", " ").split()]
+    sign = -1 if value.strip().startswith("-") else 1
+    degrees = abs(parts[0]) + sum(part / 60 ** power for power, part in enumerate(parts[1:], 1))
+
+    return sign * degrees * (15 if hours else 1)
+
+def parse_obsid_table(text):
+    """Parses the table printed by 'find_chandra_obsid' with 'detailed' set, whose header line starts with '#' and whose quoted target names can hold spaces.
+
+    Args:
+        text (str): Table printed by 'find_chandra_obsid'.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns 'Observation ID', 'RA', 'Dec' (deg), 'Instrument', 'Grating', 'Exposure' (ks), 'Date' and 'Target'.
+    """
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    header = next((line for line in lines if line.startswith("#")), None)
+    if header is None:
+        raise ValueError("No header line starting with '#' in the Obs. ID table")
+    names = header.lstrip("#").split()
+    if "ra" not in names or "dec" not in names:
+        raise ValueError("The Obs. ID table has no pointings, 'find_chandra_obsid' has to be run with 'detailed' set")
+
+    rows = []
+    for line in lines:
+        if line.startswith("#"):
+            continue
+        values = shlex.split(line)
+        rows.append(dict(zip(names, values)))
+
+    return _normalise(pd.DataFrame(rows, columns = names))
+
+def _normalise(df):
+    df = df.rename(columns = {column.lower(): name for column, name in columns.items()} | {name.lower(): name for name in columns.values()})
+    for name in columns.values():
+        if name not in df.columns:
+            df[name] = None
+    df = df[list(columns.values())].copy()
+    df["Observation ID"] = df["Observation ID"].astype(int)
+    df["RA"] = [_angle(value, hours = True) for value in df["RA"]]
+    df["Dec"] = [_angle(value) for value in df["Dec"]]
+    df["Exposure"] = pd.to_numeric(df["Exposure"], errors = "coerce")
+
+    return df
+
+def open_catalog(catalog_file):
+    """Opens the Obs. ID catalog, creating it if it doesn't exist. It's an SQLite database holding the observations returned by the archive,
+       indexed by their fields of view in an R*Tree, and the cones already queried.
+
+    Args:
+        catalog_file (str): Absolute path to the catalog.
+
+    Returns:
+        sqlite3.Connection: Connection to the catalog.
+    """
+
+    directory = os.path.dirname(os.path.abspath(catalog_file))
+    os.makedirs(directory, exist_ok = True)
+    connection = sqlite3.connect(catalog_file)
+    connection.executescript(_schema)
+
+    return connection
+
+def _insert(connection, df):
+    vectors = _unit_vectors(df["RA"], df["Dec"])
+    #Half the side of a cube holding the field of view on the unit sphere, which is the chord of its radius
+    radii = df["Instrument"].map(field_radius).fillna(max(field_radius.values())).to_numpy(dtype = float)
+    chords = 2 * np.sin(np.radians(radii / 60) / 2)
+
+    connection.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(int(row["Observation ID"]), float(row["RA"]), float(row["Dec"]), row["Instrument"], row["Grating"],
+                             None if pd.isna(row["Exposure"]) else float(row["Exposure"]), row["Date"], row["Target"]) for _, row in df.iterrows()])
+    connection.executemany("DELETE FROM footprints WHERE obsid = ?", [(int(obs_id),) for obs_id in df["Observation ID"]])
+    connection.executemany("INSERT INTO footprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [(int(obs_id), *(float(value) for pair in zip(vector - chord, vector + chord) for value in pair))
+                            for obs_id, vector, chord in zip(df["Observation ID"], vectors, chords)])
+
+def import_observations(catalog_file, table_file):
+    """Adds observations from a local file to the catalog, for working offline. The file is either a saved 'find_chandra_obsid' table (with
+       'detailed' set) or a CSV file with columns 'Observation ID', 'RA', 'Dec' (deg or sexagecimal), 'Instrument', 'Exposure' (ks) and 'Date',
+       and optionally 'Grating' and 'Target'.
+
+    Args:
+        catalog_file (str): Absolute path to the catalog.
+        table_file (str): Absolute path to the file.
+
+    Returns:
+        int: Number of observations added or updated.
+    """
+
+    with open(table_file) as file:
+        text = file.read()
+    df = parse_obsid_table(text) if text.lstrip().startswith("#") else _normalise(pd.read_csv(table_file, dtype = str))
+
+    with open_catalog(catalog_file) as connection:
+        _insert(connection, df)
+    connection.close()
+
+    return len(df)
+
+def fetch_cone(catalog_file, ra, dec, radius = 90):
+    """Queries the archive with 'find_chandra_obsid' for the observations pointed within a cone, and adds them to the catalog along with the cone.
+
+    Args:
+        catalog_file (str): Absolute path to the catalog.
+        ra (float): RA of the center of the cone (deg).
+        dec (float): Dec of the center of the cone (deg).
+        radius (int/float, optional): Radius of the cone (arcmin). Defaults to 90.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame of the observations returned, as from 'parse_obsid_table'.
+    """
+
+    with tracing.stage("catalog.fetch"):
+        df = parse_obsid_table(backends.get_backend().find_obsids(f"{ra} {dec}", radius = radius, detailed = True))
+    with open_catalog(catalog_file) as connection:
+        _insert(connection, df)
+        connection.execute("INSERT INTO cones VALUES (?, ?, ?, ?)", (float(ra), float(dec), float(radius), datetime.datetime.now(datetime.timezone.utc).isoformat()))
+    connection.close()
+
+    return df
+
+def _covered(connection, vectors):
+    #A position is covered by a cone if every pointing whose field can reach it is inside the cone
+    cones = np.array(connection.execute("SELECT ra, dec, radius FROM cones").fetchall(), dtype = float).reshape(-1, 3)
+    covered = np.zeros(len(vectors), dtype = bool)
+    for ra, dec, radius in cones:
+        covered |= _separation(vectors, _unit_vectors(ra, dec)) + max(field_radius.values()) <= radius
+
+    return covered
+
+def cone_search(catalog_file, ra, dec, offline = False, query_radius = 90):
+    """Returns the observations whose field of view holds each of a list of positions. Positions that no cone queried before covers are
+       grouped into new cones of 'query_radius' that are fetched from the archive once, so positions in the same galaxy share a few
+       queries and later searches in the same fields don't query the archive at all. The positions are then matched to the fields of view
+       in one query of the R*Tree.
+
+    Args:
+        catalog_file (str): Absolute path to the catalog.
+        ra (list): RAs of the positions (deg).
+        dec (list): Decs of the positions (deg).
+        offline (bool, optional): Whether to search the catalog as it is, without querying the archive. Defaults to False.
+        query_radius (int/float, optional): Radius of the cones fetched from the archive (arcmin), larger than the largest 'field_radius'. Defaults to 90.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with a row per position and observation, with columns 'Position' (index of the position),
+                                     'Separation' (arcmin, from the pointing) and those of 'parse_obsid_table'.
+    """
+
+    vectors = _unit_vectors(ra, dec).reshape(-1, 3)
+    reach = query_radius - max(field_radius.values())
+    if reach <= 0:
+        raise ValueError(f"Query radius has to be larger than {max(field_radius.values())} arcmin, got {query_radius}")
+
+    if not offline:
+        with open_catalog(catalog_file) as connection:
+            uncovered = ~_covered(connection, vectors)
+        connection.close()
+        while uncovered.any():
+            center = np.flatnonzero(uncovered)[0]
+            fetch_cone(catalog_file, float(np.ravel(ra)[center]), float(np.ravel(dec)[center]), query_radius)
+            uncovered &= _separation(vectors, vectors[center]) > reach
+
+    connection = open_catalog(catalog_file)
+    try:
+        connection.execute("CREATE TEMP TABLE positions (id INTEGER PRIMARY KEY, x REAL, y REAL, z REAL)")
+        connection.executemany("INSERT INTO positions VALUES (?, ?, ?, ?)", [(i, *map(float, vector)) for i, vector in enumerate(vectors)])
+        pairs = np.array(connection.execute("""SELECT p.id, f.obsid FROM positions p JOIN footprints f ON f.min_x <= p.x AND f.max_x >= p.x
+                                               AND f.min_y <= p.y AND f.max_y >= p.y AND f.min_z <= p.z AND f.max_z >= p.z""").fetchall(), dtype = np.int64).reshape(-1, 2)
+        #Each observation's details are read once, rather than once per position it holds
+        observations = pd.DataFrame(connection.execute("""SELECT obsid, ra, dec, instrument, grating, exposure, obsdate, target FROM observations
+                                                          WHERE obsid IN (SELECT DISTINCT f.obsid FROM positions p JOIN footprints f ON f.min_x <= p.x AND f.max_x >= p.x
+                                                          AND f.min_y <= p.y AND f.max_y >= p.y AND f.min_z <= p.z AND f.max_z >= p.z)""").fetchall(), columns = list(columns.values()))
+    finally:
+        connection.close()
+
+    df = pd.DataFrame({"Position": pairs[:, 0], "Observation ID": pairs[:, 1]}).merge(observations, on = "Observation ID")
+    df.insert(1, "Separation", _separation(vectors[df["Position"].to_numpy()], _unit_vectors(df["RA"].to_numpy(dtype = float), df["Dec"].to_numpy(dtype = float))))
+    #The R*Tree holds the cubes around the fields, so the corners are cut off here
+    radii = df["Instrument"].map(field_radius).fillna(max(field_radius.values())).to_numpy(dtype = float)
+    df = df[df["Separation"].to_numpy() <= radii]
+
+    return df.sort_values(["Position", "Observation ID"]).reset_index(drop = True)
+
+def source_obs_ids(catalog_file, sources, offline = False, query_radius = 90):
+    """Returns the Obs. IDs of observations whose field of view holds each source, from one 'cone_search' of all of them.
+
+    Args:
+        catalog_file (str): Absolute path to the catalog.
+        sources (list): Names of sources in J2000 sexagecimal format.
+        offline (bool, optional): Whether to search the catalog as it is, without querying the archive. Defaults to False.
+        query_radius (int/float, optional): Radius of the cones fetched from the archive (arcmin). Defaults to 90.
+
+    Returns:
+        dict: Dictionary mapping each source to its sorted list of Obs. IDs (str).
+    """
+
+    positions = np.array([source_position(source) for source in sources], dtype = float).reshape(-1, 2)
+    matches = cone_search(catalog_file, positions[:, 0], positions[:, 1], offline, query_radius)
+    #Matches are sorted by position, so each source's Obs. IDs are one slice
+    bounds = np.searchsorted(matches["Position"].to_numpy(), np.arange(len(sources) + 1))
+    obs_ids = matches["Observation ID"].astype(str).tolist()
+
+    return {source: obs_ids[bounds[position]:bounds[position + 1]] for position, source in enumerate(sources)}
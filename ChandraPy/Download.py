@@ -1,103 +1,248 @@
-from ciao_contrib.runtool import axbary, chandra_repro, dmhedit, dmkeypar
+from ChandraPy import Backends as backends
+from ChandraPy import Events as ev
+from ChandraPy import Metadata as md
+from ChandraPy import Tracing as tracing
 import gzip
+import json
 import os
 import shutil
 import subprocess
 
-def download_and_reprocess_obsid(data_dir, obs_id):
-    """Downloads and reprocesses the data for a given Chandra Obs. ID.
+#Stages of downloading and reprocessing an Obs. ID, in the order they run
+stages = ["fetch", "repro", "barycenter", "tidy"]
+
+#Files kept after reprocessing, keyed by a part of the name CIAO gives them
+names = {"repro_evt2.fits": "{obs_id}_evt2.fits",
+        "repro_bpix1.fits": "{obs_id}_bpix1.fits",
+        "repro_flt2.fits": "{obs_id}_flt2.fits",
+        "repro_fov1.fits": "{obs_id}_fov1.fits",
+        "asol1.fits": "{obs_id}_asol1.fits",
+        "pbk0.fits": "{obs_id}_pbk0.fits",
+        "stat1.fits": "{obs_id}_stat1.fits",
+        "mtl1.fits": "{obs_id}_mtl1.fits",
+        "msk1.fits": "{obs_id}_msk1.fits",
+        "dtf1.fits": "{obs_id}_dtf1.fits"
+        }
+
+def state_file(data_dir, obs_id):
+    """Returns the path of the file recording the progress of an Obs. ID through the stages.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+
+    Returns:
+        str: Absolute path to '{data_dir}/{Obs. ID}/{Obs. ID}_pipeline.json'.
+    """
+
+    return os.path.join(data_dir, str(obs_id), f"{obs_id}_pipeline.json")
+
+def read_state(data_dir, obs_id):
+    """Returns the progress of an Obs. ID through the stages. An Obs. ID downloaded before state files existed counts as complete if its event file exists.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+
+    Returns:
+        dict: Dictionary with keys 'Completed' (list of completed stages), 'Failed' (stage that last failed, or None) and 'Error'.
+    """
+
+    obs_id = str(obs_id)
+    path = state_file(data_dir, obs_id)
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+
+    if os.path.exists(os.path.join(data_dir, obs_id, f"{obs_id}_evt2.fits")):
+        return {"Completed": list(stages), "Failed": None, "Error": ""}
+
+    return {"Completed": [], "Failed": None, "Error": ""}
+
+def _write_state(data_dir, obs_id, state):
+    path = state_file(data_dir, obs_id)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path + ".tmp", "w") as file:
+        json.dump(state, file, indent = 4)
+    os.replace(path + ".tmp", path)
+
+def next_stage(data_dir, obs_id):
+    """Returns the first stage an Obs. ID hasn't completed, which is where an interrupted run resumes.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+
+    Returns:
+        str: Name of the stage, or None if all stages are complete.
+    """
+
+    completed = read_state(data_dir, obs_id)["Completed"]
+
+    return next((stage for stage in stages if stage not in completed), None)
+
+def fetch_obsid(data_dir, obs_id):
+    """Downloads the data for a given Chandra Obs. ID into '{data_dir}/{Obs. ID}'. Files already downloaded are skipped.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+    """
+
+    tracing.count("CIAO Calls")
+    subprocess.run(["download_chandra_obsid", str(obs_id), "-q"], cwd = data_dir, check = True)
+    if not os.path.isdir(os.path.join(data_dir, str(obs_id), "primary")):
+        raise FileNotFoundError(f"download_chandra_obsid didn't download the primary products of Obs. ID {obs_id}")
+
+def reprocess_obsid(data_dir, obs_id):
+    """Reprocesses a downloaded Obs. ID with chandra_repro into '{data_dir}/{Obs. ID}/repro'.
 
     Args:
         data_dir (str): Absolute path to directory where data is saved.
         obs_id (str): The Obs. ID Number.
     """
-    
+
+    #Reprocessing only exists in CIAO, whichever backend is selected for the rest
+    backends.get_backend("ciao").reprocess(os.path.join(data_dir, str(obs_id)))
+
+def _barycentred(file):
+    from astropy.io import fits
+
+    return fits.getval(file, "TIMEREF", ext = 1) == "SOLARSYS"
+
+def barycenter_obsid(data_dir, obs_id):
+    """Moves the reprocessed products of an Obs. ID into '{data_dir}/{Obs. ID}' under the names in 'names', and applies the barycentric
+       correction to the event, aspect solution and stat files. Files that are already barycentred are skipped, so the stage can be rerun.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+    """
+
+    from astropy.io import fits
+
     obs_id = str(obs_id)
-    os.chdir(data_dir)
-    subprocess.run(["download_chandra_obsid", obs_id, "-q"])
-    obs_dir = os.path.join(os.getcwd(), obs_id)
+    obs_dir = os.path.join(data_dir, obs_id)
     primary_dir = os.path.join(obs_dir, "primary")
-    secondary_dir = os.path.join(obs_dir, "secondary")
     repro_dir = os.path.join(obs_dir, "repro")
 
-    chandra_repro(obs_dir, clobber = "yes")
-
-    names = {"repro_evt2.fits": f"{obs_id}_evt2.fits",
-            "repro_bpix1.fits": f"{obs_id}_bpix1.fits",
-            "repro_flt2.fits": f"{obs_id}_flt2.fits",
-            "repro_fov1.fits": f"{obs_id}_fov1.fits",
-            "asol1.fits": f"{obs_id}_asol1.fits",
-            "pbk0.fits": f"{obs_id}_pbk0.fits",
-            "stat1.fits": f"{obs_id}_stat1.fits",
-            "mtl1.fits": f"{obs_id}_mtl1.fits",
-            "msk1.fits": f"{obs_id}_msk1.fits",
-            "dtf1.fits": f"{obs_id}_dtf1.fits"
-            }
-
-    for file in os.listdir(primary_dir):
-        if "orbit" in file:
-            old = os.path.join(primary_dir, file)
-            new = os.path.join(obs_dir, file)
-            os.rename(old, new)
-
-            unzipped_path = new[:-3]
-            with gzip.open(new, "rb") as f_in:
-                with open(unzipped_path, "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-
-            os.remove(new)
-
-    for file in os.listdir(repro_dir):
-        old_path = os.path.join(repro_dir, file)
-        new_path = os.path.join(obs_dir, file)
-        shutil.move(old_path, new_path)
-
-    shutil.rmtree(primary_dir)
-    shutil.rmtree(secondary_dir)
-    shutil.rmtree(repro_dir)
+    if os.path.isdir(primary_dir):
+        for file in os.listdir(primary_dir):
+            if "orbit" in file and file.endswith(".gz"):
+                unzipped_path = os.path.join(obs_dir, file[:-3])
+                with gzip.open(os.path.join(primary_dir, file), "rb") as f_in:
+                    with open(unzipped_path, "wb") as f_out:
+                        shutil.copyfileobj(f_in, f_out)
+
+    if os.path.isdir(repro_dir):
+        for file in os.listdir(repro_dir):
+            shutil.move(os.path.join(repro_dir, file), os.path.join(obs_dir, file))
 
     for file in os.listdir(obs_dir):
         for key, name in names.items():
-            if key in file:
+            name = name.format(obs_id = obs_id)
+            if key in file and file != name:
                 os.rename(os.path.join(obs_dir, file), os.path.join(obs_dir, name))
 
     event_file = os.path.join(obs_dir, f"{obs_id}_evt2.fits")
-    bary_event_file = os.path.join(obs_dir, f"{obs_id}_evt2_bary.fits")
     asol_file = os.path.join(obs_dir, f"{obs_id}_asol1.fits")
-    bary_asol_file = os.path.join(obs_dir, f"{obs_id}_asol1_bary.fits")
     stat_file = os.path.join(obs_dir, f"{obs_id}_stat1.fits")
-    bary_stat_file = os.path.join(obs_dir, f"{obs_id}_stat1_bary.fits")
-    tstart = float(dmkeypar(infile = event_file, keyword = "TSTART", echo = True))
+    metadata = md.event_metadata(event_file)
+    tstart = metadata.tstart
     start_time = 0
     orbit_file = "1"
 
     for file in os.listdir(obs_dir):
         if "orbit" in file and file.endswith("fits"):
             current_orbit_file = os.path.join(obs_dir, file)
-            time = float(dmkeypar(infile = current_orbit_file, keyword = "TSTART", echo = True))
+            time = float(fits.getval(current_orbit_file, "TSTART", ext = 1))
             if time <= tstart and time > start_time:
                 start_time = time
                 orbit_file = current_orbit_file
 
-    ra = dmkeypar(infile = event_file, keyword = "RA_TARG", echo = True)
-    dec = dmkeypar(infile = event_file, keyword = "DEC_TARG", echo = True)
+    ra = metadata.ra_targ
+    dec = metadata.dec_targ
+
+    for file in (event_file, asol_file, stat_file):
+        if not os.path.exists(file) or _barycentred(file):
+            continue
+        bary_file = file.replace(".fits", "_bary.fits")
+        backends.get_backend("ciao").barycenter(file, orbit_file, bary_file, ra, dec)
+        os.replace(bary_file, file)
+
+    backends.get_backend().edit_header(event_file, "ASOLFILE", f"{obs_id}_asol1.fits")
 
-    axbary.punlearn()
-    axbary(infile = event_file, orbitfile = orbit_file, outfile = bary_event_file, ra = ra, dec = dec, clobber = "yes")
-    os.rename(bary_event_file, event_file)
+def tidy_obsid(data_dir, obs_id, event_store = False):
+    """Removes everything in '{data_dir}/{Obs. ID}' apart from the files in 'names' and the state file, and optionally writes the columnar event store.
 
-    axbary.punlearn()
-    axbary(infile = asol_file, orbitfile = orbit_file, outfile = bary_asol_file, ra = ra, dec = dec, clobber = "yes")
-    os.rename(bary_asol_file, asol_file)
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        event_store (bool, optional): Whether to also write a compact columnar copy of the event file with 'Events.write_event_store', which later extractions read through memory maps. Defaults to False.
+    """
 
-    if os.path.exists(stat_file):
-        axbary.punlearn()
-        axbary(infile = stat_file, orbitfile = orbit_file, outfile = bary_stat_file, ra = ra, dec = dec, clobber = "yes")
-        os.rename(bary_stat_file, stat_file)
+    obs_id = str(obs_id)
+    obs_dir = os.path.join(data_dir, obs_id)
+    keep = {name.format(obs_id = obs_id) for name in names.values()} | {os.path.basename(state_file(data_dir, obs_id))}
 
-    dmhedit(infile = event_file, operation = "add", key = "ASOLFILE", value = f"{obs_id}_asol1.fits")
+    for directory in ("primary", "secondary", "repro"):
+        shutil.rmtree(os.path.join(obs_dir, directory), ignore_errors = True)
 
     for file in os.listdir(obs_dir):
         file_path = os.path.join(obs_dir, file)
-        if file not in names.values() and os.path.isfile(file_path):
-            os.remove(file_path)
\ No newline at end of file
+        if file not in keep and os.path.isfile(file_path):
+            os.remove(file_path)
+
+    if event_store:
+        ev.write_event_store(os.path.join(obs_dir, f"{obs_id}_evt2.fits"))
+
+def run_stage(data_dir, obs_id, stage, event_store = False):
+    """Runs one stage for an Obs. ID and records the outcome in its state file. Exceptions are recorded and raised again. While tracing
+       is enabled, the stage is timed as 'download.{stage}' with the Obs. ID as its job.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        stage (str): Name of the stage, one of 'stages'.
+        event_store (bool, optional): Whether the 'tidy' stage also writes the columnar event store. Defaults to False.
+    """
+
+    obs_id = str(obs_id)
+    functions = {"fetch": fetch_obsid, "repro": reprocess_obsid, "barycenter": barycenter_obsid, "tidy": tidy_obsid}
+    state = read_state(data_dir, obs_id)
+
+    try:
+        with tracing.stage(f"download.{stage}", obs_id):
+            if stage == "tidy":
+                tidy_obsid(data_dir, obs_id, event_store)
+            else:
+                functions[stage](data_dir, obs_id)
+    except Exception as e:
+        state["Failed"] = stage
+        state["Error"] = repr(e)
+        if os.path.isdir(os.path.join(data_dir, obs_id)):
+            _write_state(data_dir, obs_id, state)
+        raise
+
+    state["Completed"] = [completed for completed in stages if completed in state["Completed"] or completed == stage]
+    state["Failed"] = None
+    state["Error"] = ""
+    _write_state(data_dir, obs_id, state)
+
+def download_and_reprocess_obsid(data_dir, obs_id, event_store = False):
+    """Downloads and reprocesses the data for a given Chandra Obs. ID. Stages already completed by an earlier, interrupted run are skipped.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        event_store (bool, optional): Whether to also write a compact columnar copy of the event file with 'Events.write_event_store', which later extractions read through memory maps. Defaults to False.
+    """
+
+    obs_id = str(obs_id)
+    stage = next_stage(data_dir, obs_id)
+    while stage is not None:
+        run_stage(data_dir, obs_id, stage, event_store)
+        stage = next_stage(data_dir, obs_id)
+
+    if event_store and not ev.has_event_store(os.path.join(data_dir, obs_id, f"{obs_id}_evt2.fits")):
+        ev.write_event_store(os.path.join(data_dir, obs_id, f"{obs_id}_evt2.fits"))
@@ -0,0 +1,346 @@
+from ChandraPy import Metadata as md
+import json
+import numpy as np
+import os
+
+def read_events(event_file, columns = ("time", "energy"), extension = "EVENTS"):
+    """Returns columns of an event list as NumPy arrays, read straight from the FITS binary table. The file is memory mapped and the arrays
+       are views into it, so nothing is copied until the values are modified. Values keep the big-endian byte order of the file. If the
+       event file has an up to date columnar store (see 'write_event_store') holding all the columns, they're memory mapped from it instead.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        columns (list, optional): Names of the columns to be read (case insensitive). Defaults to ("time", "energy").
+        extension (str/int, optional): Name or index of the event list extension. Defaults to 'EVENTS'.
+
+    Returns:
+        dict: Dictionary mapping each lowercase column name to its NumPy array.
+    """
+
+    from astropy.io import fits
+
+    if extension == "EVENTS":
+        header = read_store_header(event_file)
+        if header is not None and all(column.lower() in header["COLUMNS"] for column in columns):
+            return read_event_store(event_file, columns)
+
+    with fits.open(event_file, memmap = True) as hdul:
+        data = hdul[extension].data
+        events = {column.lower(): data.field(column) for column in columns}
+
+    return events
+
+#Narrow dtypes used by the columnar store, columns absent from an event file are skipped. Energies keep the float32 of the event file, so
+#events near band edges and energy filters fall on the same side whether they're read from the store or the event file
+store_dtypes = {"time": np.float64,
+                "x": np.float32,
+                "y": np.float32,
+                "detx": np.float32,
+                "dety": np.float32,
+                "energy": np.float32,
+                "pi": np.uint16,
+                "ccd_id": np.uint8,
+                "samp": np.float32
+                }
+
+def store_path(event_file):
+    """Returns the path of the columnar store of an event file, '{Obs. ID}_evt2.fits' has its store in directory '{Obs. ID}_evt2.cols'.
+
+    Args:
+        event_file (str): Absolute path to event file.
+
+    Returns:
+        str: Absolute path to the directory of the columnar store.
+    """
+
+    return os.path.splitext(event_file)[0] + ".cols"
+
+def write_event_store(event_file):
+    """Writes a compact, time-sorted columnar copy of an event list next to it, with one '.npy' file per column in narrow dtypes and a 'header.json'
+       sidecar holding the header keywords and good time intervals.
+
+    Args:
+        event_file (str): Absolute path to event file.
+
+    Returns:
+        str: Absolute path to the directory of the columnar store.
+    """
+
+    from astropy.io import fits
+
+    directory = store_path(event_file)
+    os.makedirs(directory, exist_ok = True)
+    #The old header goes first, so the columns are read from the event file and an interrupted rewrite leaves no store that looks up to date
+    if os.path.exists(os.path.join(directory, "header.json")):
+        os.remove(os.path.join(directory, "header.json"))
+    metadata = md.event_metadata(event_file)
+    stat = os.stat(event_file)
+
+    with fits.open(event_file, memmap = True) as hdul:
+        names = [name.lower() for name in hdul["EVENTS"].columns.names]
+        n_rows = int(hdul["EVENTS"].header["NAXIS2"])
+    stored = {column: dtype for column, dtype in store_dtypes.items() if column in names}
+    columns = {column: np.dtype(dtype).name for column, dtype in stored.items()}
+
+    #Level 2 event lists are normally in time order already, then the store is filled a chunk at a time. Otherwise the whole list is sorted in memory
+    last, ordered = -np.inf, True
+    for chunk in iter_events(event_file, ["time"]):
+        ordered = ordered and bool(np.all(np.diff(chunk["time"]) >= 0)) and (len(chunk["time"]) == 0 or chunk["time"][0] >= last)
+        last = chunk["time"][-1] if len(chunk["time"]) else last
+    if ordered:
+        outputs = {column: np.lib.format.open_memmap(os.path.join(directory, f"{column}.npy"), mode = "w+", dtype = dtype, shape = (n_rows,)) for column, dtype in stored.items()}
+        start = 0
+        for chunk in iter_events(event_file, list(stored)):
+            stop = start + len(chunk["time"])
+            for column, dtype in stored.items():
+                outputs[column][start:stop] = _narrow(chunk[column], dtype)
+            start = stop
+        for output in outputs.values():
+            output.flush()
+        del outputs
+    else:
+        with fits.open(event_file, memmap = True) as hdul:
+            data = hdul["EVENTS"].data
+            sort = np.argsort(data.field("time"), kind = "stable")
+            for column, dtype in stored.items():
+                np.save(os.path.join(directory, f"{column}.npy"), _narrow(data.field(column)[sort], dtype))
+
+    header = {"OBS_ID": metadata.obs_id,
+              "INSTRUME": metadata.instrument,
+              "TSTART": metadata.tstart,
+              "TSTOP": metadata.tstop,
+              "TIMEDEL": metadata.timedel,
+              "DTCOR": metadata.dtcor,
+              "RA_TARG": metadata.ra_targ,
+              "DEC_TARG": metadata.dec_targ,
+              "ASOLFILE": metadata.asolfile,
+              "GTI": [{"CCD_ID": ccd_id, "START": start.tolist(), "STOP": stop.tolist()} for ccd_id, (start, stop) in metadata.gti.items()],
+              "NROWS": n_rows,
+              "COLUMNS": columns,
+              "SOURCE": {"FILE": os.path.basename(event_file), "MTIME_NS": stat.st_mtime_ns, "SIZE": stat.st_size}
+              }
+    with open(os.path.join(directory, "header.json"), "w") as file:
+        json.dump(header, file, indent = 4)
+
+    return directory
+
+def _narrow(values, dtype):
+    if np.issubdtype(dtype, np.integer):
+        limits = np.iinfo(dtype)
+        values = np.clip(np.rint(values), limits.min, limits.max)
+
+    return values.astype(dtype)
+
+def read_store_header(event_file):
+    """Returns the header sidecar of an event file's columnar store if it exists and is up to date with the event file.
+
+    Args:
+        event_file (str): Absolute path to event file.
+
+    Returns:
+        dict: Contents of 'header.json', or None if there's no store, the event file has changed since it was written or its dtypes aren't those of 'store_dtypes'.
+    """
+
+    header_file = os.path.join(store_path(event_file), "header.json")
+    if not os.path.exists(header_file):
+        return None
+
+    with open(header_file) as file:
+        header = json.load(file)
+    stat = os.stat(event_file)
+    if header["SOURCE"]["MTIME_NS"] != stat.st_mtime_ns or header["SOURCE"]["SIZE"] != stat.st_size:
+        return None
+    #Stores written with other dtypes, such as energies rounded to whole eV, are written again
+    if any(column in store_dtypes and dtype != np.dtype(store_dtypes[column]).name for column, dtype in header["COLUMNS"].items()):
+        return None
+
+    return header
+
+def has_event_store(event_file):
+    """Returns whether an event file has an up to date columnar store.
+
+    Args:
+        event_file (str): Absolute path to event file.
+
+    Returns:
+        bool: Whether the store exists and is up to date.
+    """
+
+    return read_store_header(event_file) is not None
+
+def read_event_store(event_file, columns = ("time", "energy")):
+    """Returns columns of an event file's columnar store as read-only memory-mapped NumPy arrays.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        columns (list, optional): Names of the columns to be read (case insensitive). Defaults to ("time", "energy").
+
+    Returns:
+        dict: Dictionary mapping each lowercase column name to its NumPy array.
+    """
+
+    directory = store_path(event_file)
+
+    return {column.lower(): np.load(os.path.join(directory, f"{column.lower()}.npy"), mmap_mode = "r") for column in columns}
+
+#Rows read at a time by 'iter_events'. Event lists with more rows are streamed in chunks of this size instead of being memory mapped whole,
+#so the memory a job uses is set by the chunk size rather than by the size of the file
+chunk_rows = int(os.environ.get("CHANDRAPY_CHUNK_ROWS", 1000000))
+
+def set_chunk_rows(rows):
+    """Sets the number of rows read at a time by 'iter_events' in this process, and above which event lists are streamed.
+
+    Args:
+        rows (int): Number of rows.
+    """
+
+    global chunk_rows
+    if int(rows) < 1:
+        raise ValueError(f"Chunks need at least one row, got {rows}")
+    chunk_rows = int(rows)
+
+def event_rows(event_file, extension = "EVENTS"):
+    """Returns the number of events in an event list, from its columnar store if it has one, or from the header of the event list extension.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        extension (str/int, optional): Name or index of the event list extension. Defaults to 'EVENTS'.
+
+    Returns:
+        int: Number of rows.
+    """
+
+    from astropy.io import fits
+
+    if extension == "EVENTS":
+        header = read_store_header(event_file)
+        if header is not None:
+            return int(header["NROWS"])
+
+    with fits.open(event_file, memmap = True) as hdul:
+        return int(hdul[extension].header["NAXIS2"])
+
+def streamed(event_file):
+    """Returns whether an event list has more rows than 'chunk_rows', in which case it's read with 'iter_events' rather than whole.
+
+    Args:
+        event_file (str): Absolute path to event file.
+
+    Returns:
+        bool: True if the event list is streamed.
+    """
+
+    return event_rows(event_file) > chunk_rows
+
+def iter_events(event_file, columns = ("time", "energy"), rows = None, extension = "EVENTS"):
+    """Yields columns of an event list in consecutive chunks of rows. Each chunk is read through its own memory-mapped window of the FITS
+       binary table (or of the columnar store, if the event file has an up to date one holding all the columns), which is released before
+       the next chunk, so only one chunk is in memory at a time whatever the size of the file.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        columns (list, optional): Names of the columns to be read (case insensitive). Defaults to ("time", "energy").
+        rows (int, optional): Number of rows per chunk. Defaults to None, in which case 'chunk_rows' is used.
+        extension (str/int, optional): Name or index of the event list extension. Defaults to 'EVENTS'.
+
+    Yields:
+        dict: Dictionary mapping each lowercase column name to a NumPy array of the chunk's values, in native byte order with column scaling applied.
+    """
+
+    from astropy.io import fits
+
+    rows = rows or chunk_rows
+    columns = [column.lower() for column in columns]
+    if extension == "EVENTS":
+        header = read_store_header(event_file)
+        if header is not None and all(column in header["COLUMNS"] for column in columns):
+            directory = store_path(event_file)
+            for start in range(0, int(header["NROWS"]), rows):
+                chunk = {}
+                for column in columns:
+                    window = np.load(os.path.join(directory, f"{column}.npy"), mmap_mode = "r")
+                    chunk[column] = np.array(window[start:start + rows])
+                    del window
+                yield chunk
+            return
+
+    with fits.open(event_file, memmap = True) as hdul:
+        hdu = hdul[extension]
+        n_rows = int(hdu.header["NAXIS2"])
+        offset = hdu.fileinfo()["datLoc"]
+        #Raw layout of a row on disk, big-endian, before 'TZERO'/'TSCAL' are applied
+        dtype = np.dtype([(column.name, np.dtype(column.format.recformat).newbyteorder(">")) for column in hdu.columns])
+        names = {column.name.lower(): column for column in hdu.columns}
+        missing = [column for column in columns if column not in names]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {event_file}")
+
+    for start in range(0, n_rows, rows):
+        window = np.memmap(event_file, dtype = dtype, mode = "r", offset = offset + start * dtype.itemsize, shape = (min(rows, n_rows - start),))
+        chunk = {}
+        for column in columns:
+            values = window[names[column].name]
+            values = values.astype(values.dtype.newbyteorder("="))
+            scale, zero = names[column].bscale, names[column].bzero
+            if values.dtype.kind == "i" and scale in (None, 1) and zero == 2 ** (8 * values.dtype.itemsize - 1):
+                #Unsigned integers are stored as signed ones offset by 'TZERO', as astropy reads them back
+                values = values.view(values.dtype.str.replace("i", "u")) ^ np.array(zero, dtype = values.dtype.str.replace("i", "u"))
+            elif scale not in (None, 1) or zero not in (None, 0):
+                values = values * (1. if scale is None else scale) + (0. if zero is None else zero)
+            chunk[column] = values
+        del window
+        yield chunk
+
+def column_statistics(event_file, columns, rows = None):
+    """Returns the minimum, maximum and mean of columns of an event list, accumulated over chunks from 'iter_events'.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        columns (list): Names of the columns (case insensitive).
+        rows (int, optional): Number of rows per chunk. Defaults to None, in which case 'chunk_rows' is used.
+
+    Returns:
+        dict: Dictionary mapping each lowercase column name to a dictionary with keys 'min', 'max', 'mean' and 'count'.
+    """
+
+    columns = [column.lower() for column in columns]
+    statistics = {column: {"min": np.inf, "max": -np.inf, "sum": 0., "count": 0} for column in columns}
+    for chunk in iter_events(event_file, columns, rows):
+        for column in columns:
+            values = chunk[column]
+            if len(values) == 0:
+                continue
+            accumulated = statistics[column]
+            accumulated["min"] = min(accumulated["min"], float(np.min(values)))
+            accumulated["max"] = max(accumulated["max"], float(np.max(values)))
+            accumulated["sum"] += float(np.sum(values, dtype = np.float64))
+            accumulated["count"] += len(values)
+
+    return {column: {"min": accumulated["min"], "max": accumulated["max"], "mean": accumulated["sum"] / accumulated["count"] if accumulated["count"] else np.nan, "count": accumulated["count"]}
+            for column, accumulated in statistics.items()}
+
+def histogram2d(event_file, columns, bins, ranges, rows = None):
+    """Bins two columns of an event list into an image, accumulated over chunks from 'iter_events'. Gives the same image as 'numpy.histogram2d'
+       on the whole columns.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        columns (list): Names of the columns along the first and second axes of the image (case insensitive), such as ['y', 'x'].
+        bins (tuple): Number of bins along each axis.
+        ranges (tuple): Tuple of (min, max) along each axis.
+        rows (int, optional): Number of rows per chunk. Defaults to None, in which case 'chunk_rows' is used.
+
+    Returns:
+        numpy.ndarray: 2-D array of counts.
+    """
+
+    first, second = (column.lower() for column in columns)
+    image = np.zeros(bins, dtype = np.float64)
+    for chunk in iter_events(event_file, [first, second], rows):
+        #Events outside the image are dropped before binning, most of a large event list usually is
+        a, b = chunk[first], chunk[second]
+        inside = (a >= ranges[0][0]) & (a <= ranges[0][1]) & (b >= ranges[1][0]) & (b <= ranges[1][1])
+        counts, _, _ = np.histogram2d(a[inside], b[inside], bins = bins, range = ranges)
+        image += counts
+
+    return image
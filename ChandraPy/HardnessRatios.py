@@ -0,0 +1,81 @@
+from ChandraPy import hr_bands
+import numpy as np
+import pandas as pd
+
+def ratio_posterior(counts_a, counts_b, prior = 0.5, grid_size = 1001, confidence = 0.68, chunk_size = None):
+    """Computes the posterior of the Hardness Ratio (A - B) / (A + B) for many bins at once. With Poisson counts and Gamma(prior) priors on
+       both intensities, as in BEHR without background, the fraction A / (A + B) has a Beta(counts_a + prior, counts_b + prior) posterior.
+       It's evaluated on one grid of Hardness Ratios shared by all bins, a chunk of bins at a time.
+
+    Args:
+        counts_a (numpy.ndarray): Array of counts in the bands of A.
+        counts_b (numpy.ndarray): Array of counts in the bands of B.
+        prior (float, optional): Index of the Gamma prior on both intensities, 0.5 is the Jeffreys prior and 1 a flat prior. Defaults to 0.5.
+        grid_size (int, optional): Number of points in the grid of Hardness Ratios between -1 and 1. Defaults to 1001.
+        confidence (float, optional): Probability held by the highest posterior density interval. Defaults to 0.68.
+        chunk_size (int, optional): Number of bins evaluated together. Defaults to None, in which case about 2e6 grid values are held at a time.
+
+    Returns:
+        dict: Dictionary with arrays 'HR' (ratio of the counts), 'Mode', 'Mean', 'Median', 'Lower' and 'Upper' (bounds of the interval). Bins with missing counts are NaN.
+    """
+
+    counts_a = np.asarray(counts_a, dtype = float)
+    counts_b = np.asarray(counts_b, dtype = float)
+    n_bins = len(counts_a)
+    alpha = counts_a + prior
+    beta = counts_b + prior
+    chunk_size = chunk_size or max(1, 2000000 // grid_size)
+
+    fraction = (np.arange(grid_size) + 0.5) / grid_size
+    grid = 2 * fraction - 1
+    log_fraction = np.log(fraction)
+    log_complement = np.log1p(-fraction)
+
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        estimates = {"HR": (counts_a - counts_b) / (counts_a + counts_b), "Mean": 2 * alpha / (alpha + beta) - 1}
+    for key in ("Mode", "Median", "Lower", "Upper"):
+        estimates[key] = np.full(n_bins, np.nan)
+
+    valid = np.flatnonzero(np.isfinite(alpha) & np.isfinite(beta))
+    for start in range(0, len(valid), chunk_size):
+        rows = valid[start:start + chunk_size]
+        log_posterior = (alpha[rows, None] - 1) * log_fraction + (beta[rows, None] - 1) * log_complement
+        posterior = np.exp(log_posterior - log_posterior.max(axis = 1, keepdims = True))
+        posterior /= posterior.sum(axis = 1, keepdims = True)
+
+        estimates["Mode"][rows] = grid[np.argmax(posterior, axis = 1)]
+        estimates["Median"][rows] = grid[np.argmax(np.cumsum(posterior, axis = 1) >= 0.5, axis = 1)]
+
+        #Highest posterior density: the densest grid points are added until they hold 'confidence' of the probability
+        ranked = -np.sort(-posterior, axis = 1)
+        last = np.argmax(np.cumsum(ranked, axis = 1) >= confidence, axis = 1)
+        inside = posterior >= ranked[np.arange(len(rows)), last][:, None]
+        estimates["Lower"][rows] = grid[np.argmax(inside, axis = 1)]
+        estimates["Upper"][rows] = grid[grid_size - 1 - np.argmax(inside[:, ::-1], axis = 1)]
+
+    return estimates
+
+def hardness_ratios(counts, ratios = hr_bands, prior = 0.5, grid_size = 1001, confidence = 0.68):
+    """Computes every configured Hardness Ratio, with posterior estimates and intervals, from the band counts of fixed bins or of Bayesian Blocks.
+
+    Args:
+        counts (pandas.core.frame.DataFrame): DataFrame with columns '{Band} Counts', such as a light curve with columns given by 'ChandraPy.order' or a Bayesian Blocks table.
+        ratios (dict, optional): Dictionary mapping each Hardness Ratio identifier to a tuple of lists of the bands added up in A and in B. Defaults to 'ChandraPy.hr_bands'.
+        prior (float, optional): Index of the Gamma prior on both intensities. Defaults to 0.5.
+        grid_size (int, optional): Number of points in the grid of Hardness Ratios between -1 and 1. Defaults to 1001.
+        confidence (float, optional): Probability held by the highest posterior density interval. Defaults to 0.68.
+
+    Returns:
+        pandas.core.frame.DataFrame: DataFrame with the index of 'counts' and columns '{identifier} HR', '{identifier} HR Mode', '{identifier} HR Mean', '{identifier} HR Median', '{identifier} HR Lower' and '{identifier} HR Upper' for every Hardness Ratio.
+    """
+
+    columns = {}
+    for identifier, (bands_a, bands_b) in ratios.items():
+        counts_a = sum(np.asarray(counts[f"{band} Counts"], dtype = float) for band in bands_a)
+        counts_b = sum(np.asarray(counts[f"{band} Counts"], dtype = float) for band in bands_b)
+        estimates = ratio_posterior(counts_a, counts_b, prior, grid_size, confidence)
+        columns[f"{identifier} HR"] = estimates["HR"]
+        for key in ("Mode", "Mean", "Median", "Lower", "Upper"):
+            columns[f"{identifier} HR {key}"] = estimates[key]
+
+    return pd.DataFrame(columns, index = counts.index)
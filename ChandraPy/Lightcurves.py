@@ -1,106 +1,239 @@
-from astropy.io import fits
-from astropy.stats import bayesian_blocks, histogram
-from astropy.table import Table
-from astropy.time import Time
-from ChandraPy import order, values
-from ChandraPy import Plotting as plot
+from ChandraPy import values
+from ChandraPy import Backends as backends
+from ChandraPy import Binning as binning
+from ChandraPy import Blocks as blocks
+from ChandraPy import Events as ev
+from ChandraPy import HardnessRatios as hrs
+from ChandraPy import Metadata as md
+from ChandraPy import Tracing as tracing
 from ChandraPy import Utilities as utils
-from ciao_contrib.runtool import dmextract, dmlist, dmkeypar
-import matplotlib
-from matplotlib.gridspec import GridSpec, GridSpecFromSubplotSpec
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MultipleLocator
 import numpy as np
 import os
 import pandas as pd
-from scipy.special import gammaln
+import pickle
 import warnings
 
-def acis_lightcurve_generator(obs_dir, data_dir, source, binsize, energy_min, energy_max, remove_intermediate = True):
-    """Generates ACIS light curves using 'dmextract', and returns it Pandas DataFrame.
+def source_events(obs_dir, data_dir, source, columns, energy_min = 200, energy_max = 8000):
+    """Returns the source's events. If the event file has an up to date columnar store they're filtered from it in-process, otherwise
+       the backend's 'region_events' filters them, which for CIAO creates an isolated event file and reads them from that.
 
     Args:
-        obs_dir (str): Absolute path to directory where light curves are to be saved.
+        obs_dir (str): Absolute path to directory where light curves are to be saved, It should have CIAO format region file of name '{Source}_{Obs. ID}.reg'.
         data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
-        source (str): Name of source, preferably in J2000 sexagecimal format.
-        binsize (int/float): Size of bins (s).
-        energy_min (int): Lower bound of energy band (eV).
-        energy_max (int): Upper bound of energy band (eV).
-        remove_intermediate (bool, optional): Whether to remove the intermediate '.lc' file that's created by 'dmextract'. Defaults to True.
+        source (str): Name of source in J2000 sexagecimal format.
+        columns (list): Names of the columns to be returned.
+        energy_min (int, optional): Lower bound of energy band (eV). Defaults to 200.
+        energy_max (int, optional): Upper bound of energy band (eV). Defaults to 8000.
 
     Returns:
-        pandas.core.frame.DataFrame: A Pandas DataFrame containing ACIS light curve generated by 'dmextract'.
+        tuple(events, region_event_file): Tuple containing a dictionary of arrays of the source's events, and the absolute path to the isolated event file, which is None if none was created.
     """
 
     obs_id = data_dir.split("/")[-1]
     event_file = os.path.join(data_dir, f"{obs_id}_evt2.fits")
+    if ev.has_event_store(event_file):
+        return utils.extract_region_events(obs_dir, data_dir, source, columns, energy_min, energy_max), None
+
     region_file = os.path.join(obs_dir, f"{source}_{obs_id}.reg")
-    outfile = os.path.join(obs_dir, f"{source}.lc")
-    timedel = float(dmkeypar(infile = event_file, keyword = "TIMEDEL", echo = True))
+    outfile = os.path.join(obs_dir, f"{source}_{obs_id}.fits")
+    filters = utils.region_filters(md.event_metadata(event_file).instrument, energy_min, energy_max)
 
-    dmextract.punlearn()
-    dmextract.infile = f"{event_file}[sky=region({region_file})][energy={energy_min}:{energy_max}][bin time=::{float(binsize) // timedel * timedel}]"
-    dmextract.outfile = outfile
-    dmextract.opt = "ltc1"
-    dmextract.clobber = "yes"
-    dmextract()
+    return backends.get_backend().region_events(event_file, region_file, columns, filters, outfile)
+
+def observation_exposure(data_dir, events):
+    """Returns what the exposure of the source's bins and blocks is computed from with 'Binning.live_exposure': the good time intervals of
+       the CCD most of its events fall on (ACIS) or of the detector (HRC), and the dead time correction, from the dead time factor file for HRC.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, event file should have name '{Obs. ID}_evt2.fits', and dtf file should have name '{Obs. ID}_dtf1.fits'.
+        events (dict): Dictionary of arrays of the source's events, with 'ccd_id' for ACIS.
 
-    with fits.open(outfile) as hdul:
-        table = Table(hdul[1].data)
-        df = table.to_pandas()
+    Returns:
+        tuple(gti_start, gti_stop, dtcor, dead_time): Tuple containing arrays of GTI start and stop times (s), 'DTCOR', and a tuple of arrays (times, dtf) or None.
+    """
 
-    if remove_intermediate:
-        os.remove(outfile)
+    metadata = md.observation_metadata(data_dir)
+    if metadata.instrument == "ACIS":
+        ccd_id = int(np.bincount(events["ccd_id"]).argmax()) if len(events["ccd_id"]) > 0 else None
+        dead_time = None
+    else:
+        ccd_id = None
+        obs_id = os.path.basename(os.path.normpath(data_dir))
+        dead_time = md.read_dead_time(os.path.join(data_dir, f"{obs_id}_dtf1.fits"))
+    gti_start, gti_stop = metadata.gti_for(ccd_id)
 
-    return df
+    return gti_start, gti_stop, metadata.dtcor, dead_time
 
-def hrc_lightcurve_generator(obs_dir, data_dir, source, binsize, remove_intermediate = True):
-    """Generates HRC light curves using 'dmextract', and returns it Pandas DataFrame.
+@tracing.traced("bin")
+def acis_multiband_lightcurve_generator(data_dir, events, binsize):
+    """Generates ACIS light curves for every band in 'ChandraPy.values' from a single pass over the source's events, and returns it as a Pandas DataFrame.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
+        events (dict): Dictionary with arrays 'time', 'energy' and 'ccd_id' of the source's events over the full energy range of the bands, as returned by 'source_events'.
+        binsize (int/float): Size of bins (s).
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns given by 'ChandraPy.order', trimmed to the first and last bins with non-zero exposure.
+    """
+
+    metadata = md.observation_metadata(data_dir)
+    gti_start, gti_stop, dtcor, dead_time = observation_exposure(data_dir, events)
+
+    return binning.multiband_lightcurve(events["time"], events["energy"], metadata.tstart, metadata.tstop, binsize, metadata.timedel, gti_start, gti_stop, dtcor, dead_time = dead_time)
+
+@tracing.traced("bin")
+def hrc_binned_lightcurve_generator(data_dir, events, binsize):
+    """Generates the HRC light curve from the source's events in-process, with the exposure of every bin from its GTI coverage and the dead
+       time factor file, and returns it as a Pandas DataFrame.
 
     Args:
-        obs_dir (str): Absolute path to directory where light curves are to be saved.
         data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, event file should have name '{Obs. ID}_evt2.fits', and dtf file should have name '{Obs. ID}_dtf1.fits'.
-        source (str): Name of source, preferably in J2000 sexagecimal format.
+        events (dict): Dictionary with array 'time' of the source's events, as returned by 'source_events'.
         binsize (int/float): Size of bins (s).
-        remove_intermediate (bool, optional): Whether to remove the intermediate '.lc' file that's created by 'dmextract'. Defaults to True.
 
     Returns:
-        pandas.core.frame.DataFrame: A Pandas DataFrame containing ACIS light curve generated by 'dmextract'.
+        pandas.core.frame.DataFrame: A Pandas DataFrame with the Broadband columns given by 'ChandraPy.order', trimmed to the first and last bins with non-zero exposure.
     """
-        
+
+    metadata = md.observation_metadata(data_dir)
+    gti_start, gti_stop, dtcor, dead_time = observation_exposure(data_dir, events)
+
+    return binning.multiband_lightcurves(events["time"], None, metadata.tstart, metadata.tstop, [binsize], metadata.timedel, gti_start, gti_stop, dtcor, dead_time = dead_time)[binsize]
+
+@tracing.traced("sweep")
+def compute_binsize_sweep(obs_dir, data_dir, source, binsizes, save = True):
+    """Generates the light curves of a source for several bin sizes from a single extraction of its events, to compare bin sizes without
+       running 'lightcurve_generation' again for each. Bin sizes are snapped down to multiples of 'TIMEDEL' as for a single light curve.
+
+    Args:
+        obs_dir (str): Absolute path to directory where light curves are to be saved. It should have CIAO format region file of name '{Source}_{Obs. ID}.reg'.
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, event file should have name {Obs. ID}_evt2.fits, and dtf file should have name {Obs. ID}_dtf1.fits.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+        binsizes (list): Sizes of bins (s).
+        save (bool, optional): Whether to save all the light curves in '{source}_{Obs. ID}_sweep.csv', with a 'Binsize' column telling them apart. Defaults to True.
+
+    Returns:
+        dict: Dictionary mapping each bin size to a Pandas DataFrame with columns given by 'ChandraPy.order' (only the Broadband ones for HRC).
+    """
+
     obs_id = data_dir.split("/")[-1]
-    event_file = os.path.join(data_dir, f"{obs_id}_evt2.fits")
-    dtf_file = os.path.join(data_dir, f"{obs_id}_dtf1.fits")
-    region_file = os.path.join(obs_dir, f"{source}_{obs_id}.reg")
-    outfile = os.path.join(obs_dir, f"{source}.lc")
-    timedel = float(dmkeypar(infile = event_file, keyword = "TIMEDEL", echo = True))
+    metadata = md.observation_metadata(data_dir)
+
+    with tracing.stage("extract"):
+        if metadata.instrument == "ACIS":
+            events, region_event_file = source_events(obs_dir, data_dir, source, ["time", "energy", "ccd_id"], values["Energy Min"].min(), values["Energy Max"].max())
+        else:
+            events, region_event_file = source_events(obs_dir, data_dir, source, ["time"], 100, 10000)
+        tracing.count("Events", len(events["time"]))
+    if region_event_file is not None:
+        os.remove(region_event_file)
+
+    energies = events["energy"] if metadata.instrument == "ACIS" else None
+    gti_start, gti_stop, dtcor, dead_time = observation_exposure(data_dir, events)
 
-    dmextract.punlearn()
-    dmextract.infile = f"{event_file}[sky=region({region_file})][samp=10:300][bin time=::{float(binsize) // timedel * timedel}]"
-    dmextract.outfile = outfile
-    dmextract.exp = dtf_file
-    dmextract.opt = "ltc1"
-    dmextract.clobber = "yes"
-    dmextract()
+    with tracing.stage("bin"):
+        lightcurves = binning.multiband_lightcurves(events["time"], energies, metadata.tstart, metadata.tstop, binsizes, metadata.timedel, gti_start, gti_stop, dtcor, dead_time = dead_time)
 
-    with fits.open(outfile) as hdul:
-        table = Table(hdul[1].data)
-        df = table.to_pandas()
+    if save:
+        with tracing.stage("csv.write"):
+            sweep = pd.concat([df.assign(Binsize = binsize) for binsize, df in lightcurves.items()], ignore_index = True)
+            sweep[["Binsize"] + [column for column in sweep.columns if column != "Binsize"]].to_csv(os.path.join(obs_dir, f"{source}_{obs_id}_sweep.csv"), index = False)
 
-    df = pd.DataFrame({"Bin": df["TIME_BIN"], "Time": df["TIME"], "Broadband Count Rate": df["COUNT_RATE"],"Broadband Counts": df["COUNTS"], "Count Rate Error": df["COUNT_RATE_ERR"], "Exposure": df["EXPOSURE"]})
-    first_valid = df[df["Exposure"] != 0].index.min()
-    last_valid = df[df["Exposure"] != 0].index.max()
-    df = df.loc[first_valid:last_valid].reset_index(drop = True)
-    df["Bin"] = range(1, len(df) + 1)
-    df = df.drop(columns = ["Exposure"])
+    return lightcurves
 
-    if remove_intermediate:
-        os.remove(outfile)
+def background_lightcurve(data_dir, events, background_events, binsize):
+    """Bins the background's events on the same grid as the source's light curve, with the source's exposure, so the rows of both match.
 
-    return df
+    Args:
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, event file should have name '{Obs. ID}_evt2.fits', and dtf file should have name '{Obs. ID}_dtf1.fits'.
+        events (dict): Dictionary of arrays of the source's events, as returned by 'Utilities.extract_source_background_events'.
+        background_events (dict): Dictionary of arrays of the background's events, with the same columns.
+        binsize (int/float): Size of bins (s).
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns given by 'ChandraPy.order', as the source's light curve.
+    """
+
+    metadata = md.observation_metadata(data_dir)
+    gti_start, gti_stop, dtcor, dead_time = observation_exposure(data_dir, events)
+    energies = background_events["energy"] if metadata.instrument == "ACIS" else None
+
+    return binning.multiband_lightcurves(background_events["time"], energies, metadata.tstart, metadata.tstop, [binsize], metadata.timedel, gti_start, gti_stop, dtcor, dead_time = dead_time)[binsize]
+
+def _add_background_columns(table, background_counts, scale):
+    #Adds background counts, scaled background rates and net rates of every band, and the Broadband net rate error, to a table of bins or blocks
+    bands = list(background_counts)
+    counts = np.column_stack([np.asarray(table[f"{band} Counts"], dtype = float) for band in bands])
+    background = np.column_stack([np.asarray(background_counts[band], dtype = float) for band in bands])
+    background_rates, net_rates, errors = binning.net_rates(counts, background, np.asarray(table["Exposure"], dtype = float), scale)
+    for i, band in enumerate(bands):
+        table[f"{band} Background Counts"] = background[:, i]
+        table[f"{band} Background Count Rate"] = background_rates[:, i]
+        table[f"{band} Net Count Rate"] = net_rates[:, i]
+    table["Net Count Rate Error"] = errors[:, bands.index("Broadband")]
+
+class LightcurveResult:
+    """Everything computed for one source in one Obs. ID, which is all 'render_lightcurves' needs to draw the light curve figure. It holds
+       plain arrays and DataFrames, so it can be sent to another process or saved with 'save_result' and rendered later.
+
+    Attributes:
+        obs_dir (str): Absolute path to directory where light curves are saved.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+        obs_id (str): The Obs. ID Number.
+        binsize (int/float): Size of bins (s).
+        p0 (int/float): Value of p0 used for Bayesian Blocks Segmentation.
+        metadata (ObservationMetadata): Header keywords and good time intervals of the event file.
+        lightcurve (pandas.core.frame.DataFrame): Binned light curves, with columns given by 'ChandraPy.order', as saved to '{source}_{Obs. ID}.csv'.
+        blocks (pandas.core.frame.DataFrame): Bayesian Blocks edges, intervals, counts and count rates, as saved to '{source}_{Obs. ID}_bb.csv'.
+        bin_edges (numpy.ndarray): Bayesian Blocks edges after likelihood merging (s), relative to 'TSTART'.
+        event_times (numpy.ndarray): Photon arrival times used for Bayesian Blocks (s), relative to 'TSTART' and spaced out within frame readout times.
+        event_energies (numpy.ndarray): Energies of the photons in 'event_times' (eV), None for HRC.
+        sky_stamp (dict): Sky coordinate postage stamp from 'Utilities.postage_stamps'.
+        detector_stamp (dict): Detector coordinate postage stamp from 'Utilities.postage_stamps'.
+        csv_file (str): Absolute path to the light curve CSV file.
+        hardness (pandas.core.frame.DataFrame): Hardness Ratios of the bins from 'HardnessRatios.hardness_ratios', as saved to '{source}_{Obs. ID}_hr.csv', None for HRC.
+        block_hardness (pandas.core.frame.DataFrame): Hardness Ratios of the Bayesian Blocks, None for HRC.
+        background_scale (float): Ratio of the source area to the background annulus area, None if the background wasn't subtracted.
+        segment_edges (numpy.ndarray): Bayesian Blocks edges before likelihood merging (s), relative to 'TSTART', which 'merge_lightcurve_blocks' starts from.
+        exposure_inputs (tuple): Good time intervals and dead time correction of the source from 'observation_exposure'.
+        background_times (numpy.ndarray): Arrival times of the background's photons (s), relative to 'TSTART' and spaced out within frame readout times, None if the background wasn't subtracted.
+        background_energies (numpy.ndarray): Energies of the photons in 'background_times' (eV), None for HRC or if the background wasn't subtracted.
+        off_axis_angle (float): Off-axis angle of the source's events (arcmin), from 'Utilities.retrieve_obs_info', shown above the postage stamps.
+    """
 
-def lightcurve_generation(obs_dir, data_dir, source, binsize, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, bkg_sub = False):
-    """Generates a complete set of ACIS/HRC light curves for a given source.
+    def __init__(self, obs_dir, source, obs_id, binsize, p0, metadata, lightcurve, blocks, bin_edges, event_times, event_energies, sky_stamp, detector_stamp, csv_file, hardness = None, block_hardness = None, background_scale = None,
+                 segment_edges = None, exposure_inputs = None, background_times = None, background_energies = None, off_axis_angle = None):
+        self.obs_dir = obs_dir
+        self.source = source
+        self.obs_id = obs_id
+        self.binsize = binsize
+        self.p0 = p0
+        self.metadata = metadata
+        self.lightcurve = lightcurve
+        self.blocks = blocks
+        self.bin_edges = bin_edges
+        self.event_times = event_times
+        self.event_energies = event_energies
+        self.sky_stamp = sky_stamp
+        self.detector_stamp = detector_stamp
+        self.csv_file = csv_file
+        self.hardness = hardness
+        self.block_hardness = block_hardness
+        self.background_scale = background_scale
+        self.segment_edges = segment_edges
+        self.exposure_inputs = exposure_inputs
+        self.background_times = background_times
+        self.background_energies = background_energies
+        self.off_axis_angle = off_axis_angle
+
+@tracing.traced("compute")
+def compute_lightcurves(obs_dir, data_dir, source, binsize, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, background = False):
+    """Extracts the source's events, bins the light curves, runs Bayesian Blocks Segmentation and builds the postage stamps, without drawing
+       anything. Saves the light curves as '{source}_{Obs. ID}.csv' and the Bayesian Blocks as '{source}_{Obs. ID}_bb.csv'. For ACIS, the Hardness Ratios of the bins
+       are saved as '{source}_{Obs. ID}_hr.csv'. With 'background', the events of an annulus around the source ('Utilities.background_annulus')
+       are extracted in the same pass as the source's, and the bins and blocks get background counts, area scaled background rates and net rates
+       of every band, and a Broadband 'Net Count Rate Error'.
 
     Args:
         obs_dir (str): Absolute path to directory where light curves are to be saved.
@@ -110,495 +243,403 @@ def lightcurve_generation(obs_dir, data_dir, source, binsize, p0 = 5, likelihood
         p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
         likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
         seed (int, optional): Seed used by numpy to add randomization to event list to space out events within frame readout times. Defaults to 1.
-        bkg_sub (bool, optional): _description_. Defaults to False.
+        background (bool, optional): Whether to subtract the background. Defaults to False.
 
     Returns:
-        bool: A boolean value that tells the user whether the set of light curves was successfully generated or not.
+        LightcurveResult: The computed light curves, or None if the source has no counts, in which case no files are kept.
     """
 
-    os.chdir(obs_dir)
     np.random.seed(seed)
-    status = True
-    chandra_mjd_ref = 50814.0
     obs_id = data_dir.split("/")[-1]
     event_file = os.path.join(data_dir, f"{obs_id}_evt2.fits")
-    tstart = float(dmkeypar(infile = event_file, keyword = "TSTART", echo = True))
-    tstop = float(dmkeypar(infile = event_file, keyword = "TSTOP", echo = True))
-    instrument = utils.instrument_checker(event_file)
-    
-    if bkg_sub:
-        if instrument == "ACIS":
-            df = pd.DataFrame()
-            for _, row in values.iterrows():
-                band = row["Band"]
-                energy_min = row["Energy Min"]
-                energy_max = row["Energy Max"]
+    metadata = md.observation_metadata(data_dir)
+    tstart = metadata.tstart
+    tstop = metadata.tstop
+    timedel = metadata.timedel
+    instrument = metadata.instrument
+
+    #One extraction (over the full energy range for ACIS) is binned into the light curves, and reused for Bayesian Blocks and the postage stamps
+    if instrument == "ACIS":
+        columns, energy_min, energy_max = ["time", "energy", "ccd_id", "x", "y", "detx", "dety"], values["Energy Min"].min(), values["Energy Max"].max()
+    else:
+        columns, energy_min, energy_max = ["time", "pi", "x", "y", "detx", "dety"], 100, 10000
+    background_events = None
+    scale = None
+    with tracing.stage("extract"):
+        if background:
+            events, background_events, scale = utils.extract_source_background_events(obs_dir, data_dir, source, columns, energy_min, energy_max)
+            region_event_file = None
+        else:
+            events, region_event_file = source_events(obs_dir, data_dir, source, columns, energy_min, energy_max)
+        tracing.count("Events", len(events["time"]))
+    if instrument == "ACIS":
+        df = acis_multiband_lightcurve_generator(data_dir, events, binsize)
+    else:
+        df = hrc_binned_lightcurve_generator(data_dir, events, binsize)
+    bands = [band for band in values["Band"] if f"{band} Counts" in df.columns]
+    if background_events is not None:
+        with tracing.stage("background"):
+            background_df = background_lightcurve(data_dir, events, background_events, binsize)
+            _add_background_columns(df, {band: background_df[f"{band} Counts"].to_numpy() for band in bands}, scale)
+
+    final_csv = os.path.join(obs_dir, f"{source}_{obs_id}.csv")
+    with tracing.stage("csv.write"):
+        df.to_csv(final_csv, index = False)
+
+    if df["Broadband Counts"].sum() == 0:
+        os.remove(final_csv)
+        if region_event_file is not None:
+            os.remove(region_event_file)
+        return None
+
+    sky_stamp, detector_stamp = utils.postage_stamps(event_file, events, 256, 128)
+    event_times = events["time"] - tstart
+    event_times += np.random.uniform(0, timedel, size = len(event_times))
+    with tracing.stage("blocks.segment"):
+        segment_edges = blocks.bayesian_blocks(event_times, p0)
+    segment_edges[-1] = tstop - tstart
+    event_energies = np.array(events["energy"]) if instrument == "ACIS" else None
+
+    background_times = None
+    background_energies = None
+    if background_events is not None:
+        background_times = np.asarray(background_events["time"], dtype = float) - tstart
+        background_times += np.random.uniform(0, timedel, size = len(background_times))
+        background_energies = np.array(background_events["energy"]) if instrument == "ACIS" else None
+
+    if region_event_file is not None:
+        os.remove(region_event_file)
+    #Found here rather than when rendering, so rendering needs neither the event file nor the backend
+    _, _, off_axis_angle, _, _, _ = utils.retrieve_obs_info(event_file)
+
+    hardness = None
+    if instrument == "ACIS":
+        with tracing.stage("hardness"):
+            hardness = hrs.hardness_ratios(df)
+        with tracing.stage("csv.write"):
+            pd.concat((df[["Bin", "Time"]], hardness), axis = 1).to_csv(os.path.join(obs_dir, f"{source}_{obs_id}_hr.csv"), index = False)
+
+    result = LightcurveResult(obs_dir, source, obs_id, binsize, p0, metadata, df, None, None, np.asarray(event_times), event_energies, sky_stamp, detector_stamp, final_csv, hardness, None, scale,
+                              segment_edges, observation_exposure(data_dir, events), background_times, background_energies, off_axis_angle)
+
+    return merge_lightcurve_blocks(result, likelihood_threshold)
+
+def merge_lightcurve_blocks(result, likelihood_threshold = np.log(1e-3)):
+    """Merges the Bayesian Blocks of a computed result with a likelihood threshold, and saves them as '{source}_{Obs. ID}_bb.csv'. Only the
+       blocks depend on the threshold, so a result can be merged again with another one without extracting or segmenting its events again.
+
+    Args:
+        result (LightcurveResult): Result returned by 'compute_lightcurves', or loaded with 'load_result'.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
 
-                lc_data = acis_lightcurve_generator(obs_dir, data_dir, source, binsize, energy_min, energy_max, band)
+    Returns:
+        LightcurveResult: The same result, with 'blocks', 'bin_edges' and 'block_hardness' replaced.
+    """
 
-                df["Bin"] = lc_data["TIME_BIN"]
-                df["Time"] = lc_data["TIME"]
-                df[f"{band} Count Rate"] = lc_data["COUNT_RATE"]
-                df["Bin"] = lc_data["TIME_BIN"]
-                df[f"{band} Counts"] = lc_data["COUNTS"]
+    event_times = result.event_times
+    event_energies = result.event_energies
+    tstart = result.metadata.tstart
+    instrument = result.metadata.instrument
+    bin_edges = np.array(result.segment_edges, dtype = float)
+    counts_bb, _ = np.histogram(event_times, bin_edges)
+    with tracing.stage("blocks.merge"):
+        bin_edges, counts_bb, _ = blocks.merge_blocks(bin_edges, counts_bb, likelihood_threshold)
+        tracing.count("Blocks", len(bin_edges) - 1)
+    time_intervals = np.diff(bin_edges)
+    #Blocks span gaps in the good time intervals, so their rates are taken over the live time they cover
+    gti_start, gti_stop, dtcor, dead_time = result.exposure_inputs
+    exposure = binning.live_exposure(bin_edges + tstart, gti_start, gti_stop, dtcor, dead_time)
+    live = exposure > 0
+
+    bb_dict = {"Bin Edges": bin_edges, "Time Intervals": time_intervals, "Exposure": exposure}
+    if instrument == "ACIS":
+        for _, row in values.iterrows():
+            band = row["Band"]
+            if band == "Broadband":
+                counts_bb, _ = np.histogram(event_times, bin_edges)
+            else:
+                counts_bb, _ = np.histogram(event_times[(event_energies >= row["Energy Min"]) & (event_energies < row["Energy Max"])], bin_edges)
+            bb_dict[f"{band} Counts"] = counts_bb
+            bb_dict[f"{band} Count Rate"] = np.divide(counts_bb, exposure, out = np.zeros(len(exposure)), where = live)
+    else:
+        bb_dict["Broadband Counts"] = counts_bb
+        bb_dict["Broadband Count Rate"] = np.divide(counts_bb, exposure, out = np.zeros(len(exposure)), where = live)
+
+    if result.background_times is not None:
+        with tracing.stage("background"):
+            background_times = result.background_times
+            background_energies = result.background_energies
+            block_background = {}
+            for _, row in values[values["Band"].isin([band for band in values["Band"] if f"{band} Counts" in bb_dict])].iterrows():
+                if row["Band"] == "Broadband":
+                    block_background[row["Band"]], _ = np.histogram(background_times, bin_edges)
+                else:
+                    block_background[row["Band"]], _ = np.histogram(background_times[(background_energies >= row["Energy Min"]) & (background_energies < row["Energy Max"])], bin_edges)
+            _add_background_columns(bb_dict, block_background, result.background_scale)
 
-                if band == "Broadband":
-                    df["Count Rate Error"] = lc_data["COUNT_RATE_ERR"]
-                    df["Exposure"] = lc_data["EXPOSURE"]
+    max_len = max(len(v) for v in bb_dict.values())
 
-            #Trim off 0 data
-            first_valid = df[df["Exposure"] != 0].index.min()
-            last_valid = df[df["Exposure"] != 0].index.max()
-            df = df.loc[first_valid:last_valid].reset_index(drop = True)
-            df["Bin"] = range(1, len(df) + 1)
-            df["Time"] -= tstart
-            df = df[order]
+    for key, arr in bb_dict.items():
+        arr = np.asarray(arr, dtype = float)
+        pad_width = max_len - len(arr)
+        padded = np.pad(arr, (pad_width, 0), mode = "constant", constant_values = np.nan)
+        bb_dict[key] = padded
 
-        else:
-            df = hrc_lightcurve_generator(obs_dir, data_dir, source, binsize)
-            df["Time"] -= tstart
+    bb_df = pd.DataFrame(bb_dict)
+    with tracing.stage("csv.write"):
+        bb_df.to_csv(os.path.join(result.obs_dir, f"{result.source}_{result.obs_id}_bb.csv"), index = False)
 
-        final_csv = os.path.join(obs_dir, f"{source}_{obs_id}.csv")
-        df.to_csv(final_csv, index = False)
+    result.blocks = bb_df
+    result.bin_edges = bin_edges
+    result.block_hardness = None
+    if instrument == "ACIS":
+        with tracing.stage("hardness"):
+            result.block_hardness = hrs.hardness_ratios(bb_df)
+
+    return result
+
+@tracing.traced("result.save")
+def save_result(result, result_file = None):
+    """Saves a light curve result so it can be rendered later, possibly by another process.
+
+    Args:
+        result (LightcurveResult): Result returned by 'compute_lightcurves'.
+        result_file (str, optional): Absolute path to the file to be written. Defaults to None, in which case '{source}_{Obs. ID}_result.pkl' in the result's directory is used.
+
+    Returns:
+        str: Absolute path to the saved file.
+    """
+
+    if result_file is None:
+        result_file = os.path.join(result.obs_dir, f"{result.source}_{result.obs_id}_result.pkl")
+    with open(result_file, "wb") as file:
+        pickle.dump(result, file, protocol = pickle.HIGHEST_PROTOCOL)
+
+    return result_file
+
+def load_result(result_file):
+    """Loads a light curve result saved by 'save_result'.
+
+    Args:
+        result_file (str): Absolute path to the saved file.
+
+    Returns:
+        LightcurveResult: The saved result.
+    """
+
+    with open(result_file, "rb") as file:
+        return pickle.load(file)
+
+@tracing.traced("render")
+def render_lightcurves(result, image_format = "svg", dpi = None):
+    """Draws the light curve figure of a computed result and saves it as '{source}_{Obs. ID}.{image_format}' in the result's directory.
+       Everything drawn comes from the result, so neither the event file nor the backend are needed.
+
+    Args:
+        result (LightcurveResult/str): Result returned by 'compute_lightcurves', or absolute path to a result saved by 'save_result'.
+        image_format (str, optional): Format of the saved figure, 'svg' for vector output or a raster format such as 'png', which is much smaller and faster to save for long observations. Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+
+    Returns:
+        str: Absolute path to the saved figure.
+    """
+
+    #Plotting dependencies are only loaded here, so workers that only compute light curves never import them
+    from astropy.time import Time
+    import matplotlib
+    matplotlib.use("agg")
+    from ChandraPy import Plotting as plot
+    from matplotlib.gridspec import GridSpec, GridSpecFromSubplotSpec
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MultipleLocator
 
-        if df["Broadband Counts"].sum() == 0:
-            os.remove(final_csv)
-            status = False
+    if isinstance(result, str):
+        result = load_result(result)
+
+    chandra_mjd_ref = 50814.0
+    obs_dir = result.obs_dir
+    source = result.source
+    obs_id = result.obs_id
+    binsize = result.binsize
+    p0 = result.p0
+    #Plotters scale rates in place, so they draw from a copy and the result can be rendered again
+    df = result.lightcurve.copy()
+    bin_edges = result.bin_edges
+    event_times = result.event_times
+    exposure = result.blocks["Exposure"].to_numpy()[1:]
+    event_energies = result.event_energies
+    final_csv = result.csv_file
+    tstart = result.metadata.tstart
+    tstop = result.metadata.tstop
+    timedel = result.metadata.timedel
+    instrument = result.metadata.instrument
+    image_file = os.path.join(obs_dir, f"{source}_{obs_id}.{image_format}")
+
+    start_time_days = tstart / 86400.0  
+    observation_mjd = chandra_mjd_ref + start_time_days
+    observation_date = Time(observation_mjd, format = "mjd").to_datetime()
+    readable_date = observation_date.strftime("%B %d, %Y %I:%M:%S %p")
+    observation_duration = (tstop - tstart) / 1000
+    total_counts = df["Broadband Counts"].sum()
+    width = 12 * (500 / (float(binsize) if 250 <= float(binsize) < 500 else (2 * float(binsize) if float(binsize) < 250 else 500)))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        if instrument == "ACIS":
+            nrows = 6
+            fig, (postage_stamp_plot, broadband_rate_plot, bayesian_blocks_plot, broadband_counts_plot, cumulative_counts_plot, hr_plot) = plt.subplots(
+                    nrows = nrows, ncols = 1, figsize = (width, nrows * 4), layout = "constrained")
         else:
-            print()
-            #Add Code for plotting
-    else:
+            nrows = 5
+            fig, (postage_stamp_plot, broadband_rate_plot, bayesian_blocks_plot, broadband_counts_plot, cumulative_counts_plot) = plt.subplots(
+                    nrows = nrows, ncols = 1, figsize = (width, nrows * 4), layout = "constrained")
+            
+        gs = GridSpec(nrows + 1, 1, figure = fig)
+        
+        #Background subtracted results plot net rates, which can be negative, with the area scaled background rate
+        net = "Broadband Net Count Rate" in df.columns
+        rate_column, error_column = ("Broadband Net Count Rate", "Net Count Rate Error") if net else ("Broadband Count Rate", "Count Rate Error")
+        rate_scale = timedel if instrument == "ACIS" else None
+        plt.sca(broadband_rate_plot)
+        broadband_rate_plot.plot(*plot.decimate((df["Time"] - tstart) / 1000, df[rate_column] * (rate_scale or 1)), color = "gray", linewidth = 0.75)
+        plot.rate_plotter(plt, np.array((df["Time"] - tstart) / 1000), df[rate_column], "black", df[error_column], rate_scale)
+        if net:
+            plot.rate_plotter(plt, np.array((df["Time"] - tstart) / 1000), df["Broadband Background Count Rate"], "blue", None, rate_scale, text = "Background", dashed = True)
+            broadband_rate_plot.legend(loc = "upper right", frameon = False, fontsize = 9)
+
+        rate_range = max(df[rate_column] + df[error_column]) - min(df[rate_column] - df[error_column])
+        broadband_rate_plot.set_title(f"(A) Broadband {'Net ' if net else ''}Count Rate", fontsize = 14, y = 1.04)
+        broadband_rate_plot.set_xlim([0, observation_duration])
+        broadband_rate_plot.set_ylim(bottom = min(0, min(df[rate_column] - df[error_column])) - 0.025 * rate_range)
+        broadband_rate_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
+        broadband_rate_plot.yaxis.set_label_coords(-0.045, 0.5)
+        broadband_rate_plot.xaxis.set_major_locator(MultipleLocator(5))
+        broadband_rate_plot.xaxis.set_minor_locator(MultipleLocator(1))
+        broadband_rate_plot.text(0.005, 1.135, f"Source: {source}\nObs. ID: {obs_id}", transform = broadband_rate_plot.transAxes, fontsize = 11.5, ha = "left", va = "top", bbox = dict(facecolor = "white", linewidth = 0.85))
+        broadband_rate_plot.text(0.995, 1.135, f"Start: {readable_date}\nTimeDel: {timedel}", transform = broadband_rate_plot.transAxes, fontsize = 11.5, ha = "right", va = "top", multialignment = "left", bbox = dict(facecolor = "white", linewidth = 0.85))
+
+        plt.sca(bayesian_blocks_plot)
+        if "Broadband Background Count Rate" in result.blocks.columns:
+            background_rates = result.blocks["Broadband Background Count Rate"].to_numpy()[1:]
+            bayesian_blocks_plot.step(bin_edges / 1000, np.append(background_rates, background_rates[-1]), where = "post", color = "blue", linestyle = "dotted", linewidth = 1, label = "Background")
         if instrument == "ACIS":
-            df = pd.DataFrame()
             for _, row in values.iterrows():
                 band = row["Band"]
                 energy_min = row["Energy Min"]
                 energy_max = row["Energy Max"]
-
-                lc_data = acis_lightcurve_generator(obs_dir, data_dir, source, binsize, energy_min, energy_max, band)
-
-                df["Bin"] = lc_data["TIME_BIN"]
-                df["Time"] = lc_data["TIME"]
-                df[f"{band} Count Rate"] = lc_data["COUNT_RATE"]
-                df["Bin"] = lc_data["TIME_BIN"]
-                df[f"{band} Counts"] = lc_data["COUNTS"]
+                color = row["Color"]
+                text = row["Text"]
 
                 if band == "Broadband":
-                    df["Count Rate Error"] = lc_data["COUNT_RATE_ERR"]
-                    df["Exposure"] = lc_data["EXPOSURE"]
-
-            first_valid = df[df["Exposure"] != 0].index.min()
-            last_valid = df[df["Exposure"] != 0].index.max()
-            df = df.loc[first_valid:last_valid].reset_index(drop = True)
-            df["Bin"] = range(1, len(df) + 1)
-            df = df[order]
-        else:
-            df = hrc_lightcurve_generator(obs_dir, data_dir, source, binsize)
-            first_valid = df[df["Broadband Counts"] != np.nan].index.min()
-
-        final_csv = os.path.join(obs_dir, f"{source}_{obs_id}.csv")
-        df.to_csv(final_csv, index = False)
+                    plot.bayesian_blocks_plotter(plt, event_times, bin_edges, color, text, True, exposure = exposure)
+                else:
+                    plot.bayesian_blocks_plotter(plt, event_times[(event_energies >= energy_min) & (event_energies < energy_max)], bin_edges, color, text, False, 0.6, exposure = exposure)
 
-        if df["Broadband Counts"].sum() == 0:
-            os.remove(final_csv)
-            status = False
+            bayesian_blocks_plot.set_title(fr"(B) Bayesian Blocks Segmentation: $p_0 = {p0}$", fontsize = 14, y = 1.07)
+            bayesian_blocks_plot.legend(loc = "upper center", bbox_to_anchor = (0.5, 1.0985), ncol = len(bayesian_blocks_plot.get_legend_handles_labels()[1]), frameon = False, fontsize = 8.35, columnspacing = 1)
         else:
-            start_time_days = tstart / 86400.0  
-            observation_mjd = chandra_mjd_ref + start_time_days
-            observation_date = Time(observation_mjd, format = "mjd").to_datetime()
-            readable_date = observation_date.strftime("%B %d, %Y %I:%M:%S %p")
-            observation_duration = (tstop - tstart) / 1000
-            total_counts = df["Broadband Counts"].sum()
-            timedel = float(dmkeypar(infile = os.path.join(data_dir, f"{obs_id}_evt2.fits"), keyword = "TIMEDEL", echo = True))
-            width = 12 * (500 / (float(binsize) if 250 <= float(binsize) < 500 else (2 * float(binsize) if float(binsize) < 250 else 500)))
-            matplotlib.use("agg")
-
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", UserWarning)
-                if instrument == "ACIS":
-                    nrows = 6
-                    fig, (postage_stamp_plot, broadband_rate_plot, bayesian_blocks_plot, broadband_counts_plot, cumulative_counts_plot, hr_plot) = plt.subplots(
-                            nrows = nrows, ncols = 1, figsize = (width, nrows * 4), layout = "constrained")
-                else:
-                    nrows = 5
-                    fig, (postage_stamp_plot, broadband_rate_plot, bayesian_blocks_plot, broadband_counts_plot, cumulative_counts_plot) = plt.subplots(
-                            nrows = nrows, ncols = 1, figsize = (width, nrows * 4), layout = "constrained")
-                    
-                gs = GridSpec(nrows + 1, 1, figure = fig)
+            plot.bayesian_blocks_plotter(plt, event_times, bin_edges, "black", "", True, exposure = exposure)
+            bayesian_blocks_plot.set_title(fr"(B) Bayesian Blocks Segmentation: $p_0 = {p0}$", fontsize = 14, y = 1.04)
                 
-                plt.sca(broadband_rate_plot)
-                if instrument == "ACIS":
-                    broadband_rate_plot.plot((df["Time"] - tstart) / 1000, df["Broadband Count Rate"] * timedel, color = "gray", linewidth = 0.75)
-                    plot.rate_plotter(plt, np.array((df["Time"] - tstart) / 1000), df["Broadband Count Rate"], "black", df["Count Rate Error"], timedel)
-                else:
-                    broadband_rate_plot.plot((df["Time"] - tstart) / 1000, df["Broadband Count Rate"], color = "gray", linewidth = 0.75)
-                    plot.rate_plotter(plt, np.array((df["Time"] - tstart) / 1000), df["Broadband Count Rate"], "black", df["Count Rate Error"])
-
-                rate_range = max(df["Broadband Count Rate"] + df["Count Rate Error"]) - min(df["Broadband Count Rate"] - df["Count Rate Error"])
-                broadband_rate_plot.set_title("(A) Broadband Count Rate", fontsize = 14, y = 1.04)
-                broadband_rate_plot.set_xlim([0, observation_duration])
-                broadband_rate_plot.set_ylim(bottom = 0 - 0.025 * rate_range)
-                broadband_rate_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
-                broadband_rate_plot.yaxis.set_label_coords(-0.045, 0.5)
-                broadband_rate_plot.xaxis.set_major_locator(MultipleLocator(5))
-                broadband_rate_plot.xaxis.set_minor_locator(MultipleLocator(1))
-                broadband_rate_plot.text(0.005, 1.135, f"Source: {source}\nObs. ID: {obs_id}", transform = broadband_rate_plot.transAxes, fontsize = 11.5, ha = "left", va = "top", bbox = dict(facecolor = "white", linewidth = 0.85))
-                broadband_rate_plot.text(0.995, 1.135, f"Start: {readable_date}\nTimeDel: {timedel}", transform = broadband_rate_plot.transAxes, fontsize = 11.5, ha = "right", va = "top", multialignment = "left", bbox = dict(facecolor = "white", linewidth = 0.85))
-
-                plt.sca(bayesian_blocks_plot)
-                bb_dict = {}
-                if instrument == "ACIS":
-                    region_event_file, instrument = utils.isolate_source_region(obs_dir, data_dir, source)
-                    sky_image, detector_image = utils.create_postage_stamps(obs_dir, source, region_event_file, event_file, 256, 128)
-                    dmlist(infile = f"{region_event_file}[cols time,energy]", outfile = f"{region_event_file}.txt", opt = "data,raw")
-                    broadband_event_list = Table.read(filename = f"{region_event_file}.txt", format = "ascii").to_pandas()
-                    broadband_event_list.rename(columns = {"time": "Time", "energy": "Energy"}, inplace = True)
-                    broadband_event_list["Time"] -= tstart
-                    broadband_event_list["Time"] += np.random.uniform(0, timedel, size = len(broadband_event_list["Time"]))
-                    bin_edges = np.array(bayesian_blocks(broadband_event_list["Time"], fitness = "events", p0 = p0))
-                    bin_edges[-1] = tstop - tstart
-                    counts_bb, _ = histogram(broadband_event_list["Time"], bin_edges)
-                    time_intervals = np.diff(bin_edges)
-                    count_rates = counts_bb / time_intervals
-
-                    i = 0
-                    while i < len(time_intervals):
-                        if (time_intervals[i] < 20 or counts_bb[i] < 5):
-                            if i == 0:
-                                if count_rates[i] > count_rates[i + 1] and not counts_bb[i] > counts_bb[i + 1]:
-                                    counts_bb[i + 1] += counts_bb[i]
-                                    counts_bb = np.delete(counts_bb, i)
-                                    bin_edges = np.delete(bin_edges, i + 1)
-                                else:
-                                    i += 1
-                                    continue
-                            elif i == len(time_intervals) - 1:
-                                if count_rates[i] > count_rates[i - 1] and not counts_bb[i] > counts_bb[i - 1]:
-                                    counts_bb[i - 1] += counts_bb[i]
-                                    counts_bb = np.delete(counts_bb, i)
-                                    bin_edges = np.delete(bin_edges, i)
-                                    i -= 1
-                                else:
-                                    break
-                            else:
-                                right_diff = count_rates[i + 1] - count_rates[i]
-                                left_diff = count_rates[i - 1] - count_rates[i]
-                                if count_rates[i] > count_rates[i - 1] and count_rates[i] > count_rates[i + 1] and not (counts_bb[i] > counts_bb[i - 1] and counts_bb[i] > counts_bb[i + 1]):
-                                    if abs(left_diff) < abs(right_diff):
-                                        counts_bb[i - 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i)
-                                        i -= 1
-                                    else:
-                                        counts_bb[i + 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i + 1)
-                                        i += 1
-                                else:
-                                    i += 1
-                                    continue
-                        else:
-                            i += 1
-                            continue
-
-                        time_intervals = np.diff(bin_edges)
-                        count_rates = counts_bb / time_intervals
-
-                    i = 0
-                    while i < len(time_intervals):
-                        if time_intervals[i] < 100:
-                            if i == 0:
-                                if count_rates[i] > count_rates[i + 1]:
-                                    ln_next_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i + 1] * time_intervals[i])) - (count_rates[i + 1] * time_intervals[i])
-                                    if not ln_next_likelihood < likelihood_threshold:
-                                        counts_bb[i + 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i + 1)
-                                    else:
-                                        i += 1
-                                        continue
-                                else:
-                                    i += 1
-                                    continue
-
-                            elif i == len(time_intervals) - 1:
-                                if count_rates[i] > count_rates[i - 1]:
-                                    ln_previous_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i - 1] * time_intervals[i])) - (count_rates[i - 1] * time_intervals[i])
-                                    if not ln_previous_likelihood < likelihood_threshold:
-                                        counts_bb[i - 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i)
-                                        i -= 1
-                                    else:
-                                        break
-                                else:
-                                    break
-
-                            else:
-                                if count_rates[i] > count_rates[i - 1] and count_rates[i] > count_rates[i + 1]:
-                                    ln_next_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i + 1] * time_intervals[i])) - (count_rates[i + 1] * time_intervals[i])
-                                    ln_previous_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i - 1] * time_intervals[i])) - (count_rates[i - 1] * time_intervals[i])
-                                    if not np.max([ln_previous_likelihood, ln_next_likelihood]) < likelihood_threshold:
-                                        if ln_previous_likelihood > ln_next_likelihood:
-                                            counts_bb[i - 1] += counts_bb[i]
-                                            counts_bb = np.delete(counts_bb, i)
-                                            bin_edges = np.delete(bin_edges, i)
-                                            i -= 1
-                                        else:
-                                            counts_bb[i + 1] += counts_bb[i]
-                                            counts_bb = np.delete(counts_bb, i)
-                                            bin_edges = np.delete(bin_edges, i + 1)
-                                            i += 1
-                                    else:    
-                                        i += 1
-                                        continue
-                                else:
-                                    i += 1
-                                    continue
-
-                            time_intervals = np.diff(bin_edges)
-                            count_rates = counts_bb / time_intervals
-                            
-                        else:
-                            i += 1
-                            continue
-
-                    bb_dict["Bin Edges"] = bin_edges
-                    bb_dict["Time Intervals"] = time_intervals
-
-                    os.remove(region_event_file)
-                    os.remove(f"{region_event_file}.txt")
-
-                    for _, row in values.iterrows():
-                        band = row["Band"]
-                        energy_min = row["Energy Min"]
-                        energy_max = row["Energy Max"]
-                        color = row["Color"]
-                        text = row["Text"]
-
-                        if band == "Broadband":
-                            counts_bb, count_rates_bb = plot.bayesian_blocks_plotter(plt, broadband_event_list["Time"], bin_edges, color, text, True)
-                        else:
-                            counts_bb, count_rates_bb = plot.bayesian_blocks_plotter(plt, broadband_event_list["Time"][(broadband_event_list["Energy"] >= energy_min) & (broadband_event_list["Energy"] < energy_max)], bin_edges, color, text, False, 0.6)
-                                
-                        bb_dict[f"{band} Counts"] = counts_bb
-                        bb_dict[f"{band} Count Rate"] = count_rates_bb
-
-                        bayesian_blocks_plot.set_title(fr"(B) Bayesian Blocks Segmentation: $p_0 = {p0}$", fontsize = 14, y = 1.07)
-                        bayesian_blocks_plot.legend(loc = "upper center", bbox_to_anchor = (0.5, 1.0985), ncol = 5, frameon = False, fontsize = 8.35, columnspacing = 1)
-
-                else:
-                    tstart = float(dmkeypar(infile = event_file, keyword = "TSTART", echo = True))
-                    tstop = float(dmkeypar(infile = event_file, keyword = "TSTOP", echo = True))
-                    region_event_file, instrument = utils.isolate_source_region(obs_dir, data_dir, source, 100, 10000)
-                    sky_image, detector_image = utils.create_postage_stamps(obs_dir, source, region_event_file, event_file, 256, 128)
-                    dmlist(infile = f"{region_event_file}[cols time,pi]", outfile = f"{region_event_file}.txt", opt = "data,raw")
-                    broadband_event_list = Table.read(filename = f"{region_event_file}.txt", format = "ascii").to_pandas()
-                    broadband_event_list.rename(columns = {"time": "Time", "pi": "PI"}, inplace = True)
-                    broadband_event_list["Time"] -= tstart
-                    broadband_event_list["Time"] += np.random.uniform(0, timedel, size = len(broadband_event_list["Time"]))
-                    bin_edges = np.array(bayesian_blocks(broadband_event_list["Time"], fitness = "events", p0 = p0))
-                    bin_edges[-1] = tstop - tstart
-                    counts_bb, _ = histogram(broadband_event_list["Time"], bin_edges)
-                    time_intervals = np.diff(bin_edges)
-                    count_rates = counts_bb / time_intervals
-
-                    i = 0
-                    while i < len(time_intervals):
-                        if (time_intervals[i] < 20 or counts_bb[i] < 5):
-                            if i == 0:
-                                if count_rates[i] > count_rates[i + 1] and not counts_bb[i] > counts_bb[i + 1]:
-                                    counts_bb[i + 1] += counts_bb[i]
-                                    counts_bb = np.delete(counts_bb, i)
-                                    bin_edges = np.delete(bin_edges, i + 1)
-                                else:
-                                    i += 1
-                                    continue
-                            elif i == len(time_intervals) - 1:
-                                if count_rates[i] > count_rates[i - 1] and not counts_bb[i] > counts_bb[i - 1]:
-                                    counts_bb[i - 1] += counts_bb[i]
-                                    counts_bb = np.delete(counts_bb, i)
-                                    bin_edges = np.delete(bin_edges, i)
-                                    i -= 1
-                                else:
-                                    break
-                            else:
-                                right_diff = count_rates[i + 1] - count_rates[i]
-                                left_diff = count_rates[i - 1] - count_rates[i]
-                                if count_rates[i] > count_rates[i - 1] and count_rates[i] > count_rates[i + 1] and not (counts_bb[i] > counts_bb[i - 1] and counts_bb[i] > counts_bb[i + 1]):
-                                    if abs(left_diff) < abs(right_diff):
-                                        counts_bb[i - 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i)
-                                        i -= 1
-                                    else:
-                                        counts_bb[i + 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i + 1)
-                                        i += 1
-                                else:
-                                    i += 1
-                                    continue
-                        else:
-                            i += 1
-                            continue
-
-                        time_intervals = np.diff(bin_edges)
-                        count_rates = counts_bb / time_intervals
-
-                    i = 0
-                    while i < len(time_intervals):
-                        if time_intervals[i] < 100:
-                            if i == 0:
-                                if count_rates[i] > count_rates[i + 1]:
-                                    ln_next_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i + 1] * time_intervals[i])) - (count_rates[i + 1] * time_intervals[i])
-                                    if not ln_next_likelihood < likelihood_threshold:
-                                        counts_bb[i + 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i + 1)
-                                    else:
-                                        i += 1
-                                        continue
-                                else:
-                                    i += 1
-                                    continue
-
-                            elif i == len(time_intervals) - 1:
-                                if count_rates[i] > count_rates[i - 1]:
-                                    ln_previous_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i - 1] * time_intervals[i])) - (count_rates[i - 1] * time_intervals[i])
-                                    if not ln_previous_likelihood < likelihood_threshold:
-                                        counts_bb[i - 1] += counts_bb[i]
-                                        counts_bb = np.delete(counts_bb, i)
-                                        bin_edges = np.delete(bin_edges, i)
-                                        i -= 1
-                                    else:
-                                        break
-                                else:
-                                    break
-
-                            else:
-                                if count_rates[i] > count_rates[i - 1] and count_rates[i] > count_rates[i + 1]:
-                                    ln_next_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i + 1] * time_intervals[i])) - (count_rates[i + 1] * time_intervals[i])
-                                    ln_previous_likelihood = (-1 * gammaln(counts_bb[i] + 1)) + ((counts_bb[i]) * np.log(count_rates[i - 1] * time_intervals[i])) - (count_rates[i - 1] * time_intervals[i])
-                                    if not np.max([ln_previous_likelihood, ln_next_likelihood]) < likelihood_threshold:
-                                        if ln_previous_likelihood > ln_next_likelihood:
-                                            counts_bb[i - 1] += counts_bb[i]
-                                            counts_bb = np.delete(counts_bb, i)
-                                            bin_edges = np.delete(bin_edges, i)
-                                            i -= 1
-                                        else:
-                                            counts_bb[i + 1] += counts_bb[i]
-                                            counts_bb = np.delete(counts_bb, i)
-                                            bin_edges = np.delete(bin_edges, i + 1)
-                                            i += 1
-                                    else:    
-                                        i += 1
-                                        continue
-                                else:
-                                    i += 1
-                                    continue
-
-                            time_intervals = np.diff(bin_edges)
-                            count_rates = counts_bb / time_intervals
-
-                        else:
-                            i += 1
-                            continue
-
-                    time_intervals = np.diff(bin_edges)
-                    count_rates = counts_bb / time_intervals
-                    counts_bb, count_rates_bb = plot.bayesian_blocks_plotter(plt, broadband_event_list["Time"], bin_edges, "black", "", True)
-
-                    bb_dict["Bin Edges"] = bin_edges
-                    bb_dict["Time Intervals"] = time_intervals
-                    bb_dict["Broadband Counts"] = counts_bb
-                    bb_dict["Broadband Count Rate"] = count_rates_bb
-
-                    os.remove(region_event_file)
-                    os.remove(f"{region_event_file}.txt")
-
-                    bayesian_blocks_plot.set_title(fr"(B) Bayesian Blocks Segmentation: $p_0 = {p0}$", fontsize = 14, y = 1.04)
-                        
-                bayesian_blocks_plot.set_xlim([0, observation_duration])
-                bayesian_blocks_plot.set_ylim(bottom = 0 - 0.05 * max(bb_dict["Broadband Count Rate"]))
-                bayesian_blocks_plot.yaxis.set_label_coords(-0.045, 0.5)
-                bayesian_blocks_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
-                bayesian_blocks_plot.set_ylabel(f"Count Rate over {(df['Time'].iloc[1] - df['Time'].iloc[0]):.2f}s bins (cts/s)")
-                bayesian_blocks_plot.xaxis.set_major_locator(MultipleLocator(5))
-                bayesian_blocks_plot.xaxis.set_minor_locator(MultipleLocator(1))
-
-                max_len = max(len(v) for v in bb_dict.values())
-
-                for key, arr in bb_dict.items():
-                    arr = np.asarray(arr, dtype = float)
-                    pad_width = max_len - len(arr)
-                    padded = np.pad(arr, (pad_width, 0), mode = "constant", constant_values = np.nan)
-                    bb_dict[key] = padded
-
-                bb_df = pd.DataFrame(bb_dict)
-                bb_df.to_csv(os.path.join(obs_dir, f"{source}_{obs_id}_bb.csv"), index = False)
-
-                plt.sca(broadband_counts_plot)
-                plot.counts_plotter(plt, np.array((df["Time"] - tstart) / 1000), df["Broadband Counts"], "purple")
-                counts_range = max(df["Broadband Counts"]) - min(df["Broadband Counts"])
-                broadband_counts_plot.set_title("(C) Broadband Counts", fontsize = 14, y = 1.04)
-                broadband_counts_plot.set_xlim([0, observation_duration])
-                broadband_counts_plot.set_ylim(bottom = 0 - 0.025 * counts_range)
-                broadband_counts_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
-                broadband_counts_plot.yaxis.set_label_coords(-0.045, 0.5)
-                broadband_counts_plot.xaxis.set_major_locator(MultipleLocator(5))  
-                broadband_counts_plot.xaxis.set_minor_locator(MultipleLocator(1))
-                average_count_rate = round(float(df["Broadband Count Rate"].mean()) * 1000, 3)
-                min_count_rate = round(float(df["Broadband Count Rate"].min()) * 1000, 3)
-                max_count_rate = round(float(df["Broadband Count Rate"].max()) * 1000, 3)
-
-                left_text_1 = f"Total Counts: {total_counts:.3f}"
-                right_text_1 = f"Avg. CR (cts/ks): {average_count_rate:.3f}"
-                left_text_2 = f"Min. CR (cts/ks): {min_count_rate:.3f}"
-                right_text_2 = f"Max. CR (cts/ks): {max_count_rate:.3f}"
-
-                max_left_length = max(len(left_text_1), len(left_text_2))
-                max_right_length = max(len(right_text_1), len(right_text_2))
-
-                total_width = max_left_length + max_right_length + 5
-                text_str = (f"{left_text_1:<{total_width - max_right_length}}{right_text_1}\n"f"{left_text_2:<{total_width - max_right_length}}{right_text_2}")
-                broadband_counts_plot.text(0.005, 1.135, text_str, transform = broadband_counts_plot.transAxes, fontsize = 11.5, ha = "left", va = "top", bbox = dict(facecolor = "white", linewidth = 0.85))
-
-                plt.sca(cumulative_counts_plot)
-                cumulative_counts_plot.plot([(broadband_event_list["Time"] / 1000).iloc[0], (broadband_event_list["Time"] / 1000).iloc[-1]], [0, total_counts], color = "black", linewidth = 0.75, alpha = 0.7)
-                plot.cumulative_counts_plotter(plt, np.array(broadband_event_list["Time"] / 1000))
+        bayesian_blocks_plot.set_xlim([0, observation_duration])
+        bayesian_blocks_plot.set_ylim(bottom = 0 - 0.05 * np.nanmax(result.blocks["Broadband Count Rate"]))
+        bayesian_blocks_plot.yaxis.set_label_coords(-0.045, 0.5)
+        bayesian_blocks_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
+        bayesian_blocks_plot.set_ylabel(f"Count Rate over {(df['Time'].iloc[1] - df['Time'].iloc[0]):.2f}s bins (cts/s)")
+        bayesian_blocks_plot.xaxis.set_major_locator(MultipleLocator(5))
+        bayesian_blocks_plot.xaxis.set_minor_locator(MultipleLocator(1))
+
+        plt.sca(broadband_counts_plot)
+        plot.counts_plotter(plt, np.array((df["Time"] - tstart) / 1000), df["Broadband Counts"], "purple")
+        counts_range = max(df["Broadband Counts"]) - min(df["Broadband Counts"])
+        broadband_counts_plot.set_title("(C) Broadband Counts", fontsize = 14, y = 1.04)
+        broadband_counts_plot.set_xlim([0, observation_duration])
+        broadband_counts_plot.set_ylim(bottom = 0 - 0.025 * counts_range)
+        broadband_counts_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
+        broadband_counts_plot.yaxis.set_label_coords(-0.045, 0.5)
+        broadband_counts_plot.xaxis.set_major_locator(MultipleLocator(5))  
+        broadband_counts_plot.xaxis.set_minor_locator(MultipleLocator(1))
+        average_count_rate = round(float(df["Broadband Count Rate"].mean()) * 1000, 3)
+        min_count_rate = round(float(df["Broadband Count Rate"].min()) * 1000, 3)
+        max_count_rate = round(float(df["Broadband Count Rate"].max()) * 1000, 3)
+
+        left_text_1 = f"Total Counts: {total_counts:.3f}"
+        right_text_1 = f"Avg. CR (cts/ks): {average_count_rate:.3f}"
+        left_text_2 = f"Min. CR (cts/ks): {min_count_rate:.3f}"
+        right_text_2 = f"Max. CR (cts/ks): {max_count_rate:.3f}"
+
+        max_left_length = max(len(left_text_1), len(left_text_2))
+        max_right_length = max(len(right_text_1), len(right_text_2))
+
+        total_width = max_left_length + max_right_length + 5
+        text_str = (f"{left_text_1:<{total_width - max_right_length}}{right_text_1}\n"f"{left_text_2:<{total_width - max_right_length}}{right_text_2}")
+        broadband_counts_plot.text(0.005, 1.135, text_str, transform = broadband_counts_plot.transAxes, fontsize = 11.5, ha = "left", va = "top", bbox = dict(facecolor = "white", linewidth = 0.85))
+
+        plt.sca(cumulative_counts_plot)
+        cumulative_counts_plot.plot([event_times[0] / 1000, event_times[-1] / 1000], [0, total_counts], color = "black", linewidth = 0.75, alpha = 0.7)
+        plot.cumulative_counts_plotter(plt, event_times / 1000)
  
-                cumulative_counts_plot.set_title("(D) Cumulative Counts", fontsize = 14, y = 1.04)
-                cumulative_counts_plot.set_xlim([0, observation_duration])
-                cumulative_counts_plot.set_ylim(bottom = 0)
-                cumulative_counts_plot.yaxis.set_label_coords(-0.045, 0.5)
-                cumulative_counts_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
-                cumulative_counts_plot.xaxis.set_major_locator(MultipleLocator(5))
-                cumulative_counts_plot.xaxis.set_minor_locator(MultipleLocator(1))
+        cumulative_counts_plot.set_title("(D) Cumulative Counts", fontsize = 14, y = 1.04)
+        cumulative_counts_plot.set_xlim([0, observation_duration])
+        cumulative_counts_plot.set_ylim(bottom = 0)
+        cumulative_counts_plot.yaxis.set_label_coords(-0.045, 0.5)
+        cumulative_counts_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
+        cumulative_counts_plot.xaxis.set_major_locator(MultipleLocator(5))
+        cumulative_counts_plot.xaxis.set_minor_locator(MultipleLocator(1))
                 
-                if instrument == "ACIS":
-                    plt.sca(hr_plot)
-                    plot.hr_plotter(plt, final_csv, tstart)
-                    hr_plot.set_title("(E) Hardness Ratios", fontsize = 14, y = 1.07)
-                    hr_plot.set_xlim([0, observation_duration])
-                    hr_plot.set_ylim([-1.05, 1.05])
-                    hr_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
-                    hr_plot.yaxis.set_label_coords(-0.045, 0.5)
-                    hr_plot.xaxis.set_major_locator(MultipleLocator(5))
-                    hr_plot.xaxis.set_minor_locator(MultipleLocator(1))
-                    hr_plot.legend(loc = "upper center", bbox_to_anchor = (0.5, 1.109), ncol = 4, frameon = False, fontsize = 8.35)
-
-                plt.sca(postage_stamp_plot)
-                _, _, off_axis_angle, _, _, _ = utils.retrieve_obs_info(event_file)
-                postage_stamp_plot.text(0.5, 1.015, f"Off Axis Angle: {off_axis_angle}'", transform = postage_stamp_plot.transAxes, fontsize = 12, ha = "center")
-                inner_gs = GridSpecFromSubplotSpec(1, 2, subplot_spec = gs[0])
-                sky_image_plot = fig.add_subplot(inner_gs[0])
-                detector_image_plot = fig.add_subplot(inner_gs[1])
-                plot.plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, instrument, off_axis_angle, (sky_image_plot, detector_image_plot))
-                postage_stamp_plot.axis("off")
-
-                fig.suptitle(f"{instrument} Lightcurve (Binsize of {float(binsize) // timedel * timedel:.2f}s)", fontsize = "xx-large")
-                fig.savefig(os.path.join(obs_dir, f"{source}_{obs_id}.svg"), bbox_inches = "tight")
-                plt.close(fig)
-
-        return status 
\ No newline at end of file
+        if instrument == "ACIS":
+            plt.sca(hr_plot)
+            plot.hr_plotter(plt, df, tstart, hardness = result.hardness)
+            hr_plot.set_title("(E) Hardness Ratios", fontsize = 14, y = 1.07)
+            hr_plot.set_xlim([0, observation_duration])
+            hr_plot.set_ylim([-1.05, 1.05])
+            hr_plot.set_xlabel(f"Time +{(tstart / 1000):.4f} (ks)")
+            hr_plot.yaxis.set_label_coords(-0.045, 0.5)
+            hr_plot.xaxis.set_major_locator(MultipleLocator(5))
+            hr_plot.xaxis.set_minor_locator(MultipleLocator(1))
+            hr_plot.legend(loc = "upper center", bbox_to_anchor = (0.5, 1.109), ncol = 4, frameon = False, fontsize = 8.35)
+
+        plt.sca(postage_stamp_plot)
+        off_axis_angle = result.off_axis_angle
+        postage_stamp_plot.text(0.5, 1.015, f"Off Axis Angle: {off_axis_angle}'", transform = postage_stamp_plot.transAxes, fontsize = 12, ha = "center")
+        inner_gs = GridSpecFromSubplotSpec(1, 2, subplot_spec = gs[0])
+        sky_image_plot = fig.add_subplot(inner_gs[0])
+        detector_image_plot = fig.add_subplot(inner_gs[1])
+        plot.plot_postage_stamps(obs_dir, obs_id, source, result.sky_stamp, result.detector_stamp, instrument, off_axis_angle, (sky_image_plot, detector_image_plot))
+        postage_stamp_plot.axis("off")
+
+        fig.suptitle(f"{instrument} Lightcurve (Binsize of {float(binsize) // timedel * timedel:.2f}s)", fontsize = "xx-large")
+        with tracing.stage("render.save"):
+            fig.savefig(image_file, bbox_inches = "tight", dpi = dpi)
+        plt.close(fig)
+
+    return image_file
+
+def lightcurve_generation(obs_dir, data_dir, source, binsize, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, bkg_sub = False, image_format = "svg", dpi = None, render = True):
+    """Generates a complete set of ACIS/HRC light curves for a given source, with 'compute_lightcurves' followed by 'render_lightcurves'.
+
+    Args:
+        obs_dir (str): Absolute path to directory where light curves are to be saved.
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, event file should have name {Obs. ID}_evt2.fits, and dtf file should have name {Obs. ID}_dtf1.fits.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+        binsize (int/float): Size of bins (s).
+        p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
+        seed (int, optional): Seed used by numpy to add randomization to event list to space out events within frame readout times. Defaults to 1.
+        bkg_sub (bool, optional): Whether to subtract the background of an annulus around the source, see 'compute_lightcurves'. Defaults to False.
+        image_format (str, optional): Format of the saved figure, 'svg' for vector output or a raster format such as 'png', which is much smaller and faster to save for long observations. Defaults to 'svg'.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None, in which case Matplotlib's default is used.
+        render (bool, optional): Whether to draw the figure, if False only the CSV files are saved. Defaults to True.
+
+    Returns:
+        bool: A boolean value that tells the user whether the set of light curves was successfully generated or not.
+    """
+
+    status = True
+    result = compute_lightcurves(obs_dir, data_dir, source, binsize, p0, likelihood_threshold, seed, bkg_sub)
+    if result is None:
+        status = False
+    elif render:
+        render_lightcurves(result, image_format, dpi)
+
+    return status
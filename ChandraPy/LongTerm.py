@@ -0,0 +1,217 @@
+from ChandraPy import values
+from ChandraPy import Binning as binning
+from ChandraPy import Blocks as blocks
+from ChandraPy import Lightcurves as lc
+from ChandraPy import Metadata as md
+from ChandraPy import Spatial as spatial
+from ChandraPy import Tracing as tracing
+import numpy as np
+import os
+import pandas as pd
+
+def observation_ids(output_dir, source):
+    """Returns the Obs. IDs of a source that have a region file, which are those a batch has processed.
+
+    Args:
+        output_dir (str): Absolute path to directory where the outputs are saved in '{output_dir}/{source}/{Obs. ID}'.
+        source (str): Name of source in J2000 sexagecimal format.
+
+    Returns:
+        list: Sorted list of Obs. IDs.
+    """
+
+    source_dir = os.path.join(output_dir, source)
+    if not os.path.isdir(source_dir):
+        return []
+
+    return sorted((obs_id for obs_id in os.listdir(source_dir) if os.path.exists(os.path.join(source_dir, obs_id, f"{source}_{obs_id}.reg"))), key = lambda obs_id: int(obs_id) if obs_id.isdigit() else obs_id)
+
+def stream_events(output_dir, data_dir, source, obs_ids = None, instrument = "ACIS"):
+    """Yields the source's events one observation at a time, in time order. Only the source's events are kept, and the sky index of each
+       event file is dropped once it's been extracted from, so memory doesn't grow with the number of observations.
+
+    Args:
+        output_dir (str): Absolute path to directory where the outputs are saved in '{output_dir}/{source}/{Obs. ID}', with the region files.
+        data_dir (str): Absolute path to directory where data is saved in directories named by Obs. ID.
+        source (str): Name of source in J2000 sexagecimal format.
+        obs_ids (list, optional): Obs. IDs to be read. Defaults to None, in which case those from 'observation_ids' are read.
+        instrument (str, optional): Observations with other instruments are skipped, as their count rates can't be compared. Defaults to 'ACIS'.
+
+    Yields:
+        dict: Dictionary with keys 'Observation ID', 'Metadata' (ObservationMetadata), 'time' (s), 'energy' (eV, None for HRC), 'Points' (s)
+              and 'Rates', the live time step function of the observation from 'Binning.live_time_segments'.
+    """
+
+    obs_ids = observation_ids(output_dir, source) if obs_ids is None else [str(obs_id) for obs_id in obs_ids]
+    observations = [(md.observation_metadata(os.path.join(data_dir, obs_id)), obs_id) for obs_id in obs_ids]
+    for metadata, obs_id in sorted((item for item in observations if item[0].instrument == instrument), key = lambda item: item[0].tstart):
+        obs_dir = os.path.join(output_dir, source, obs_id)
+        obs_data_dir = os.path.join(data_dir, obs_id)
+        with tracing.stage("extract", f"{source}/{obs_id}"):
+            if instrument == "ACIS":
+                events, region_event_file = lc.source_events(obs_dir, obs_data_dir, source, ["time", "energy", "ccd_id"], values["Energy Min"].min(), values["Energy Max"].max())
+            else:
+                events, region_event_file = lc.source_events(obs_dir, obs_data_dir, source, ["time"], 100, 10000)
+            tracing.count("Events", len(events["time"]))
+        if region_event_file is not None:
+            os.remove(region_event_file)
+        spatial.clear_cache()
+
+        gti_start, gti_stop, dtcor, dead_time = lc.observation_exposure(obs_data_dir, events)
+        if len(gti_start) == 0:
+            gti_start, gti_stop = np.array([metadata.tstart]), np.array([metadata.tstop])
+        points, rates = binning.live_time_segments(gti_start, gti_stop, dtcor, dead_time)
+
+        yield {"Observation ID": obs_id, "Metadata": metadata, "time": np.array(events["time"], dtype = float),
+               "energy": np.array(events["energy"], dtype = float) if instrument == "ACIS" else None, "Points": points, "Rates": rates}
+
+def stitch(observations, seed = 1):
+    """Concatenates the events of several observations onto one time base. Arrival times are spaced out within frame readout times as in
+       'Lightcurves.compute_lightcurves', and the live time step functions are joined with a rate of 0 between observations, so the gaps
+       between them are explicit.
+
+    Args:
+        observations (iterable): Observations in time order, as yielded by 'stream_events'.
+        seed (int, optional): Seed of the random number generator spacing out arrival times. Defaults to 1.
+
+    Returns:
+        dict: Dictionary with keys 'time' (s), 'energy' (eV, None for HRC), 'Points' (s), 'Rates' and 'Observations', a Pandas DataFrame with
+              columns 'Observation ID', 'Start', 'Stop' (s), 'Exposure' (s) and 'Counts'.
+    """
+
+    rng = np.random.default_rng(seed)
+    times, energies, points, rates, rows = [], [], [], [], []
+    for observation in observations:
+        obs_points, obs_rates = observation["Points"], observation["Rates"]
+        if points and obs_points[0] < points[-1][-1]:
+            raise ValueError(f"Obs. ID {observation['Observation ID']} overlaps in time with the one before it")
+        if points:
+            rates.append(np.zeros(1))
+        points.append(obs_points)
+        rates.append(obs_rates)
+
+        times.append(observation["time"] + rng.uniform(0, observation["Metadata"].timedel, size = len(observation["time"])))
+        if observation["energy"] is not None:
+            energies.append(observation["energy"])
+        rows.append((observation["Observation ID"], obs_points[0], obs_points[-1], float(np.sum(obs_rates * np.diff(obs_points))), len(observation["time"])))
+
+    if not points:
+        raise ValueError("No observations to stitch")
+
+    return {"time": np.concatenate(times),
+            "energy": np.concatenate(energies) if energies else None,
+            "Points": np.concatenate(points),
+            "Rates": np.concatenate(rates),
+            "Observations": pd.DataFrame(rows, columns = ["Observation ID", "Start", "Stop", "Exposure", "Counts"])
+            }
+
+def _band_counts(times, energies, bin_edges):
+    counts = {}
+    for _, row in values.iterrows():
+        band = row["Band"]
+        if band == "Broadband":
+            counts[band], _ = np.histogram(times, bin_edges)
+        elif energies is not None:
+            counts[band], _ = np.histogram(times[(energies >= row["Energy Min"]) & (energies < row["Energy Max"])], bin_edges)
+
+    return counts
+
+def _table(start, stop, exposure, counts):
+    df = pd.DataFrame({"Start": start, "Stop": stop, "Exposure": exposure})
+    exposed = exposure > 0
+    for band, band_counts in counts.items():
+        df[f"{band} Counts"] = band_counts
+        df[f"{band} Count Rate"] = np.divide(band_counts, exposure, out = np.full(len(exposure), np.nan), where = exposed)
+    df["Count Rate Error"] = np.divide(np.sqrt(counts["Broadband"]), exposure, out = np.full(len(exposure), np.nan), where = exposed)
+
+    return df
+
+def longterm_lightcurve(stitched, binsize):
+    """Bins stitched events into a light curve on a regular grid of spacecraft time. Bins are weighted by the live time inside them, and bins
+       falling in gaps between observations are kept with no exposure and NaN rates.
+
+    Args:
+        stitched (dict): Stitched events returned by 'stitch'.
+        binsize (int/float): Size of bins (s), such as 86400 for a day.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns 'Bin', 'Time' (bin center), 'Start', 'Stop' (s), 'Exposure' (s), the counts and count rates of every band and 'Count Rate Error'.
+    """
+
+    points, rates = stitched["Points"], stitched["Rates"]
+    binsize = float(binsize)
+    if binsize <= 0:
+        raise ValueError(f"Bin size must be positive, got {binsize}")
+    bin_edges = points[0] + binsize * np.arange(int(np.ceil((points[-1] - points[0]) / binsize)) + 1)
+    exposure = np.diff(binning.elapsed_live_time(points, rates, bin_edges))
+    df = _table(bin_edges[:-1], bin_edges[1:], exposure, _band_counts(stitched["time"], stitched["energy"], bin_edges))
+    df.insert(0, "Time", (bin_edges[:-1] + bin_edges[1:]) / 2)
+    df.insert(0, "Bin", np.arange(1, len(df) + 1))
+
+    return df
+
+def longterm_blocks(stitched, p0 = 5, likelihood_threshold = np.log(1e-3)):
+    """Runs Bayesian Blocks Segmentation and likelihood merging over stitched events, weighted by exposure. Events are mapped onto elapsed live
+       time, on which gaps and dead time take no time, so a constant source arrives uniformly. Blocks are found and merged there and mapped
+       back, so a block can span several observations and their gaps.
+
+    Args:
+        stitched (dict): Stitched events returned by 'stitch'.
+        p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with one row per block and columns 'Start', 'Stop' (s), 'Exposure' (s), the counts and count rates of every band and 'Count Rate Error'.
+    """
+
+    points, rates = stitched["Points"], stitched["Rates"]
+    live = binning.elapsed_live_time(points, rates, stitched["time"])
+    total = float(np.sum(rates * np.diff(points)))
+    with tracing.stage("blocks.segment"):
+        live_edges = blocks.bayesian_blocks(live, p0)
+    live_edges[0], live_edges[-1] = 0., total
+    counts, _ = np.histogram(live, live_edges)
+    with tracing.stage("blocks.merge"):
+        live_edges, _, _ = blocks.merge_blocks(live_edges, counts, likelihood_threshold)
+        tracing.count("Blocks", len(live_edges) - 1)
+
+    edges = binning.live_time_inverse(points, rates, live_edges)
+    edges[0] = points[0]
+
+    return _table(edges[:-1], edges[1:], np.diff(live_edges), _band_counts(live, stitched["energy"], live_edges))
+
+@tracing.traced("longterm")
+def compute_longterm_lightcurves(output_dir, data_dir, source, binsize = 86400, p0 = 5, likelihood_threshold = np.log(1e-3), seed = 1, obs_ids = None, instrument = "ACIS", save = True):
+    """Builds the long-term light curve of a source from all its observations. Events are streamed one observation at a time and stitched onto
+       one time base, then binned and segmented with exposure-weighted Bayesian Blocks across observations. Saves the binned light curve as
+       '{source}_longterm.csv', the blocks as '{source}_longterm_bb.csv' and the observations as '{source}_longterm_obs.csv' in '{output_dir}/{source}'.
+
+    Args:
+        output_dir (str): Absolute path to directory where the outputs are saved in '{output_dir}/{source}/{Obs. ID}', with the region files.
+        data_dir (str): Absolute path to directory where data is saved in directories named by Obs. ID.
+        source (str): Name of source in J2000 sexagecimal format.
+        binsize (int/float, optional): Size of bins (s). Defaults to 86400, a day.
+        p0 (int/float, optional): Value of p0 for Bayesian Blocks Segmentation. Defaults to 5.
+        likelihood_threshold (int/float, optional): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation. Defaults to ln(0.001).
+        seed (int, optional): Seed used to space out events within frame readout times. Defaults to 1.
+        obs_ids (list, optional): Obs. IDs to be stitched. Defaults to None, in which case all those with a region file are.
+        instrument (str, optional): Instrument whose observations are stitched (ACIS/HRC). Defaults to 'ACIS'.
+        save (bool, optional): Whether to save the CSV files. Defaults to True.
+
+    Returns:
+        tuple(lightcurve, blocks, observations): Tuple of Pandas DataFrames from 'longterm_lightcurve', 'longterm_blocks' and 'stitch'.
+    """
+
+    stitched = stitch(stream_events(output_dir, data_dir, source, obs_ids, instrument), seed)
+    with tracing.stage("bin"):
+        lightcurve = longterm_lightcurve(stitched, binsize)
+    block_table = longterm_blocks(stitched, p0, likelihood_threshold)
+
+    if save:
+        source_dir = os.path.join(output_dir, source)
+        with tracing.stage("csv.write"):
+            lightcurve.to_csv(os.path.join(source_dir, f"{source}_longterm.csv"), index = False)
+            block_table.to_csv(os.path.join(source_dir, f"{source}_longterm_bb.csv"), index = False)
+            stitched["Observations"].to_csv(os.path.join(source_dir, f"{source}_longterm_obs.csv"), index = False)
+
+    return lightcurve, block_table, stitched["Observations"]
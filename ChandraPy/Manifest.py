@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+
+#Stages of a light curve job in the order they run. Each stage reruns if one of its parameters changed, one of its outputs is missing, or an earlier stage reruns
+stages = ["region", "compute", "merge", "render"]
+parameters = {"region": ["Event File", "Source"],
+              "compute": ["Binsize", "P0", "Seed"],
+              "merge": ["Likelihood Threshold"],
+              "render": ["Image Format", "DPI"]
+              }
+
+def manifest_path(output_dir, source):
+    """Returns the path of the manifest of a source, which sits next to its Obs. ID directories as '{source}/{source}_manifest.json'.
+
+    Args:
+        output_dir (str): Absolute path to directory where the sources' light curves are saved.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+
+    Returns:
+        str: Absolute path to the manifest.
+    """
+
+    return os.path.join(output_dir, source, f"{source}_manifest.json")
+
+def read_manifest(output_dir, source):
+    """Returns the manifest of a source, what every Obs. ID was last processed from and what it produced.
+
+    Args:
+        output_dir (str): Absolute path to directory where the sources' light curves are saved.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+
+    Returns:
+        dict: Dictionary mapping Obs. IDs to entries, dictionaries with keys 'Status' ('Done'/'Empty'), 'Inputs' (from 'job_inputs') and
+              'Stages' (mapping each stage that ran to its outputs, relative to the Obs. ID directory). Empty if the source has no manifest.
+    """
+
+    path = manifest_path(output_dir, source)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def write_manifest(output_dir, source, manifest):
+    """Writes the manifest of a source, replacing the previous one in one step so an interrupted run never leaves it half written.
+
+    Args:
+        output_dir (str): Absolute path to directory where the sources' light curves are saved.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+        manifest (dict): Dictionary mapping Obs. IDs to entries, as returned by 'read_manifest'.
+    """
+
+    path = manifest_path(output_dir, source)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent = 4, sort_keys = True)
+    os.replace(path + ".tmp", path)
+
+def file_signature(path, previous = None, content = True):
+    """Returns the signature of an input file. Hashing a large event file takes a while, so the hash of the previous signature is reused if
+       the file's size and modification time haven't changed.
+
+    Args:
+        path (str): Absolute path to the file.
+        previous (dict, optional): Signature recorded by an earlier run. Defaults to None.
+        content (bool, optional): Whether to hash the file if the previous hash can't be reused, otherwise 'SHA256' is None. Defaults to True.
+
+    Returns:
+        dict: Dictionary with keys 'Size' (bytes), 'Modified' (ns since the epoch) and 'SHA256', None if the file doesn't exist.
+    """
+
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    signature = {"Size": stat.st_size, "Modified": stat.st_mtime_ns, "SHA256": None}
+    if previous is not None and previous.get("Size") == signature["Size"] and previous.get("Modified") == signature["Modified"]:
+        signature["SHA256"] = previous.get("SHA256")
+    elif content:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 24), b""):
+                digest.update(chunk)
+        signature["SHA256"] = digest.hexdigest()
+
+    return signature
+
+def job_inputs(event_file, source, binsize, p0, likelihood_threshold, seed, image_format, dpi, previous = None, content = True):
+    """Returns the inputs of a light curve job as they're recorded in the manifest.
+
+    Args:
+        event_file (str): Absolute path to the event file.
+        source (str): Name of source in J2000 sexagecimal format, which is its position.
+        binsize (int/float): Size of bins (s).
+        p0 (int/float): Value of p0 for Bayesian Blocks Segmentation.
+        likelihood_threshold (int/float): Value of threshold to determine whether segment can be merged or not during Bayesian Segmentation.
+        seed (int): Seed used by numpy to space out events within frame readout times.
+        image_format (str): Format of the saved figure.
+        dpi (int): Resolution of raster figures (dots per inch), or None.
+        previous (dict, optional): Entry of the Obs. ID recorded by an earlier run, whose event file hash is reused if the file looks unchanged. Defaults to None.
+        content (bool, optional): Whether to hash the event file if its hash can't be reused. Defaults to True.
+
+    Returns:
+        dict: Dictionary with a key per parameter in 'parameters'.
+    """
+
+    previous_signature = (previous or {}).get("Inputs", {}).get("Event File")
+
+    return {"Event File": file_signature(event_file, previous_signature, content),
+            "Source": source,
+            "Binsize": float(binsize),
+            "P0": float(p0),
+            "Likelihood Threshold": float(likelihood_threshold),
+            "Seed": int(seed),
+            "Image Format": image_format,
+            "DPI": None if dpi is None else int(dpi)
+            }
+
+def _changed(previous, inputs, name):
+    if name == "Event File":
+        old, new = previous.get(name) or {}, inputs[name] or {}
+        return new.get("SHA256") is None or old.get("SHA256") != new.get("SHA256")
+
+    return previous.get(name) != inputs[name]
+
+def stale_stages(entry, inputs, obs_dir, render = True):
+    """Returns the stages of a light curve job that have to run again. An Obs. ID that was empty stays empty until its event file or source
+       changes, or its bin size, p0 or seed.
+
+    Args:
+        entry (dict): Entry of the Obs. ID recorded by an earlier run, or None if it wasn't processed before.
+        inputs (dict): Inputs of this run, from 'job_inputs'.
+        obs_dir (str): Absolute path to the Obs. ID's output directory, where the recorded outputs are looked for.
+        render (bool/str, optional): Whether the job draws the figure, if False the 'render' stage is left out. Defaults to True.
+
+    Returns:
+        list: Names of the stages that have to run, in the order of 'stages'. Empty if the Obs. ID is up to date.
+    """
+
+    wanted = stages if render else stages[:-1]
+    if entry is None:
+        return list(wanted)
+
+    previous = entry.get("Inputs", {})
+    if entry.get("Status") == "Empty":
+        changed = any(_changed(previous, inputs, name) for stage in ["region", "compute"] for name in parameters[stage])
+        return list(wanted) if changed else []
+
+    stale = []
+    for stage in wanted:
+        outputs = entry.get("Stages", {}).get(stage)
+        if stale or outputs is None or any(_changed(previous, inputs, name) for name in parameters[stage]) or \
+           not all(os.path.exists(os.path.join(obs_dir, output)) for output in outputs):
+            stale.append(stage)
+
+    return stale
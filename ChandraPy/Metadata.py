@@ -0,0 +1,129 @@
+import numpy as np
+import os
+
+_cache = {}
+
+class ObservationMetadata:
+    """Header keywords and good time intervals of an event file, read once from the file.
+
+    Attributes:
+        event_file (str): Absolute path to the event file.
+        obs_id (str): Value of 'OBS_ID', or an empty string if it's absent.
+        instrument (str): Value of 'INSTRUME' (ACIS/HRC).
+        tstart (float): Value of 'TSTART' (s).
+        tstop (float): Value of 'TSTOP' (s).
+        timedel (float): Value of 'TIMEDEL' (s).
+        dtcor (float): Value of 'DTCOR', 1.0 if it's absent.
+        ra_targ (float): Value of 'RA_TARG' (deg).
+        dec_targ (float): Value of 'DEC_TARG' (deg).
+        asolfile (str): Value of 'ASOLFILE', or an empty string if it's absent.
+        gti (dict): Dictionary mapping the 'CCD_ID' of each GTI extension (None if it has none) to a tuple of arrays of GTI start and stop times (s).
+                    If the event file has no GTI extension, those of the '{Obs. ID}_flt2.fits' filter file next to it are used.
+    """
+
+    def __init__(self, event_file):
+        from astropy.io import fits
+
+        with fits.open(event_file) as hdul:
+            primary = hdul[0].header
+            header = hdul["EVENTS"].header
+
+            def keyword(name, default = None):
+                return header.get(name, primary.get(name, default))
+
+            self.event_file = event_file
+            self.obs_id = str(keyword("OBS_ID", ""))
+            self.instrument = primary.get("INSTRUME", header.get("INSTRUME"))
+            self.tstart = float(keyword("TSTART"))
+            self.tstop = float(keyword("TSTOP"))
+            self.timedel = float(keyword("TIMEDEL"))
+            self.dtcor = float(keyword("DTCOR", 1.0))
+            self.ra_targ = float(keyword("RA_TARG", np.nan))
+            self.dec_targ = float(keyword("DEC_TARG", np.nan))
+            self.asolfile = str(keyword("ASOLFILE", ""))
+            self.gti = {}
+            for hdu in hdul[1:]:
+                if hdu.name == "GTI":
+                    self.gti[hdu.header.get("CCD_ID")] = (np.array(hdu.data["START"], dtype = float), np.array(hdu.data["STOP"], dtype = float))
+
+        filter_file = os.path.join(os.path.dirname(event_file), f"{self.obs_id}_flt2.fits")
+        if not self.gti and self.obs_id and os.path.exists(filter_file):
+            with fits.open(filter_file) as hdul:
+                for hdu in hdul[1:]:
+                    if isinstance(hdu, fits.BinTableHDU) and {"START", "STOP"} <= set(hdu.columns.names):
+                        self.gti[hdu.header.get("CCD_ID")] = (np.array(hdu.data["START"], dtype = float), np.array(hdu.data["STOP"], dtype = float))
+
+    def gti_for(self, ccd_id = None):
+        """Returns the good time intervals of a CCD.
+
+        Args:
+            ccd_id (int, optional): For ACIS, the CCD whose GTI is to be returned. Defaults to None, in which case the first GTI extension is used.
+
+        Returns:
+            tuple(gti_start, gti_stop): Tuple containing arrays of GTI start and stop times (s). Both are empty if the file has no GTI extension.
+        """
+
+        if ccd_id in self.gti:
+            return self.gti[ccd_id]
+        if self.gti:
+            return next(iter(self.gti.values()))
+
+        return np.array([]), np.array([])
+
+def event_metadata(event_file):
+    """Returns the metadata of an event file. It's memoized per file, and read again only if the file's modification time or size changes.
+
+    Args:
+        event_file (str): Absolute path to the event file.
+
+    Returns:
+        ObservationMetadata: Metadata of the event file.
+    """
+
+    event_file = os.path.abspath(event_file)
+    stat = os.stat(event_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(event_file)
+    if cached is None or cached[0] != signature:
+        cached = (signature, ObservationMetadata(event_file))
+        _cache[event_file] = cached
+
+    return cached[1]
+
+def observation_metadata(data_dir):
+    """Returns the metadata of an observation's event file.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
+
+    Returns:
+        ObservationMetadata: Metadata of the observation.
+    """
+
+    obs_id = os.path.basename(os.path.normpath(data_dir))
+
+    return event_metadata(os.path.join(data_dir, f"{obs_id}_evt2.fits"))
+
+def read_dead_time(dtf_file):
+    """Returns the dead time factors of an HRC observation.
+
+    Args:
+        dtf_file (str): Absolute path to the dead time factor file, '{Obs. ID}_dtf1.fits'.
+
+    Returns:
+        tuple(times, dtf): Tuple containing arrays of the 'TIME' (s) and 'DTF' columns, or None if the file doesn't exist.
+    """
+
+    from astropy.io import fits
+
+    if not os.path.exists(dtf_file):
+        return None
+    with fits.open(dtf_file) as hdul:
+        data = hdul[1].data
+
+        return np.array(data["TIME"], dtype = float), np.array(data["DTF"], dtype = float)
+
+def clear_cache():
+    """Forgets all memoized metadata."""
+
+    _cache.clear()
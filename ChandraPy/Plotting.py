@@ -1,30 +1,62 @@
-from astropy.io import fits
 from astropy.stats import histogram
-from astropy.table import Table
 from ChandraPy import hr_values
+from ChandraPy import HardnessRatios as hrs
+from ChandraPy import Tracing as tracing
 from matplotlib import pyplot as plt
 import numpy as np
 import os
 import pandas as pd
 import warnings
 
-def cumulative_counts_plotter(plt, times, make_xlabel = False):
+def decimate(x, y, max_points = 4000):
+    """Reduces a line to at most about 'max_points' vertices while keeping its shape. The x range is split into 'max_points' / 4 columns, and
+       the first, last, lowest and highest points of each column are kept, so peaks and dips narrower than a column still show up.
+
+    Args:
+        x (numpy.ndarray): Array of x values, in plotting order.
+        y (numpy.ndarray): Array of y values.
+        max_points (int, optional): Number of points above which the line is decimated. Defaults to 4000, None turns decimation off.
+
+    Returns:
+        tuple(x, y): Tuple containing the arrays of x and y values of the kept points.
+    """
+
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    if max_points is None or len(x) <= max_points or not np.isfinite(x).all() or x[-1] == x[0]:
+        return x, y
+
+    n_columns = max(max_points // 4, 1)
+    columns = np.clip(((x - x.min()) / (x.max() - x.min()) * n_columns).astype(np.int64), 0, n_columns - 1)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(columns)) + 1))
+    ends = np.append(starts[1:], len(x)) - 1
+    runs = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(x))))
+    #Within each run of points in the same column, sorting by y puts the lowest first and the highest last, NaNs sort after the highest
+    order = np.lexsort((np.nan_to_num(y, nan = np.inf), runs))
+    keep = np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+
+    return x[keep], y[keep]
+
+@tracing.traced("plot.cumulative")
+def cumulative_counts_plotter(plt, times, make_xlabel = False, max_points = 4000):
     """Create a Cumulative Counts Plot.
 
     Args:
         plt (matplotlib.axes._axes.Axes/matplotlib.figure.Figure): MatPlotLib layer on which to plot data.
         times (numpy.ndarray): Array of photon arrival times (s), typically 'time' column of event list, all values should be subtracted by 'tstart'.
         make_xlabel (bool, optional): Whether to write the x-axis label or not. Defaults to False.
+        max_points (int, optional): Number of points above which the curve is decimated with 'decimate'. Defaults to 4000, None plots every photon.
     """
 
-    plt.plot(times, np.arange(1, len(times) + 1), color = "magenta")
+    plt.plot(*decimate(times, np.arange(1, len(times) + 1), max_points), color = "magenta")
     if make_xlabel:
         plt.xlabel("Time (ks)", fontsize = 10)
     plt.ylabel("Cumulative Counts (cts)", fontsize = 10)
     plt.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
     plt.tick_params(axis = "both", which = "major", labelsize = 10)
 
-def rate_plotter(plt, times, count_rates, color = "black", errors = None, timedel = None, make_xlabel = False, text = None, dashed = False):
+@tracing.traced("plot.rates")
+def rate_plotter(plt, times, count_rates, color = "black", errors = None, timedel = None, make_xlabel = False, text = None, dashed = False, max_points = 4000):
     """Create a step plot of Count Rate v/s Time
 
     Args:
@@ -37,19 +69,20 @@ def rate_plotter(plt, times, count_rates, color = "black", errors = None, timede
         make_xlabel (bool, optional): Whether to write the x-axis label or not. Defaults to False
         text (str, optional): The text to add as the label of the plot. Defaults to None
         dashed (bool, optional): Whether to make the plot a dashed line or not. Defaults to False
+        max_points (int, optional): Number of points above which lines are decimated with 'decimate', error bars are always drawn for every bin. Defaults to 4000, None turns decimation off
     """
 
     if timedel is not None:
         count_rates *= timedel
 
     if dashed:
-        plt.step(times, count_rates, color, where = "post", linestyle = "dotted", label = text)
+        plt.step(*decimate(times, count_rates, max_points), color, where = "post", linestyle = "dotted", label = text)
     else:
         if errors is not None:
             plt.errorbar(times, count_rates, yerr = errors, fmt = "o", color = "black", ecolor = "black", elinewidth = 0.75, capsize = 2, capthick = 0.75, markersize = 4)
-            plt.plot(times, np.convolve(count_rates, np.ones(3) / 3, mode = "same"), color = "red")
+            plt.plot(*decimate(times, np.convolve(count_rates, np.ones(3) / 3, mode = "same"), max_points), color = "red")
         else:
-            plt.step(times, count_rates, color, where = "post", label = text)
+            plt.step(*decimate(times, count_rates, max_points), color, where = "post", label = text)
 
     if make_xlabel:
         plt.xlabel("Time (ks)", fontsize = 10)
@@ -60,7 +93,8 @@ def rate_plotter(plt, times, count_rates, color = "black", errors = None, timede
     plt.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
     plt.tick_params(axis = "both", which = "major", labelsize = 10)
 
-def counts_plotter(plt, times, counts, color = "magenta", make_xlabel = False, text = None, dashed = False):
+@tracing.traced("plot.counts")
+def counts_plotter(plt, times, counts, color = "magenta", make_xlabel = False, text = None, dashed = False, max_points = 4000):
     """Create a step plot of Counts v/s Time
 
     Args:
@@ -71,12 +105,13 @@ def counts_plotter(plt, times, counts, color = "magenta", make_xlabel = False, t
         make_xlabel (bool, optional): Whether to write the x-axis label or not. Defaults to False
         text (str, optional): The text to add as the label of the plot. Defaults to None
         dashed (bool, optional): Whether to make the plot a dashed line or not. Defaults to False
+        max_points (int, optional): Number of points above which the plot is decimated with 'decimate'. Defaults to 4000, None turns decimation off
     """
 
     if dashed:
-        plt.step(times, counts, color, where = "post", linestyle = "dotted", label = text)
+        plt.step(*decimate(times, counts, max_points), color, where = "post", linestyle = "dotted", label = text)
     else:
-        plt.step(times, counts, color, where = "post", label = text)
+        plt.step(*decimate(times, counts, max_points), color, where = "post", label = text)
 
     if make_xlabel:
         plt.xlabel("Time (ks)", fontsize = 10)
@@ -84,35 +119,25 @@ def counts_plotter(plt, times, counts, color = "magenta", make_xlabel = False, t
     plt.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
     plt.tick_params(axis = "both", which = "major", labelsize = 10)
 
-def hr_plotter(plt, lc_file, tstart, make_xlabel = True):
-    """Creates a step plot of various Hardness Ratios v/s Time
+@tracing.traced("plot.hardness")
+def hr_plotter(plt, lc_file, tstart, make_xlabel = True, hardness = None):
+    """Creates a step plot of various Hardness Ratios v/s Time, with their highest posterior density intervals shaded
 
     Args:
         plt (matplotlib.axes._axes.Axes/matplotlib.figure.Figure): MatPlotLib layer on which to plot data
-        lc_file (str): Absolute path to CSV output file with columns 'Ultrasoft Count Rate', 'Soft Count Rate', 'Medium Count Rate', 'Hard Count Rate'
+        lc_file (str/pandas.core.frame.DataFrame): Absolute path to CSV output file, or the light curve DataFrame itself, with columns 'Time', 'Ultrasoft Counts', 'Soft Counts', 'Medium Counts', 'Hard Counts'
         tstart (float): Value of 'TSTART' in event file header. Defaults to None
         make_xlabel (bool, optional): Whether to write the x-axis label or not. Defaults to False
+        hardness (pandas.core.frame.DataFrame, optional): Hardness Ratios of the bins from 'HardnessRatios.hardness_ratios'. Defaults to None, in which case they're computed here
     """
 
-    lc = pd.read_csv(lc_file)
+    lc = pd.read_csv(lc_file) if isinstance(lc_file, str) else lc_file
+    if hardness is None:
+        hardness = hrs.hardness_ratios(lc)
     times = (lc["Time"] - tstart) / 1000
-    for _, row in hr_values.iterrows():
-        text = row["Formula"]
-        identifier = row["Identifier"]
-        color = row["Color"]
-
-        if identifier == "m-s":
-            hr = (lc["Medium Count Rate"] - lc["Soft Count Rate"]) / (lc["Medium Count Rate"] + lc["Soft Count Rate"])
-            plt.step(times, hr, color, where = "post", label = text)
-        elif identifier == "h-s":
-            hr = (lc["Hard Count Rate"] - lc["Soft Count Rate"]) / (lc["Hard Count Rate"] + lc["Soft Count Rate"])
-            plt.step(times, hr, color, where = "post", label = text)
-        elif identifier == "s-m-h":
-            hr = (lc["Soft Count Rate"] - (lc["Medium Count Rate"] + lc["Hard Count Rate"])) / (lc["Soft Count Rate"] + (lc["Medium Count Rate"] + lc["Hard Count Rate"]))
-            plt.step(times, hr, color, where = "post", label = text)
-        elif identifier == "h-m-s-u":
-            hr = ((lc["Soft Count Rate"] + lc["Ultrasoft Count Rate"]) - (lc["Hard Count Rate"] + lc["Medium Count Rate"])) / ((lc["Soft Count Rate"] + lc["Ultrasoft Count Rate"]) + (lc["Hard Count Rate"] + lc["Medium Count Rate"]))
-            plt.step(times, hr, color, where = "post", label = text)
+    for text, identifier, color in zip(hr_values["Formula"], hr_values["Identifier"], hr_values["Color"]):
+        plt.step(times, hardness[f"{identifier} HR"], color, where = "post", label = text)
+        plt.fill_between(times, hardness[f"{identifier} HR Lower"], hardness[f"{identifier} HR Upper"], step = "post", color = color, alpha = 0.2, linewidth = 0)
 
     if make_xlabel:
         plt.xlabel("Time (ks)", fontsize = 10)
@@ -120,7 +145,8 @@ def hr_plotter(plt, lc_file, tstart, make_xlabel = True):
     plt.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
     plt.tick_params(axis = "both", which = "major", labelsize = 10)
 
-def bayesian_blocks_plotter(plt, times_array, bin_edges, color = "black", text = None, error_bar = False, linewidth = 1, make_xlabel = False):
+@tracing.traced("plot.blocks")
+def bayesian_blocks_plotter(plt, times_array, bin_edges, color = "black", text = None, error_bar = False, linewidth = 1, make_xlabel = False, exposure = None):
     """Creates bayesian blocks segmented step plot of Count Rates= v/s Time. Plots thinner line in case of no error bars to increase visibility
 
     Args:
@@ -132,15 +158,17 @@ def bayesian_blocks_plotter(plt, times_array, bin_edges, color = "black", text =
         error_bar (bool, optional): Whether to plot error bars or not. Defaults to False
         linewidth (int/float, optional): Width of the line of the plot, recommended to be lowered when plotting for multiple segmentation. Defaults to 1
         make_xlabel (bool, optional): Whether to write the x-axis label or not. Defaults to False
+        exposure (numpy.ndarray, optional): Live exposure of every block (s), over which count rates are taken. Defaults to None, in which case the block lengths are used
 
     Returns:
         tuple(np.ndarray, np.ndarray): Tuple of two arrays, one of the bayesian segmented counts, and the other of bayesian segmented count rates
     """
 
-    time_intervals = np.diff(bin_edges)
+    time_intervals = np.diff(bin_edges) if exposure is None else np.asarray(exposure, dtype = float)
     counts_bb, _ = histogram(times_array, bin_edges)
-    count_rates = counts_bb / time_intervals
-    errors = np.abs(np.sqrt(counts_bb) / time_intervals)
+    live = time_intervals > 0
+    count_rates = np.divide(counts_bb, time_intervals, out = np.zeros(len(counts_bb)), where = live)
+    errors = np.abs(np.divide(np.sqrt(counts_bb), time_intervals, out = np.zeros(len(counts_bb)), where = live))
 
     bin_midpoints = (bin_edges[:-1] + bin_edges[1:]) / 2
 
@@ -159,6 +187,7 @@ def bayesian_blocks_plotter(plt, times_array, bin_edges, color = "black", text =
 
     return counts_bb, count_rates
 
+@tracing.traced("plot.stamps")
 def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, instrument, off_axis_angle = None, fig = None):
     """Generates plots of postage stamp images in sky and detector coordinates
 
@@ -166,8 +195,8 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
         obs_dir (str): Absolute path to directory where light curves are to be saved
         obs_id (str): The Obs. ID Number
         source (str): Name of source, preferably in J2000 sexagecimal format
-        sky_image (str): Absolute path to sky image file
-        detector_image (str): Absolute path to detector image file
+        sky_image (dict): Sky coordinate postage stamp dictionary from 'Utilities.postage_stamps'
+        detector_image (dict): Detector coordinate postage stamp dictionary from 'Utilities.postage_stamps'
         instrument(str): Which instrument's postage stamp ist to be plotted (ACIS/HRC)
         off_axis_angle (int/float, optional): Off-Axis angle to be displayed between both plots (arcmin). Defaults to None
         fig (matplotlib.axes._axes.Axes/matplotlib.figure.Figure, optional): MatPlotLib layer on which to plot data, if None, then images are saved as PNG
@@ -181,15 +210,9 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
     else:
         res = hrc_res
 
-    def get_bounds(hdu_list):
-        bounds_table = Table.read(hdu_list["BOUNDS"])
-        return {
-            "x_min": float(bounds_table["X_MIN"][0]),
-            "y_min": float(bounds_table["Y_MIN"][0]),
-            "x_max": float(bounds_table["X_MAX"][0]),
-            "y_max": float(bounds_table["Y_MAX"][0]),
-        }
-    
+    def read_postage_stamp(image):
+        return image["image"], {key: image[key] for key in ("x_min", "y_min", "x_max", "y_max")}
+
     def ticks_from_bounds(real_bounds, image_bounds, max_ticks = 10):
         start_tick, end_tick = real_bounds
         if end_tick == start_tick:
@@ -200,8 +223,10 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
         real_tick_labels = tuple(f"{tick:.0f}" for tick in real_tick_positions)
         return image_tick_positions, real_tick_labels
 
-    sky_image_data = 255 - np.sqrt(fits.getdata(sky_image, ext = 0))
-    detector_image_data = 255 - np.sqrt(fits.getdata(detector_image, ext = 0))
+    sky_image_data, sky_bounds = read_postage_stamp(sky_image)
+    detector_image_data, detector_bounds = read_postage_stamp(detector_image)
+    sky_image_data = 255 - np.sqrt(sky_image_data)
+    detector_image_data = 255 - np.sqrt(detector_image_data)
 
     if fig is not None:
         sky_image_plot, detector_image_plot = fig
@@ -215,9 +240,6 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
             sky_image_plot.grid(True, linestyle = "-", color = "gray")
             sky_image_plot.imshow(sky_image_data, cmap = "gray", extent = [0, sky_image_data.shape[1], 0, sky_image_data.shape[0]], interpolation = "none")
 
-            with fits.open(sky_image) as hdu:
-                sky_bounds = get_bounds(hdu)
-
             sky_y_ticks = ticks_from_bounds((round(sky_bounds["y_min"]), round(sky_bounds["y_max"])), sky_image_plot.get_ylim())
             sky_x_ticks = ticks_from_bounds((round(sky_bounds["x_min"]), round(sky_bounds["x_max"])), sky_image_plot.get_xlim())
             sky_image_plot.set_yticks(*sky_y_ticks)
@@ -243,17 +265,12 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
             detector_image_plot.grid(True, linestyle = "-", color = "gray")
             detector_image_plot.imshow(detector_image_data, cmap = "gray", extent = [0, detector_image_data.shape[1], 0, detector_image_data.shape[0]], interpolation = "none")
 
-            with fits.open(detector_image) as hdu:
-                detector_bounds = get_bounds(hdu)
-
             detector_y_ticks = ticks_from_bounds((round(detector_bounds["y_min"]), round(detector_bounds["y_max"])), detector_image_plot.get_ylim())
             detector_x_ticks = ticks_from_bounds((round(detector_bounds["x_min"]), round(detector_bounds["x_max"])), detector_image_plot.get_xlim())
             detector_image_plot.set_yticks(*detector_y_ticks)
             detector_image_plot.set_xticks(*detector_x_ticks, rotation = 90)
             detector_image_plot.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
 
-            os.remove(sky_image)
-            os.remove(detector_image)
     else:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", UserWarning)
@@ -269,9 +286,6 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
             sky_image_plot.grid(True, linestyle = "-", color = "gray")
             sky_image_plot.imshow(sky_image_data, cmap = "gray", extent = [0, sky_image_data.shape[1], 0, sky_image_data.shape[0]])
 
-            with fits.open(sky_image) as hdu:
-                sky_bounds = get_bounds(hdu)
-
             sky_y_ticks = ticks_from_bounds((round(sky_bounds["y_min"]), round(sky_bounds["y_max"])), sky_image_plot.get_ylim())
             sky_x_ticks = ticks_from_bounds((round(sky_bounds["x_min"]), round(sky_bounds["x_max"])), sky_image_plot.get_xlim())
             sky_image_plot.set_yticks(*sky_y_ticks)
@@ -297,16 +311,11 @@ def plot_postage_stamps(obs_dir, obs_id, source, sky_image, detector_image, inst
             detector_image_plot.grid(True, linestyle = "-", color = "gray")
             detector_image_plot.imshow(detector_image_data, cmap = "gray", extent = [0, detector_image_data.shape[1], 0, detector_image_data.shape[0]])
 
-            with fits.open(detector_image) as hdu:
-                detector_bounds = get_bounds(hdu)
-
             detector_y_ticks = ticks_from_bounds((round(detector_bounds["y_min"]), round(detector_bounds["y_max"])), detector_image_plot.get_ylim())
             detector_x_ticks = ticks_from_bounds((round(detector_bounds["x_min"]), round(detector_bounds["x_max"])), detector_image_plot.get_xlim())
             detector_image_plot.set_yticks(*detector_y_ticks)
             detector_image_plot.set_xticks(*detector_x_ticks, rotation = 90)
             detector_image_plot.grid(True, which = "both", linestyle = "--", linewidth = 0.5)
 
-            os.remove(sky_image)
-            os.remove(detector_image)
             figure.savefig(os.path.join(obs_dir, f"{source}_{obs_id}.png"), dpi = 300, bbox_inches = "tight")
             plt.close(figure)
\ No newline at end of file
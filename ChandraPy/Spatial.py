@@ -0,0 +1,201 @@
+from ChandraPy import Events as ev
+import numpy as np
+import os
+
+_cache = {}
+
+class SkyIndex:
+    """Grid index over the sky x/y of an event list. Events are bucketed into square cells, and the row numbers of each cell are stored
+       contiguously, so the events near a position are found without scanning the whole list.
+
+    Attributes:
+        cell_size (float): Side of a cell (pixels).
+        x_min (float): Sky x of the left edge of the grid (pixels).
+        y_min (float): Sky y of the bottom edge of the grid (pixels).
+        nx (int): Number of cells along x.
+        ny (int): Number of cells along y.
+        rows (numpy.ndarray): Row numbers of the events, grouped by cell and in file order within a cell.
+        offsets (numpy.ndarray): Start of each cell in 'rows', cell (i, j) holds rows[offsets[j * nx + i]:offsets[j * nx + i + 1]].
+    """
+
+    def __init__(self, x, y, cell_size = 16):
+        x = np.asarray(x, dtype = float)
+        y = np.asarray(y, dtype = float)
+        finite = np.isfinite(x) & np.isfinite(y)
+
+        self.cell_size = float(cell_size)
+        self.x_min = float(np.min(x[finite])) if finite.any() else 0.
+        self.y_min = float(np.min(y[finite])) if finite.any() else 0.
+        self.nx = int((np.max(x[finite]) - self.x_min) // self.cell_size) + 1 if finite.any() else 1
+        self.ny = int((np.max(y[finite]) - self.y_min) // self.cell_size) + 1 if finite.any() else 1
+
+        rows = np.flatnonzero(finite)
+        cells = self._cells(x[rows], y[rows])
+        order = np.argsort(cells, kind = "stable")
+        self.rows = rows[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength = self.nx * self.ny))))
+
+    def _cells(self, x, y):
+        i = ((x - self.x_min) // self.cell_size).astype(np.int64)
+        j = ((y - self.y_min) // self.cell_size).astype(np.int64)
+
+        return j * self.nx + i
+
+    def box(self, x_min, y_min, x_max, y_max):
+        """Returns the rows of the events in the cells overlapping a rectangle. It's a superset of the events inside the rectangle.
+
+        Args:
+            x_min (float): Sky x of the left edge (pixels).
+            y_min (float): Sky y of the bottom edge (pixels).
+            x_max (float): Sky x of the right edge (pixels).
+            y_max (float): Sky y of the top edge (pixels).
+
+        Returns:
+            numpy.ndarray: Sorted array of row numbers.
+        """
+
+        i_min = max(int((x_min - self.x_min) // self.cell_size), 0)
+        i_max = min(int((x_max - self.x_min) // self.cell_size), self.nx - 1)
+        j_min = max(int((y_min - self.y_min) // self.cell_size), 0)
+        j_max = min(int((y_max - self.y_min) // self.cell_size), self.ny - 1)
+        if i_min > i_max or j_min > j_max:
+            return np.array([], dtype = self.rows.dtype)
+
+        #Cells of one grid row are contiguous, so each row of the rectangle is a single slice
+        slices = [self.rows[self.offsets[j * self.nx + i_min]:self.offsets[j * self.nx + i_max + 1]] for j in range(j_min, j_max + 1)]
+
+        return np.sort(np.concatenate(slices))
+
+    def candidates(self, x, y, radius):
+        """Returns the rows of the events in the cells overlapping the bounding box of a circle. It's a superset of the events inside the circle.
+
+        Args:
+            x (float): Sky x of the center (pixels).
+            y (float): Sky y of the center (pixels).
+            radius (float): Radius of the circle (pixels).
+
+        Returns:
+            numpy.ndarray: Sorted array of row numbers.
+        """
+
+        return self.box(x - radius, y - radius, x + radius, y + radius)
+
+    def query_circle(self, x, y, radius, x_values, y_values):
+        """Returns the rows of the events inside a circle, with the same inclusive test as 'Utilities.extract_region_events'.
+
+        Args:
+            x (float): Sky x of the center (pixels).
+            y (float): Sky y of the center (pixels).
+            radius (float): Radius of the circle (pixels).
+            x_values (numpy.ndarray): Sky x of all events, as the index was built from.
+            y_values (numpy.ndarray): Sky y of all events, as the index was built from.
+
+        Returns:
+            numpy.ndarray: Sorted array of row numbers.
+        """
+
+        rows = self.candidates(x, y, radius)
+
+        return rows[(x_values[rows] - x) ** 2 + (y_values[rows] - y) ** 2 <= radius ** 2]
+
+    def query_annulus(self, x, y, inner, outer, x_values, y_values):
+        """Returns the rows of the events inside an annulus, outside its inner circle and inside or on its outer circle.
+
+        Args:
+            x (float): Sky x of the center (pixels).
+            y (float): Sky y of the center (pixels).
+            inner (float): Inner radius of the annulus (pixels).
+            outer (float): Outer radius of the annulus (pixels).
+            x_values (numpy.ndarray): Sky x of all events, as the index was built from.
+            y_values (numpy.ndarray): Sky y of all events, as the index was built from.
+
+        Returns:
+            numpy.ndarray: Sorted array of row numbers.
+        """
+
+        rows = self.candidates(x, y, outer)
+        distance = (x_values[rows] - x) ** 2 + (y_values[rows] - y) ** 2
+
+        return rows[(distance > inner ** 2) & (distance <= outer ** 2)]
+
+def sky_index(event_file, cell_size = 16):
+    """Returns the sky index of an event file. It's built on first use and memoized per file and cell size, and built again only if the
+       file's modification time or size changes.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        cell_size (int/float, optional): Side of a cell (pixels). Defaults to 16.
+
+    Returns:
+        SkyIndex: Index over the sky x/y of the events.
+    """
+
+    event_file = os.path.abspath(event_file)
+    stat = os.stat(event_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get((event_file, cell_size))
+    if cached is None or cached[0] != signature:
+        events = ev.read_events(event_file, ["x", "y"])
+        cached = (signature, SkyIndex(events["x"], events["y"], cell_size))
+        _cache[(event_file, cell_size)] = cached
+
+    return cached[1]
+
+def extract_circles(event_file, circles, columns = ("time", "energy"), filters = None, cell_size = 16):
+    """Returns the events inside each of a list of circles, from one read of the event file. Only the events in the cells around each circle
+       are tested, so the cost grows with the number of events extracted rather than with the number of circles times the number of events.
+       Event lists with more rows than 'Events.chunk_rows' are streamed through 'Events.iter_events' and each chunk is indexed on its own,
+       so memory is bounded by the chunk size. Their cost then grows with the number of events plus the number of circles times the number
+       of chunks, as every circle is looked up in the index of every chunk.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        circles (list): List of tuples (x, y, radius) in sky pixels, or (x, y, inner radius, outer radius) for annuli such as background regions.
+        columns (list, optional): Names of the columns to be returned. Defaults to ("time", "energy").
+        filters (dict, optional): Dictionary mapping column names to inclusive (min, max) ranges the events must also be in. Defaults to None.
+        cell_size (int/float, optional): Side of a cell of the sky index (pixels). Defaults to 16.
+
+    Returns:
+        list: List with a dictionary per circle, mapping each lowercase column name to a NumPy array of the events inside it, in file order.
+    """
+
+    filters = {column.lower(): limits for column, limits in (filters or {}).items()}
+    columns = [column.lower() for column in columns]
+    if ev.streamed(event_file):
+        return _extract_circles_chunked(event_file, circles, columns, filters, cell_size)
+
+    index = sky_index(event_file, cell_size)
+    events = ev.read_events(event_file, list(dict.fromkeys(["x", "y"] + list(filters) + columns)))
+
+    return _query_circles(index, events, circles, columns, filters)
+
+def _query_circles(index, events, circles, columns, filters):
+    extracted = []
+    for circle in circles:
+        if len(circle) == 4:
+            rows = index.query_annulus(*circle, events["x"], events["y"])
+        else:
+            rows = index.query_circle(*circle, events["x"], events["y"])
+        for column, (low, high) in filters.items():
+            values = events[column][rows]
+            rows = rows[(values >= low) & (values <= high)]
+        extracted.append({column: np.asarray(events[column][rows]) for column in columns})
+
+    return extracted
+
+def _extract_circles_chunked(event_file, circles, columns, filters, cell_size):
+    #Event lists larger than a chunk aren't indexed whole, the index would hold a row number per event. Each chunk is bucketed into its own
+    #index instead, which is dropped with the chunk, so every circle is still only tested against the events in the cells around it
+    extracted = [{column: [] for column in columns} for _ in circles]
+    for chunk in ev.iter_events(event_file, list(dict.fromkeys(["x", "y"] + list(filters) + columns))):
+        index = SkyIndex(chunk["x"], chunk["y"], cell_size)
+        for events, part in zip(extracted, _query_circles(index, chunk, circles, columns, filters)):
+            for column in columns:
+                events[column].append(part[column])
+
+    return [{column: np.concatenate(arrays) for column, arrays in events.items()} for events in extracted]
+
+def clear_cache():
+    """Forgets all memoized sky indexes."""
+
+    _cache.clear()
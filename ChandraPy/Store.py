@@ -0,0 +1,273 @@
+from ChandraPy import values
+import glob
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+
+tables = ("bins", "blocks")
+
+def store_path(output_dir, source):
+    """Returns the path of the light curve store of a source, which sits next to its Obs. ID directories as '{source}/{source}.lcstore'.
+
+    Args:
+        output_dir (str): Absolute path to directory where the sources' light curves are saved.
+        source (str): Name of source, preferably in J2000 sexagecimal format.
+
+    Returns:
+        str: Absolute path to the directory of the light curve store.
+    """
+
+    return os.path.join(output_dir, source, f"{source}.lcstore")
+
+def _write_atomic(path, write):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as file:
+        write(file)
+    os.replace(tmp, path)
+
+def result_tables(result):
+    """Returns the binned light curves and Bayesian Blocks of a computed result as columns of equal length, without the NaN padding of the
+       '_bb.csv' file.
+
+    Args:
+        result (LightcurveResult): Result returned by 'Lightcurves.compute_lightcurves'.
+
+    Returns:
+        tuple(bins, blocks): Tuple of dictionaries mapping column names to NumPy arrays. Blocks have columns 'Start' and 'Stop' (s) in
+                             spacecraft time, 'Time Intervals', 'Exposure' and the counts and count rates of every band.
+    """
+
+    bins = {column: result.lightcurve[column].to_numpy() for column in result.lightcurve.columns}
+    if result.hardness is not None:
+        bins.update({column: result.hardness[column].to_numpy() for column in result.hardness.columns})
+
+    edges = result.blocks["Bin Edges"].to_numpy()
+    blocks = {"Start": edges[:-1] + result.metadata.tstart, "Stop": edges[1:] + result.metadata.tstart}
+    for column in result.blocks.columns:
+        if column != "Bin Edges":
+            blocks[column] = result.blocks[column].to_numpy()[1:]
+
+    return bins, blocks
+
+def append_result(store, result):
+    """Appends a computed result to a light curve store. Every Obs. ID is written to its own part file, so jobs of the same source running in
+       parallel can append without locking, and appending an Obs. ID again replaces it. 'compact' later packs the parts into the columns.
+
+    Args:
+        store (str): Absolute path to the directory of the light curve store.
+        result (LightcurveResult): Result returned by 'Lightcurves.compute_lightcurves'.
+
+    Returns:
+        str: Absolute path to the part file written.
+    """
+
+    os.makedirs(os.path.join(store, "parts"), exist_ok = True)
+    bins, blocks = result_tables(result)
+    metadata = result.metadata
+    header = {"OBS_ID": str(result.obs_id),
+              "INSTRUME": metadata.instrument,
+              "TSTART": float(metadata.tstart),
+              "TSTOP": float(metadata.tstop),
+              "TIMEDEL": float(metadata.timedel),
+              "DTCOR": float(metadata.dtcor),
+              "RA_TARG": float(metadata.ra_targ),
+              "DEC_TARG": float(metadata.dec_targ),
+              "BINSIZE": float(result.binsize),
+              "P0": float(result.p0)
+              }
+
+    arrays = {f"bins/{column}": array for column, array in bins.items()}
+    arrays.update({f"blocks/{column}": array for column, array in blocks.items()})
+    arrays["header"] = np.array(json.dumps(header))
+    part = os.path.join(store, "parts", f"{result.obs_id}.npz")
+    _write_atomic(part, lambda file: np.savez(file, **arrays))
+
+    return part
+
+def _read_index(store):
+    index_file = os.path.join(store, "index.json")
+    if not os.path.exists(index_file):
+        return {"VERSION": 0, "COLUMNS": {table: {} for table in tables}, "OBSERVATIONS": []}
+
+    with open(index_file) as file:
+        return json.load(file)
+
+def _read_part(part):
+    with np.load(part) as data:
+        header = json.loads(str(data["header"]))
+        columns = {table: {key.split("/", 1)[1]: data[key] for key in data.files if key.startswith(f"{table}/")} for table in tables}
+
+    return header, columns
+
+def _observations(store):
+    #Parts newer than what was packed take precedence over the packed columns
+    index = _read_index(store)
+    observations = {entry["OBS_ID"]: dict(entry, SOURCE = "packed") for entry in index["OBSERVATIONS"]}
+    for part in glob.glob(os.path.join(store, "parts", "*.npz")):
+        stat = os.stat(part)
+        obs_id = os.path.splitext(os.path.basename(part))[0]
+        packed = observations.get(obs_id)
+        if packed is not None and packed["PART"] == [stat.st_mtime_ns, stat.st_size]:
+            continue
+        observations[obs_id] = {"OBS_ID": obs_id, "SOURCE": part, "PART": [stat.st_mtime_ns, stat.st_size]}
+
+    return index, observations
+
+def compact(store):
+    """Packs the part files of a light curve store into one '.npy' file per column and table, with the rows of each Obs. ID contiguous and
+       located by offsets in 'index.json'. Parts are removed once packed, unless they were replaced in the meantime.
+
+    Args:
+        store (str): Absolute path to the directory of the light curve store.
+
+    Returns:
+        int: Number of Obs. IDs in the store.
+    """
+
+    index, observations = _observations(store)
+    if all(entry["SOURCE"] == "packed" for entry in observations.values()):
+        return len(observations)
+
+    version = index["VERSION"]
+    old_directory = os.path.join(store, f"packed-{version}")
+    parts = {}
+    headers = {}
+    for obs_id, entry in observations.items():
+        if entry["SOURCE"] == "packed":
+            headers[obs_id] = entry["METADATA"]
+            parts[obs_id] = {table: {column: np.load(os.path.join(old_directory, table, f"{column}.npy"), mmap_mode = "r")[entry[table.upper()][0]:entry[table.upper()][0] + entry[table.upper()][1]]
+                                     for column in index["COLUMNS"][table]} for table in tables}
+        else:
+            headers[obs_id], parts[obs_id] = _read_part(entry["SOURCE"])
+
+    order = sorted(observations, key = lambda obs_id: (headers[obs_id]["TSTART"], obs_id))
+    directory = os.path.join(store, f"packed-{version + 1}")
+    shutil.rmtree(directory, ignore_errors = True)
+    new_index = {"VERSION": version + 1, "COLUMNS": {}, "OBSERVATIONS": [{"OBS_ID": obs_id, "METADATA": headers[obs_id], "PART": observations[obs_id]["PART"]} for obs_id in order]}
+    for table in tables:
+        os.makedirs(os.path.join(directory, table))
+        lengths = [len(next(iter(parts[obs_id][table].values()), [])) for obs_id in order]
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+        for entry, offset, length in zip(new_index["OBSERVATIONS"], offsets, lengths):
+            entry[table.upper()] = [int(offset), int(length)]
+
+        #Columns missing from some Obs. IDs, such as the bands of HRC, are filled with NaN
+        columns = list(dict.fromkeys(column for obs_id in order for column in parts[obs_id][table]))
+        new_index["COLUMNS"][table] = {}
+        for column in columns:
+            pieces = [parts[obs_id][table].get(column) for obs_id in order]
+            if any(piece is None for piece in pieces):
+                pieces = [np.full(length, np.nan) if piece is None else np.asarray(piece, dtype = float) for piece, length in zip(pieces, lengths)]
+            packed = np.concatenate(pieces) if pieces else np.array([])
+            np.save(os.path.join(directory, table, f"{column}.npy"), packed)
+            new_index["COLUMNS"][table][column] = packed.dtype.name
+
+    _write_atomic(os.path.join(store, "index.json"), lambda file: file.write(json.dumps(new_index, indent = 4).encode()))
+    shutil.rmtree(old_directory, ignore_errors = True)
+    for obs_id in order:
+        part = os.path.join(store, "parts", f"{obs_id}.npz")
+        if observations[obs_id]["SOURCE"] == part:
+            stat = os.stat(part) if os.path.exists(part) else None
+            if stat is not None and [stat.st_mtime_ns, stat.st_size] == observations[obs_id]["PART"]:
+                os.remove(part)
+
+    return len(order)
+
+def read_metadata(store):
+    """Returns the header keywords and parameters of every Obs. ID in a light curve store.
+
+    Args:
+        store (str): Absolute path to the directory of the light curve store.
+
+    Returns:
+        pandas.core.frame.DataFrame: DataFrame with a row per Obs. ID, sorted by 'TSTART'.
+    """
+
+    _, observations = _observations(store)
+    rows = [entry["METADATA"] if entry["SOURCE"] == "packed" else _read_part(entry["SOURCE"])[0] for entry in observations.values()]
+    df = pd.DataFrame(rows, columns = ["OBS_ID", "INSTRUME", "TSTART", "TSTOP", "TIMEDEL", "DTCOR", "RA_TARG", "DEC_TARG", "BINSIZE", "P0"])
+
+    return df.sort_values(["TSTART", "OBS_ID"]).reset_index(drop = True)
+
+def _select(names, bands):
+    if bands is None:
+        return names
+
+    return [name for name in names if not any(name.startswith(f"{band} ") for band in values["Band"] if band not in bands)]
+
+def _frame(obs_ids, lengths, load, names, table, time_min, time_max):
+    if table == "bins":
+        start = stop = np.asarray(load("Time"))
+    else:
+        start, stop = np.asarray(load("Start")), np.asarray(load("Stop"))
+    rows = np.ones(len(start), dtype = bool)
+    if time_min is not None:
+        rows &= stop >= time_min
+    if time_max is not None:
+        rows &= start <= time_max
+
+    df = pd.DataFrame({name: np.asarray(load(name))[rows] for name in names})
+    df.insert(0, "Observation ID", np.repeat(np.array(obs_ids, dtype = object), lengths)[rows])
+
+    return df
+
+def _read_table(store, table, obs_ids, bands, time_min, time_max):
+    index, observations = _observations(store)
+    if obs_ids is not None:
+        obs_ids = [str(obs_id) for obs_id in obs_ids]
+        observations = {obs_id: observations[obs_id] for obs_id in obs_ids if obs_id in observations}
+
+    frames = []
+    packed = [entry for entry in observations.values() if entry["SOURCE"] == "packed"]
+    if packed:
+        #The rows of all packed Obs. IDs asked for are gathered from each memory-mapped column at once
+        directory = os.path.join(store, f"packed-{index['VERSION']}", table)
+        lengths = [entry[table.upper()][1] for entry in packed]
+        rows = np.concatenate([np.arange(offset, offset + length) for offset, length in (entry[table.upper()] for entry in packed)])
+        load = lambda column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode = "r")[rows]
+        frames.append(_frame([entry["OBS_ID"] for entry in packed], lengths, load, _select(list(index["COLUMNS"][table]), bands), table, time_min, time_max))
+
+    for entry in observations.values():
+        if entry["SOURCE"] != "packed":
+            columns = _read_part(entry["SOURCE"])[1][table]
+            frames.append(_frame([entry["OBS_ID"]], [len(next(iter(columns.values()), []))], columns.get, _select(list(columns), bands), table, time_min, time_max))
+
+    if not frames:
+        return pd.DataFrame(columns = ["Observation ID"])
+
+    return pd.concat(frames, ignore_index = True).sort_values(["Time" if table == "bins" else "Start"], kind = "stable").reset_index(drop = True)
+
+def read_lightcurves(store, obs_ids = None, bands = None, time_min = None, time_max = None):
+    """Returns binned light curves from a light curve store. Packed columns are memory-mapped, so only the rows asked for are read.
+
+    Args:
+        store (str): Absolute path to the directory of the light curve store.
+        obs_ids (list, optional): Obs. IDs to be read. Defaults to None, in which case all are read.
+        bands (list, optional): Bands whose columns are read, such as ['Broadband', 'Hard']. Defaults to None, in which case all are read.
+        time_min (float, optional): Bins with 'Time' before this spacecraft time (s) are left out. Defaults to None.
+        time_max (float, optional): Bins with 'Time' after this spacecraft time (s) are left out. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: DataFrame with column 'Observation ID' followed by the light curve columns given by 'ChandraPy.order' and the
+                                     Hardness Ratios, sorted by 'Time'.
+    """
+
+    return _read_table(store, "bins", obs_ids, bands, time_min, time_max)
+
+def read_blocks(store, obs_ids = None, bands = None, time_min = None, time_max = None):
+    """Returns Bayesian Blocks from a light curve store, one row per block.
+
+    Args:
+        store (str): Absolute path to the directory of the light curve store.
+        obs_ids (list, optional): Obs. IDs to be read. Defaults to None, in which case all are read.
+        bands (list, optional): Bands whose columns are read, such as ['Broadband', 'Hard']. Defaults to None, in which case all are read.
+        time_min (float, optional): Blocks ending before this spacecraft time (s) are left out. Defaults to None.
+        time_max (float, optional): Blocks starting after this spacecraft time (s) are left out. Defaults to None.
+
+    Returns:
+        pandas.core.frame.DataFrame: DataFrame with columns 'Observation ID', 'Start', 'Stop' (s), 'Time Intervals' (s), 'Exposure' (s) and the counts and count rates of every band, sorted by 'Start'.
+    """
+
+    return _read_table(store, "blocks", obs_ids, bands, time_min, time_max)
@@ -0,0 +1,262 @@
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    #Not available on Windows, where peak memory isn't recorded
+    resource = None
+
+#Counters added to stages with 'count', in the order they're shown in summaries
+counters = ["Events", "Blocks", "CIAO Calls"]
+
+#Records of the finished stages while tracing is enabled, None while it's disabled
+_records = None
+_local = threading.local()
+_null = contextlib.nullcontext()
+
+def enable():
+    """Starts recording stages in this process. Records of an earlier trace that wasn't collected are discarded."""
+
+    global _records
+    _records = []
+
+def disable():
+    """Stops recording stages in this process and returns what was recorded.
+
+    Returns:
+        list: List of stage records, dictionaries with keys 'Stage', 'Job', 'PID', 'TID', 'Start' (s since the epoch), 'Wall' (s), 'CPU' (s), 'Peak RSS' (MB) and the 'counters'.
+    """
+
+    global _records
+    records, _records = _records or [], None
+
+    return records
+
+def enabled():
+    """Returns whether stages are being recorded in this process.
+
+    Returns:
+        bool: True if 'enable' was called and 'disable' wasn't since.
+    """
+
+    return _records is not None
+
+def extend(records):
+    """Adds records collected in other processes, such as batch workers, to this process' trace. Does nothing while tracing is disabled.
+
+    Args:
+        records (list): Stage records returned by 'disable' in the other process.
+    """
+
+    if _records is not None and records:
+        _records.extend(records)
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+        _local.job = ""
+    return _local.stack
+
+def _children_peak():
+    if resource is None:
+        return 0.
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def _high_water_mark(reset = False):
+    #Peak resident memory of this process (MB). On Linux it's read from 'VmHWM', which writing 5 to '/proc/self/clear_refs' resets, so
+    #each stage measures its own peak. Elsewhere only the process' lifetime peak is known
+    try:
+        with open("/proc/self/status") as file:
+            peak = next(float(line.split()[1]) / 1024 for line in file if line.startswith("VmHWM:"))
+        if reset:
+            with open("/proc/self/clear_refs", "w") as file:
+                file.write("5")
+        return peak
+    except (OSError, StopIteration):
+        if resource is None:
+            return float("nan")
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def _cpu_time():
+    times = os.times()
+
+    return times.user + times.system + times.children_user + times.children_system
+
+@contextlib.contextmanager
+def _stage(name, job):
+    stack = _stack()
+    record = {"Stage": name, "Job": _local.job if job is None else str(job), "PID": os.getpid(), "TID": threading.get_ident(), "Start": time.time(), "Wall": 0., "CPU": 0., "Peak RSS": 0.}
+    record.update({counter: 0 for counter in counters})
+    #The peak reached so far by the enclosing stage is kept before the mark is reset for this one, and this stage's peak is passed back to it
+    peak = _high_water_mark(reset = True)
+    if stack:
+        stack[-1]["Peak RSS"] = max(stack[-1]["Peak RSS"], peak)
+    stack.append(record)
+    start = time.perf_counter()
+    cpu_start = _cpu_time()
+    children_start = _children_peak()
+    try:
+        yield record
+    finally:
+        record["Wall"] = time.perf_counter() - start
+        record["CPU"] = _cpu_time() - cpu_start
+        record["Peak RSS"] = max(record["Peak RSS"], _high_water_mark())
+        #Child processes such as CIAO tools only report their lifetime peak, which is counted if one of them set it during the stage
+        children_peak = _children_peak()
+        if children_peak > children_start:
+            record["Peak RSS"] = max(record["Peak RSS"], children_peak)
+        stack.pop()
+        if stack:
+            stack[-1]["Peak RSS"] = max(stack[-1]["Peak RSS"], record["Peak RSS"])
+        if _records is not None:
+            _records.append(record)
+
+def stage(name, job = None):
+    """Returns a context manager timing a stage of the pipeline. While tracing is disabled it's a shared no-op context, so instrumented code costs one check.
+
+    Args:
+        name (str): Name of the stage, such as 'blocks.segment'.
+        job (str, optional): Label of the job the stage belongs to. Defaults to None, in which case the label set by the enclosing 'job' is used.
+
+    Returns:
+        contextlib.AbstractContextManager: Context manager recording wall time, CPU time (including child processes such as CIAO tools), peak RSS and counters of the stage.
+        The peak RSS is the stage's own on Linux, shared by stages running at the same time in other threads. Elsewhere it's the process' peak so far.
+    """
+
+    if _records is None:
+        return _null
+
+    return _stage(name, job)
+
+@contextlib.contextmanager
+def _job(label):
+    _stack()
+    previous = _local.job
+    _local.job = str(label)
+    try:
+        with _stage("job", label):
+            yield
+    finally:
+        _local.job = previous
+
+def job(label):
+    """Returns a context manager timing a whole job as the stage 'job', and labelling the stages run inside it with 'label'.
+
+    Args:
+        label (str): Label of the job, such as '{source}/{Obs. ID}'.
+
+    Returns:
+        contextlib.AbstractContextManager: Context manager, a shared no-op context while tracing is disabled.
+    """
+
+    if _records is None:
+        return _null
+
+    return _job(label)
+
+def traced(name):
+    """Decorator timing every call of a function as a stage.
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        callable: Decorator, whose wrapped function calls the original directly while tracing is disabled.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _records is None:
+                return function(*args, **kwargs)
+            with _stage(name, None):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def count(counter, value = 1):
+    """Adds to a counter of the innermost running stage of this thread. Does nothing while tracing is disabled or outside a stage.
+
+    Args:
+        counter (str): Name of the counter, one of 'counters'.
+        value (int, optional): Amount added. Defaults to 1.
+    """
+
+    if _records is None:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1][counter] += value
+
+def write_trace(trace_file, records):
+    """Writes stage records in the Chrome trace event format, which can be opened in chrome://tracing or Perfetto. Each worker process is
+       shown as its own row, with stages nested by time.
+
+    Args:
+        trace_file (str): Absolute path to the JSON file to be written.
+        records (list): Stage records returned by 'disable'.
+
+    Returns:
+        str: Absolute path to the written file.
+    """
+
+    events = []
+    for record in records:
+        args = {key: record[key] for key in ["Job", "CPU", "Peak RSS"] + counters}
+        events.append({"name": record["Stage"], "cat": record["Job"] or "pipeline", "ph": "X", "ts": record["Start"] * 1e6, "dur": record["Wall"] * 1e6,
+                       "pid": record["PID"], "tid": record["TID"], "args": args})
+    with open(trace_file, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    return trace_file
+
+def read_trace(trace_file):
+    """Reads stage records back from a file written by 'write_trace'.
+
+    Args:
+        trace_file (str): Absolute path to the JSON file.
+
+    Returns:
+        list: List of stage records, as returned by 'disable'.
+    """
+
+    with open(trace_file) as file:
+        events = json.load(file)["traceEvents"]
+
+    return [{"Stage": event["name"], "PID": event["pid"], "TID": event["tid"], "Start": event["ts"] / 1e6, "Wall": event["dur"] / 1e6, **event["args"]} for event in events]
+
+def summary(records, by = "Stage"):
+    """Sums stage records into a table. Counters are only added to the innermost stage, so they aren't counted twice, while times of
+       nested stages overlap with those of the stages around them.
+
+    Args:
+        records (list): Stage records returned by 'disable'.
+        by (str, optional): 'Stage' for one row per stage name, or 'Job' for one row per job, whose times are those of its 'job' stage. Defaults to 'Stage'.
+
+    Returns:
+        pandas.core.frame.DataFrame: A Pandas DataFrame with columns by, 'Calls', 'Wall' (s), 'CPU' (s), 'Peak RSS' (MB) and the 'counters'.
+    """
+
+    import pandas as pd
+
+    columns = [by, "Calls", "Wall", "CPU", "Peak RSS"] + counters
+    df = pd.DataFrame(records, columns = ["Stage", "Job", "Wall", "CPU", "Peak RSS"] + counters)
+    if df.empty:
+        return pd.DataFrame(columns = columns)
+
+    totals = df.groupby(by, sort = False)[counters].sum()
+    if by == "Job":
+        df = df[(df["Stage"] == "job") & (df["Job"] != "")]
+    times = df.groupby(by, sort = False).agg(Calls = ("Wall", "size"), Wall = ("Wall", "sum"), CPU = ("CPU", "sum"), **{"Peak RSS": ("Peak RSS", "max")})
+
+    return times.join(totals, how = "inner").reset_index()[columns]
@@ -1,30 +1,63 @@
-from astropy.io import fits
-from astropy.table import Table
-from ciao_contrib.runtool import dmcoords, dmcopy,  dmkeypar, dmmakereg, dmstat, find_chandra_obsid, psfsize_srcs
+from ChandraPy import Backends as backends
+from ChandraPy import Catalog as catalog
+from ChandraPy import Events as ev
+from ChandraPy import Metadata as md
+from ChandraPy import Spatial as spatial
+from ChandraPy import Tracing as tracing
+import io
+import numpy as np
 import os
 import pandas as pd
+import re
 
-def retrieve_obs_ids(output_dir, source):
+def _save_obs_ids(output_dir, source, obs_ids):
+    series = pd.Series(obs_ids, name = "Observation ID", dtype = str)
+    series = series.astype(int).sort_values().astype(str).reset_index(drop = True)
+    series.index = series.index + 1
+    series.to_csv(os.path.join(output_dir, f"{source}.csv"), index = False)
+
+def retrieve_obs_ids(output_dir, source, catalog_file = None, offline = False):
     """Creates a CSV File with column name 'Observation ID' containing all Obs. IDs for that source.
 
     Args:
         output_dir (str): Absolute path to the directory where the list of Obs. IDs is the be saved.
         source (str): Name of the source.
+        catalog_file (str, optional): Absolute path to an Obs. ID catalog ('Catalog.open_catalog') the Obs. IDs are looked up in, for sources
+                                      named in J2000 sexagecimal format. Defaults to None, in which case 'find_chandra_obsid' is run.
+        offline (bool, optional): Whether to use the catalog as it is, without querying the archive. Defaults to False.
     """
 
-    data = find_chandra_obsid(source)
-    with open("Temp.txt", "w") as file:
-        file.write(data)
+    if catalog_file is not None:
+        _save_obs_ids(output_dir, source, catalog.source_obs_ids(catalog_file, [source], offline)[source])
+        return
 
-    df = pd.read_csv(f"Temp.txt", sep = "\s+")
-    os.remove("Temp.txt")
+    data = backends.get_backend().find_obsids(source)
+    df = pd.read_csv(io.StringIO(data), sep = r"\s+")
     new_columns = list(df.columns[1:]) + ["Unnamed"]
     df.columns = new_columns
     df = df.iloc[:, :-1]
-    series = pd.Series(df["obsid"], name = "Observation ID")
-    series = series.astype(int).sort_values().astype(str).reset_index(drop = True)
-    series.index = series.index + 1
-    series.to_csv(os.path.join(output_dir, f"{source}.csv"), index = False)
+    _save_obs_ids(output_dir, source, df["obsid"])
+
+def retrieve_sources_obs_ids(output_dir, sources, catalog_file, offline = False):
+    """Creates the CSV File of Obs. IDs of each of a list of sources, as 'retrieve_obs_ids' does, in '{output_dir}/{source}/{source}.csv'.
+       All the sources are looked up in the catalog at once, so sources in the same field share the archive queries.
+
+    Args:
+        output_dir (str): Absolute path to the directory holding a directory per source.
+        sources (list): Names of sources in J2000 sexagecimal format.
+        catalog_file (str): Absolute path to the Obs. ID catalog.
+        offline (bool, optional): Whether to use the catalog as it is, without querying the archive. Defaults to False.
+
+    Returns:
+        dict: Dictionary mapping each source to its sorted list of Obs. IDs (str).
+    """
+
+    obs_ids = catalog.source_obs_ids(catalog_file, list(sources), offline)
+    for source, source_obs_ids in obs_ids.items():
+        os.makedirs(os.path.join(output_dir, source), exist_ok = True)
+        _save_obs_ids(os.path.join(output_dir, source), source, source_obs_ids)
+
+    return obs_ids
 
 def name_conv(name):
     """Converts source name from CXC sexagecimal format to J2000 sexagecimal format.
@@ -48,12 +81,22 @@ def instrument_checker(event_file):
         str: Which instrument was used to take the observation (ACIS/HRC).
     """
 
-    with fits.open(event_file) as hdul:
-        header = hdul[0].header
-        instrument = header["INSTRUME"]
-    
-    return instrument
+    return md.event_metadata(event_file).instrument
+
+def read_gti(event_file, ccd_id = None):
+    """Returns the good time intervals of the event file.
+
+    Args:
+        event_file (str): Absolute path to event file.
+        ccd_id (int, optional): For ACIS, the CCD whose GTI extension is to be used. Defaults to None, in which case the first GTI extension is used.
 
+    Returns:
+        tuple(gti_start, gti_stop): Tuple containing arrays of GTI start and stop times (s). Both are empty if the file has no GTI extension.
+    """
+
+    return md.event_metadata(event_file).gti_for(ccd_id)
+
+@tracing.traced("region.psf")
 def psf_radius(obs_dir, event_file, source):
     """Returns PSF corrected radius of the source for given event file. Lower bound of 3.2 for ACIS and 7.5 for HRC, upper bound of 61 for both. Multiplied by 1.5
        to account for off-axis angle.
@@ -67,7 +110,6 @@ def psf_radius(obs_dir, event_file, source):
         float: Radius of region in pixels (physical).
     """
 
-    os.chdir(obs_dir)
     coords = source.split("J")[1]
     sign = "+" if "+" in coords else "-"
     ra_raw, dec_raw = coords.split(sign)
@@ -75,11 +117,7 @@ def psf_radius(obs_dir, event_file, source):
     ra = f"{ra_raw[0:2]}:{ra_raw[2:4]}:{ra_raw[4:]}"
     dec = f"{dec_raw[0:2]}:{dec_raw[2:4]}:{dec_raw[4:]}"
 
-    psfsize_srcs.punlearn()
-    psfsize_srcs(infile = event_file, pos = f"{ra} {sign}{dec}", outfile = "region.fits", ecf = 0.5, clobber = "yes", verbose = 0)
-    with fits.open(os.path.join(obs_dir, "region.fits")) as hdul:
-        data = hdul[1].data
-        radius = 1.5 * float(data["R"])
+    radius = 1.5 * backends.get_backend().psf_radius(event_file, ra, f"{sign}{dec}", os.path.join(obs_dir, "region.fits"))
     #Can be modified later
     instr = instrument_checker(event_file)
     if instr == "ACIS":
@@ -90,40 +128,160 @@ def psf_radius(obs_dir, event_file, source):
             radius = 7.5
     if radius > 61:
         radius = 61
-
-    os.remove(os.path.join(obs_dir, "region.fits"))
     
     return radius
 
-def isolate_source_region(obs_dir, data_dir, source, energy_min = 200, energy_max = 8000):
-    """Creates an isolated event file for the source.
+def region_filters(instrument, energy_min = 200, energy_max = 8000):
+    """Returns the column filters applied to a source's events besides its region, energy for ACIS and 'samp' for HRC.
+
+    Args:
+        instrument (str): Name of instrument (ACIS/HRC).
+        energy_min (int, optional): Lower bound of energy band (eV). Defaults to 200.
+        energy_max (int, optional): Upper bound of energy band (eV). Defaults to 8000.
+
+    Returns:
+        dict: Dictionary mapping column names to inclusive (min, max) ranges.
+    """
+
+    if instrument == "ACIS":
+        return {"energy": (energy_min, energy_max)}
+
+    return {"samp": (10, 300)}
+
+def read_region(region_file):
+    """Returns the circle of a region file saved by 'save_source_region', which is in physical (sky pixel) coordinates.
+
+    Args:
+        region_file (str): Absolute path to region file.
+
+    Returns:
+        tuple(x, y, radius): Tuple containing sky x and y of the center and the radius (pixels).
+    """
+
+    with open(region_file) as file:
+        text = file.read()
+
+    match = re.search(r"circle\(\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*\)", text, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"No circle in physical coordinates found in region file {region_file}")
+
+    return tuple(float(value) for value in match.groups())
+
+def extract_region_events(obs_dir, data_dir, source, columns = ("time", "energy"), energy_min = 200, energy_max = 8000):
+    """Returns the source's events without CIAO, applying the same region, energy (ACIS) and 'samp' (HRC) filters as the backend's 'region_events'.
+       Columns are read through 'Events.read_events', so an up to date columnar store of the event file is used when there is one.
 
     Args:
         obs_dir (str): Absolute path to directory where light curves are to be saved, It should have CIAO format region file of name '{Source}_{Obs. ID}.reg'.
         data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
         source (str): Name of source in J2000 sexagecimal format.
+        columns (list, optional): Names of the columns to be returned. Defaults to ("time", "energy").
         energy_min (int, optional): Lower bound of energy band (eV). Defaults to 200.
         energy_max (int, optional): Upper bound of energy band (eV). Defaults to 8000.
 
     Returns:
-        tuple(outfile, instrument): Tuple containing absolute path to event file and name of instrument used to take the observation (ACIS/HRC).
+        dict: Dictionary mapping each lowercase column name to a NumPy array of the source's events.
     """
-    
+
     obs_id = data_dir.split("/")[-1]
     region_file = os.path.join(obs_dir, f"{source}_{obs_id}.reg")
+
+    return extract_sources_events(data_dir, [region_file], columns, energy_min, energy_max)[0]
+
+def extract_sources_events(data_dir, region_files, columns = ("time", "energy"), energy_min = 200, energy_max = 8000):
+    """Returns the events of many sources in one observation without CIAO, with the same filters as 'extract_region_events'. The event file
+       is read once and a sky index over it ('Spatial.sky_index') is built once per process, so each source only costs the events around it.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
+        region_files (list): Absolute paths to the sources' region files, as saved by 'save_source_region'.
+        columns (list, optional): Names of the columns to be returned. Defaults to ("time", "energy").
+        energy_min (int, optional): Lower bound of energy band (eV). Defaults to 200.
+        energy_max (int, optional): Upper bound of energy band (eV). Defaults to 8000.
+
+    Returns:
+        list: List with a dictionary per region file, mapping each lowercase column name to a NumPy array of the source's events.
+    """
+
+    obs_id = data_dir.split("/")[-1]
     event_file = os.path.join(data_dir, f"{obs_id}_evt2.fits")
-    outfile = os.path.join(obs_dir, f"{source}_{obs_id}.fits")
-    instrument = instrument_checker(event_file)
-    dmcopy.punlearn()
-    if instrument == "ACIS":
-        dmcopy(infile = f"{event_file}[sky=region({region_file})][energy={energy_min}:{energy_max}]", outfile = outfile, clobber = "yes")
-    else:
-        dmcopy(infile = f"{event_file}[sky=region({region_file})][samp=10:300]", outfile = outfile, clobber = "yes")
+    circles = [read_region(region_file) for region_file in region_files]
+
+    return spatial.extract_circles(event_file, circles, columns, region_filters(instrument_checker(event_file), energy_min, energy_max))
+
+def background_annulus(region_file, inner = 2, outer = 5):
+    """Returns the background annulus of a source, centered on its region and sized in multiples of its radius, which is the PSF corrected
+       radius from 'psf_radius'.
+
+    Args:
+        region_file (str): Absolute path to the source's region file, as saved by 'save_source_region'.
+        inner (int/float, optional): Inner radius of the annulus in multiples of the source radius. Defaults to 2.
+        outer (int/float, optional): Outer radius of the annulus in multiples of the source radius. Defaults to 5.
 
-    return outfile, instrument
+    Returns:
+        tuple(x, y, inner, outer): Tuple containing sky x and y of the center and the inner and outer radii (pixels).
+    """
+
+    if not 1 <= inner < outer:
+        raise ValueError(f"Background annulus needs 1 <= inner < outer, got inner = {inner} and outer = {outer}")
+    x, y, radius = read_region(region_file)
+
+    return x, y, inner * radius, outer * radius
+
+def save_background_region(obs_dir, data_dir, source, inner = 2, outer = 5):
+    """Creates the background region file '{Source}_{Obs. ID}_bkg.reg' of a source in CIAO format, in physical coordinates, from its region file.
+
+    Args:
+        obs_dir (str): Absolute path to directory where region files are saved. It should have CIAO format region file of name '{Source}_{Obs. ID}.reg'.
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID.
+        source (str): Name of source in J2000 sexagecimal format.
+        inner (int/float, optional): Inner radius of the annulus in multiples of the source radius. Defaults to 2.
+        outer (int/float, optional): Outer radius of the annulus in multiples of the source radius. Defaults to 5.
+
+    Returns:
+        tuple(x, y, inner, outer): Tuple containing sky x and y of the center and the inner and outer radii (pixels).
+    """
+
+    obs_id = data_dir.split("/")[-1]
+    annulus = background_annulus(os.path.join(obs_dir, f"{source}_{obs_id}.reg"), inner, outer)
+    with open(os.path.join(obs_dir, f"{source}_{obs_id}_bkg.reg"), "w") as file:
+        file.write(f"annulus({','.join(str(value) for value in annulus)})\n")
 
+    return annulus
+
+@tracing.traced("extract")
+def extract_source_background_events(obs_dir, data_dir, source, columns = ("time", "energy"), energy_min = 200, energy_max = 8000, inner = 2, outer = 5):
+    """Returns the events of a source and of its background annulus without CIAO, from one read of the event file, with the filters of
+       'extract_region_events'. Also saves the background region with 'save_background_region'.
+
+    Args:
+        obs_dir (str): Absolute path to directory where light curves are to be saved, It should have CIAO format region file of name '{Source}_{Obs. ID}.reg'.
+        data_dir (str): Absolute path to directory where data is saved. It should have name of Obs. ID, and event file should have name '{Obs. ID}_evt2.fits'.
+        source (str): Name of source in J2000 sexagecimal format.
+        columns (list, optional): Names of the columns to be returned. Defaults to ("time", "energy").
+        energy_min (int, optional): Lower bound of energy band (eV). Defaults to 200.
+        energy_max (int, optional): Upper bound of energy band (eV). Defaults to 8000.
+        inner (int/float, optional): Inner radius of the annulus in multiples of the source radius. Defaults to 2.
+        outer (int/float, optional): Outer radius of the annulus in multiples of the source radius. Defaults to 5.
+
+    Returns:
+        tuple(events, background_events, scale): Tuple containing dictionaries mapping each lowercase column name to a NumPy array of the
+                                                 source's and the background's events, and the ratio of the source area to the annulus area.
+    """
+
+    obs_id = data_dir.split("/")[-1]
+    event_file = os.path.join(data_dir, f"{obs_id}_evt2.fits")
+    x, y, radius = read_region(os.path.join(obs_dir, f"{source}_{obs_id}.reg"))
+    annulus = save_background_region(obs_dir, data_dir, source, inner, outer)
+    events, background_events = spatial.extract_circles(event_file, [(x, y, radius), annulus], columns, region_filters(instrument_checker(event_file), energy_min, energy_max))
+    scale = radius ** 2 / (annulus[3] ** 2 - annulus[2] ** 2)
+
+    return events, background_events, scale
+
+@tracing.traced("region")
 def save_source_region(obs_dir, data_dir, source):
-    """Creates region file in CIAO format for the given source.
+    """Creates region file in CIAO format for the given source. Backends other than 'ciao' approximate the PSF, so they keep a region already
+       saved by the 'ciao' backend and only create one if there's none.
 
     Args:
         obs_dir (str): Absolute path to directory where region file is to be saved.
@@ -139,13 +297,16 @@ def save_source_region(obs_dir, data_dir, source):
     
     ra = f"{ra_raw[0:2]}:{ra_raw[2:4]}:{ra_raw[4:]}"
     dec = f"{dec_raw[0:2]}:{dec_raw[2:4]}:{dec_raw[4:]}"
+    region_file = os.path.join(obs_dir, f"{source}_{obs_id}.reg")
+    backend = backends.get_backend()
+    if backend.name != "ciao" and os.path.exists(region_file):
+        #Regions of the 'ciao' backend come from CIAO's PSF library, so other backends reuse one saved by an earlier run
+        return
     radius = psf_radius(obs_dir, fits_file, source)
     circle = f"circle({ra},{sign}{dec},{radius})"
+    backend.make_region(fits_file, circle, region_file)
 
-    dmmakereg.punlearn()
-    dmmakereg(region = circle, outfile = os.path.join(obs_dir, f"{source}_{obs_id}.reg"), kernel = "ascii", wcsfile = fits_file, verbose = 0, clobber = "yes")
-
-    with open(os.path.join(obs_dir, f"{source}_{obs_id}.reg"), "r+") as file:
+    with open(region_file, "r+") as file:
         last_line = file.readlines()[-1].strip()
         last_line = last_line.replace("Circle", "circle").rstrip("#").replace(" ", "") 
         
@@ -153,28 +314,25 @@ def save_source_region(obs_dir, data_dir, source):
         file.truncate()
         file.write(last_line + "\n")
 
-def create_postage_stamps(obs_dir, source, region_event_file, event_file, sky_size = 64, det_size = 64):
-    """Generates sky and detector coordinate postage stamps.
+@tracing.traced("stamps")
+def postage_stamps(event_file, region_events, sky_size = 64, det_size = 64):
+    """Generates sky and detector coordinate postage stamps in memory. The sky image spans three times the extent of the source's events, and
+       the detector image their extent padded by 5 pixels. Events in the sky image are found through the sky index of the event file
+       ('Spatial.sky_index'), or for event lists with more rows than 'Events.chunk_rows', both images are accumulated over chunks with
+       'Events.histogram2d'.
 
     Args:
-        obs_dir (str): Absolute path to working folder where region file is to be generated. Folder name should be of the Obs. ID.
-        source (str): Name of source, preferably in J2000 sexagecimal format.
-        region_event_file (str): Absolute path to the event file for the source.
         event_file (str): Absolute path to the event file.
+        region_events (dict): Dictionary with arrays 'x', 'y', 'detx' and 'dety' of the source's events.
         sky_size (int, optional): Size of sky-coordinate image. Defaults to 64.
         det_size (int, optional): Size of detector-coordinate image. Defaults to 64.
 
     Returns:
-        tuple(sky_image, detector_image): Tuple containing absolute paths to sky-coordinate and detector-coordinate images.
+        tuple(sky_stamp, detector_stamp): Tuple containing dictionaries with keys 'image' (2-D array of counts, indexed [y, x]), 'x_min', 'y_min', 'x_max' and 'y_max'.
     """
 
-    obs_id = obs_dir.split("/")[-1]
-    sky_image = os.path.join(obs_dir, f"{source}_{obs_id}_skyimg.fits")
-    detector_image = os.path.join(obs_dir, f"{source}_{obs_id}_detimg.fits")
-
-    dmstat(infile = f"{region_event_file}[cols x,y]", verbose = 0)
-    sky_x_min, sky_y_min = map(float, dmstat.out_min.split(","))
-    sky_x_max, sky_y_max = map(float, dmstat.out_max.split(","))
+    sky_x_min, sky_y_min = float(np.min(region_events["x"])), float(np.min(region_events["y"]))
+    sky_x_max, sky_y_max = float(np.max(region_events["x"])), float(np.max(region_events["y"]))
     sky_x_padding = sky_x_max - sky_x_min
     sky_y_padding = sky_y_max - sky_y_min
 
@@ -183,21 +341,17 @@ def create_postage_stamps(obs_dir, source, region_event_file, event_file, sky_si
     sky_y_min -= sky_y_padding
     sky_y_max += sky_y_padding
 
-    sky_bin_size_x = (sky_x_max - sky_x_min) / sky_size
-    sky_bin_size_y = (sky_y_max - sky_y_min) / sky_size
-
-    dmcopy.punlearn()
-    dmcopy(infile = f"{event_file}[bin x={sky_x_min}:{sky_x_max}:{sky_bin_size_x},"f"y={sky_y_min}:{sky_y_max}:{sky_bin_size_y}]", outfile = sky_image, clobber = "yes")
-
-    with fits.open(sky_image, mode = "append") as hdu:
-        bounds_hdu = fits.BinTableHDU(Table({"X_MIN": [sky_x_min], "Y_MIN": [sky_y_min], "X_MAX": [sky_x_max], "Y_MAX": [sky_y_max]}))
-        bounds_hdu.header["EXTNAME"] = "BOUNDS"
-        hdu.append(bounds_hdu)
-        hdu.writeto(sky_image, overwrite = True)
+    sky_range = ((sky_y_min, sky_y_max), (sky_x_min, sky_x_max))
+    streamed = ev.streamed(event_file)
+    if streamed:
+        sky_image = ev.histogram2d(event_file, ["y", "x"], (sky_size, sky_size), sky_range)
+    else:
+        events = ev.read_events(event_file, ["x", "y", "detx", "dety"])
+        rows = spatial.sky_index(event_file).box(sky_x_min, sky_y_min, sky_x_max, sky_y_max)
+        sky_image, _, _ = np.histogram2d(events["y"][rows], events["x"][rows], bins = (sky_size, sky_size), range = sky_range)
 
-    dmstat(infile = f"{region_event_file}[cols detx,dety]", verbose = 0)
-    det_x_min, det_y_min = map(float, dmstat.out_min.split(","))
-    det_x_max, det_y_max = map(float, dmstat.out_max.split(","))
+    det_x_min, det_y_min = float(np.min(region_events["detx"])), float(np.min(region_events["dety"]))
+    det_x_max, det_y_max = float(np.max(region_events["detx"])), float(np.max(region_events["dety"]))
     det_x_padding = 5
     det_y_padding = 5
 
@@ -206,23 +360,20 @@ def create_postage_stamps(obs_dir, source, region_event_file, event_file, sky_si
     det_y_min -= det_y_padding
     det_y_max += det_y_padding
 
-    det_bin_size_x = (det_x_max - det_x_min) / det_size
-    det_bin_size_y = (det_y_max - det_y_min) / det_size
-
-    dmcopy.punlearn()
-    dmcopy(infile = f"{event_file}[bin detx={det_x_min}:{det_x_max}:{det_bin_size_x},"f"dety={det_y_min}:{det_y_max}:{det_bin_size_y}]", outfile = detector_image, clobber = "yes")
+    det_range = ((det_y_min, det_y_max), (det_x_min, det_x_max))
+    if streamed:
+        detector_image = ev.histogram2d(event_file, ["dety", "detx"], (det_size, det_size), det_range)
+    else:
+        detx, dety = events["detx"], events["dety"]
+        rows = np.flatnonzero((detx >= det_x_min) & (detx <= det_x_max) & (dety >= det_y_min) & (dety <= det_y_max))
+        detector_image, _, _ = np.histogram2d(dety[rows], detx[rows], bins = (det_size, det_size), range = det_range)
 
-    with fits.open(detector_image, mode = "append") as hdu:
-        bounds_hdu = fits.BinTableHDU(Table({
-            "X_MIN": [det_x_min], "Y_MIN": [det_y_min],
-            "X_MAX": [det_x_max], "Y_MAX": [det_y_max]
-        }))
-        bounds_hdu.header["EXTNAME"] = "BOUNDS"
-        hdu.append(bounds_hdu)
-        hdu.writeto(detector_image, overwrite = True)
+    sky_stamp = {"image": sky_image.astype(np.int32), "x_min": sky_x_min, "y_min": sky_y_min, "x_max": sky_x_max, "y_max": sky_y_max}
+    detector_stamp = {"image": detector_image.astype(np.int32), "x_min": det_x_min, "y_min": det_y_min, "x_max": det_x_max, "y_max": det_y_max}
 
-    return sky_image, detector_image
+    return sky_stamp, detector_stamp
 
+@tracing.traced("obs_info")
 def retrieve_obs_info(event_file):
     """Returns basic information about the observation.
 
@@ -233,14 +384,10 @@ def retrieve_obs_info(event_file):
         tuple(start_time, end_time, off_axis_offset, azimuth, ra, dec): Tuple containing 'TSTART', 'TSTOP', Off-Axis Angle, Azimuth, RA, and Dec.
     """
 
-    dmstat(infile = f"{event_file}[cols ra,dec]")
-    ra_0 = dmstat.out_mean.split(",")[0]
-    dec_0 = dmstat.out_mean.split(",")[1]
-    dmcoords(infile = f"{event_file}", option = "cel", ra = ra_0, dec = dec_0)
-    theta_0 = dmcoords.theta
-    phi_0 = dmcoords.phi
-    start_time = dmkeypar(infile = f"{event_file}", keyword = "TSTART", echo = True)
-    end_time = dmkeypar(infile = f"{event_file}", keyword = "TSTOP", echo = True)
+    ra_0, dec_0, theta_0, phi_0 = backends.get_backend().sky_position(event_file)
+    metadata = md.event_metadata(event_file)
+    start_time = metadata.tstart
+    end_time = metadata.tstop
     off_axis_offset = round(float(theta_0), 1)
     azimuth = int(phi_0)
     ra = round(float(ra_0), 5)
@@ -1,5 +1,3 @@
-import pandas as pd
-
 #Regular light curve plotting 
 #Naming conventions
 names = {"Broadband": "b",
@@ -41,16 +39,6 @@ text = {"b": "Broadband (0.2 - 8 keV)",
         "h": "Hard (2 - 8 keV)"
              }
 
-#Summary info file for plotting
-values = pd.DataFrame({
-    "Band": list(names.keys()),
-    "Identifier": list(names.values()),
-    "Energy Min": [bands_min[identifier] for identifier in names.values()],
-    "Energy Max": [bands_max[identifier] for identifier in names.values()],
-    "Color": [colors[identifier] for identifier in names.values()],
-    "Text": [text[identifier] for identifier in names.values()]
-}) 
-
 #Hardness ratio plotting
 #Hardness Ratios
 hr = {
@@ -67,10 +55,39 @@ hr_colors = {"m-s": "gold",
              "h-m-s-u": "purple"
              }
 
-hr_values = pd.DataFrame({
-    "Formula": list(hr.keys()),
-    "Identifier": list(hr.values()),
-    "Color": [hr_colors[identifier] for identifier in hr.values()]
-})
+#Bands added up on each side of each Hardness Ratio, (A - B) / (A + B)
+hr_bands = {"m-s": (["Medium"], ["Soft"]),
+            "h-s": (["Hard"], ["Soft"]),
+            "s-m-h": (["Soft"], ["Medium", "Hard"]),
+            "h-m-s-u": (["Soft", "Ultrasoft"], ["Hard", "Medium"])
+            }
+
+order = ["Bin", "Time", "Broadband Count Rate", "Ultrasoft Count Rate", "Soft Count Rate", "Medium Count Rate", "Hard Count Rate", "Count Rate Error", "Broadband Counts", "Ultrasoft Counts", "Soft Counts", "Medium Counts", "Hard Counts", "Exposure"]
+
+def __getattr__(name):
+    #The summary DataFrames are built on first use, so importing ChandraPy doesn't import pandas
+    if name not in ("values", "hr_values"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import pandas as pd
+
+    if name == "values":
+        #Summary info file for plotting
+        df = pd.DataFrame({
+            "Band": list(names.keys()),
+            "Identifier": list(names.values()),
+            "Energy Min": [bands_min[identifier] for identifier in names.values()],
+            "Energy Max": [bands_max[identifier] for identifier in names.values()],
+            "Color": [colors[identifier] for identifier in names.values()],
+            "Text": [text[identifier] for identifier in names.values()]
+        })
+    else:
+        df = pd.DataFrame({
+            "Formula": list(hr.keys()),
+            "Identifier": list(hr.values()),
+            "Color": [hr_colors[identifier] for identifier in hr.values()]
+        })
+
+    globals()[name] = df
 
-order = ["Bin", "Time", "Broadband Count Rate", "Ultrasoft Count Rate", "Soft Count Rate", "Medium Count Rate", "Hard Count Rate", "Count Rate Error", "Broadband Counts", "Ultrasoft Counts", "Soft Counts", "Medium Counts", "Hard Counts"]
\ No newline at end of file
+    return df
@@ -4,30 +4,19 @@ import os
 import sys
 sys.path.append(os.getcwd())
 sys.path.append(os.path.join(os.getcwd(), "ChandraPy"))
+from ChandraPy import Batch as batch
 from ChandraPy import Utilities as utils
 from ChandraPy import Download as d
-import concurrent.futures
-import shutil
 
 def multithreaded_download(df, object_data_dir):
-    def process_obs_id(obs_id):
-        obs_dir = os.path.join(object_data_dir, obs_id)
-        if not os.path.exists(obs_dir):
-            print(f"\nDownloading Obs. ID {obs_id}...", end = "")
-            try:
-                d.download_and_reprocess_obsid(object_data_dir, obs_id)
-                print("Done!")
-            except Exception as e:
-                print("Error", e)
-                #shutil.rmtree(obs_dir)
- 
-    with concurrent.futures.ThreadPoolExecutor(max_workers = 6) as executor:
-        futures = [executor.submit(process_obs_id, obs_id) for obs_id in df["Observation ID"]]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                future.result() 
-            except Exception as e:
-                print(f"\nAn exception occurred during processing: {e}")
+    def report(result):
+        if result["Status"] == "Done":
+            print(f"\nObs. ID {result['Observation ID']}...Done!", end = "")
+        else:
+            print(f"\nObs. ID {result['Observation ID']}...Error during {result['Stage']}, {result['Error'].strip().splitlines()[-1]}", end = "")
+
+    batch.download_pipeline(object_data_dir, df["Observation ID"], callback = report)
+    print()
 
 def processing():
     object = entries[0].get() 
@@ -48,45 +37,45 @@ def processing():
     else:
         print(f"\nDownloading Obs. ID {obs_id}...", end = "")
         try:
-            obs_dir = os.path.join(object_data_dir, obs_id)
             d.download_and_reprocess_obsid(object_data_dir, obs_id)
             print("Done!", end = "")
         except Exception as e:
+            #The partial download is kept, running again resumes at the stage that failed
             print("Error", e, end = "")
-            shutil.rmtree(obs_dir)
 
-root = ctk.CTk()
-ctk.set_appearance_mode("Dark")
-root.geometry("600x400")
-root.resizable(0, 0)
-root.title("Download Chandra Data")
+if __name__ == "__main__":
+    root = ctk.CTk()
+    ctk.set_appearance_mode("Dark")
+    root.geometry("600x400")
+    root.resizable(0, 0)
+    root.title("Download Chandra Data")
 
-def enable_paste(event):
-    event.widget.event_generate("<<Paste>>")
+    def enable_paste(event):
+        event.widget.event_generate("<<Paste>>")
 
-title_label = ctk.CTkLabel(root, text = "Download Chandra Data", font = ("Helvetica", 45), text_color = "white")
-title_label.place(relx = 0.5, rely = 0.28, anchor = ctk.CENTER)
+    title_label = ctk.CTkLabel(root, text = "Download Chandra Data", font = ("Helvetica", 45), text_color = "white")
+    title_label.place(relx = 0.5, rely = 0.28, anchor = ctk.CENTER)
 
-labels = [("Object", ""), ("Output Directory", ""), ("Observation ID", "")]
-entries = []
+    labels = [("Object", ""), ("Output Directory", ""), ("Observation ID", "")]
+    entries = []
 
-start_y = 190
-spacing = 40
+    start_y = 190
+    spacing = 40
 
-for i, label_value in enumerate(labels):
-    label_text, value = label_value
-    label = ctk.CTkLabel(root, text = label_text + ":", anchor = "e", width = 150, text_color = "white")
-    label.place(x = 5, y = start_y + i * spacing)
-    entry = ctk.CTkEntry(root, width = 300, text_color = "white")
-    entry.insert(0, value)  
-    entry.place(x = 160, y = start_y + i * spacing)
-    entries.append(entry)
+    for i, label_value in enumerate(labels):
+        label_text, value = label_value
+        label = ctk.CTkLabel(root, text = label_text + ":", anchor = "e", width = 150, text_color = "white")
+        label.place(x = 5, y = start_y + i * spacing)
+        entry = ctk.CTkEntry(root, width = 300, text_color = "white")
+        entry.insert(0, value)  
+        entry.place(x = 160, y = start_y + i * spacing)
+        entries.append(entry)
 
-for entry in entries:
-    entry.bind("<Control-v>", enable_paste)
+    for entry in entries:
+        entry.bind("<Control-v>", enable_paste)
 
-button = ctk.CTkButton(master = root, text = "Start", command = processing, text_color = "white")
-button.place(relx = 0.5, rely = 0.9, anchor = ctk.CENTER)
+    button = ctk.CTkButton(master = root, text = "Start", command = processing, text_color = "white")
+    button.place(relx = 0.5, rely = 0.9, anchor = ctk.CENTER)
 
-root.focus_force()
-root.mainloop()
\ No newline at end of file
+    root.focus_force()
+    root.mainloop()
\ No newline at end of file
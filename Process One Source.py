@@ -5,8 +5,10 @@ import pandas as pd
 import sys
 sys.path.append(os.getcwd())
 sys.path.append(os.path.join(os.getcwd(), "ChandraPy"))
+from ChandraPy import Batch as batch
 from ChandraPy import Lightcurves as lc
 from ChandraPy import Download as d
+from ChandraPy import Tracing as tracing
 from ChandraPy import Utilities as utils
 import shutil
 
@@ -35,39 +37,29 @@ def processing():
     print(f"\n{bar}\n")
 
     if obs_id == "":
-        not_processed = 0
-        to_remove = []
-        utils.retrieve_obs_ids(source_dir, source)
+        #Set CHANDRAPY_CATALOG to the path of an Obs. ID catalog to look the source up in it, and CHANDRAPY_OFFLINE to 1 to never query the archive
+        utils.retrieve_obs_ids(source_dir, source, os.environ.get("CHANDRAPY_CATALOG"), os.environ.get("CHANDRAPY_OFFLINE", "0") == "1")
         df = pd.read_csv(os.path.join(source_dir, f"{source}.csv"), dtype = str)
-        for i, obs_id in enumerate(df["Observation ID"]):
-            obs_dir = os.path.join(source_dir, obs_id)
-            data_dir = os.path.join(galaxy_data_dir, obs_id)
-            os.makedirs(obs_dir, exist_ok = True)
-
-            if not os.path.exists(os.path.join(data_dir, f"{obs_id}_evt2.fits")):
-                print(f"Obs. ID {obs_id} not found, downloading...", end = "")
-                d.download_and_reprocess_obsid(galaxy_data_dir, obs_id)
+        jobs = [(source, obs_id) for obs_id in df["Observation ID"]]
+        finished = []
+
+        def report(result):
+            finished.append(result)
+            status = result["Status"]
+            print(f"({len(finished)}/{len(jobs)}) Obs. ID {result['Observation ID']}...", end = "")
+            if status == "Done":
                 print("\033[92mDone!\033[0m")
+            elif status == "Unchanged":
+                print("\033[92mUnchanged\033[0m")
+            elif status == "Empty":
+                print("\033[93mEmpty\033[0m")
+            else:
+                print(f"\033[91mError, {result['Error'].strip().splitlines()[-1]}\033[0m")
 
-            print(f"({i + 1}/{len(df['Observation ID'])}) Obs. ID {obs_id}...", end = "")
-
-            try:
-                utils.save_source_region(obs_dir, data_dir, source)
-                processed = lc.lightcurve_generation(obs_dir, data_dir, source, binsize, p0, likelihood_threshold)
-                if not processed:
-                    not_processed += 1
-                    to_remove.append(obs_dir)
-                    print("\033[93mEmpty\033[0m")
-                else:
-                    print("\033[92mDone!\033[0m")
-            except Exception as e:
-                not_processed += 1
-                processed = False
-                to_remove.append(obs_dir)
-                print(f"\033[91mError, {e}\033[0m")
-
-        for obs_dir in to_remove:
-            shutil.rmtree(obs_dir, ignore_errors = True)
+        #Set CHANDRAPY_TRACE to the path of a JSON file to time every stage of the batch
+        trace_file = os.environ.get("CHANDRAPY_TRACE")
+        results = batch.run_batch(jobs, galaxy_data_dir, os.path.dirname(source_dir), binsize, p0, likelihood_threshold, callback = report, trace_file = trace_file, incremental = True)
+        not_processed = int((~results["Status"].isin(["Done", "Unchanged"])).sum())
 
         process_text = "Process Complete"
         count_text = f"{len(df['Observation ID']) - not_processed} / {len(df['Observation ID'])} light curves made"
@@ -78,6 +70,13 @@ def processing():
         print(f"   \033[92m{process_text}\033[0m")
         print(f"   {count_text}")
         print(f"\n{bar}\n")
+
+        if trace_file:
+            records = tracing.read_trace(trace_file)
+            print(tracing.summary(records).to_string(index = False, float_format = "{:.3f}".format))
+            print()
+            print(tracing.summary(records, by = "Job").to_string(index = False, float_format = "{:.3f}".format))
+            print(f"\nTrace written to {trace_file}\n")
     else:
         obs_dir = os.path.join(source_dir, obs_id)
         data_dir = os.path.join(galaxy_data_dir, obs_id)
@@ -105,35 +104,37 @@ def processing():
         if not processed:
             shutil.rmtree(obs_dir, ignore_errors = True)
 
-root = ctk.CTk()
-ctk.set_appearance_mode("Dark")
-root.geometry("750x500")
-root.resizable(0, 0)
-root.title("Process One Source")
-
-def enable_paste(event):
-    event.widget.event_generate("<<Paste>>")
-
-title_label = ctk.CTkLabel(root, text = "Process One Source", font = ("Helvetica", 45), text_color = "white")
-title_label.place(relx = 0.5, rely = 0.14, anchor = ctk.CENTER)
-labels = [("Galaxy", ""), ("Data Directory", ""), ("Output Directory", ""), ("Binsize", 500), ("Source", ""), ("Observation ID", ""), ("p0 value", 5), ("Likelihood Threshold", np.log(1e-4))]
-entries = []
-start_y = 110
-spacing = 40
-
-for i, label_value in enumerate(labels):
-    label_text, value = label_value
-    label = ctk.CTkLabel(root, text = label_text + ":", anchor = "e", width = 150, text_color = "white")
-    label.place(x = 80, y = start_y + i * spacing)
-    entry = ctk.CTkEntry(root, width = 300, text_color = "white")
-    entry.insert(0, value)  
-    entry.place(x = 235, y = start_y + i * spacing)
-    entries.append(entry)
-
-for entry in entries:
-    entry.bind("<Control-v>", enable_paste)
-
-button = ctk.CTkButton(master = root, text = "Start", command = processing, text_color = "white")
-button.place(relx = 0.5, rely = 0.9, anchor = ctk.CENTER)
-root.focus_force()
-root.mainloop() 
\ No newline at end of file
+#Worker processes re-import this script when they are spawned, so the GUI is only built when it is run directly
+if __name__ == "__main__":
+    root = ctk.CTk()
+    ctk.set_appearance_mode("Dark")
+    root.geometry("750x500")
+    root.resizable(0, 0)
+    root.title("Process One Source")
+
+    def enable_paste(event):
+        event.widget.event_generate("<<Paste>>")
+
+    title_label = ctk.CTkLabel(root, text = "Process One Source", font = ("Helvetica", 45), text_color = "white")
+    title_label.place(relx = 0.5, rely = 0.14, anchor = ctk.CENTER)
+    labels = [("Galaxy", ""), ("Data Directory", ""), ("Output Directory", ""), ("Binsize", 500), ("Source", ""), ("Observation ID", ""), ("p0 value", 5), ("Likelihood Threshold", np.log(1e-4))]
+    entries = []
+    start_y = 110
+    spacing = 40
+
+    for i, label_value in enumerate(labels):
+        label_text, value = label_value
+        label = ctk.CTkLabel(root, text = label_text + ":", anchor = "e", width = 150, text_color = "white")
+        label.place(x = 80, y = start_y + i * spacing)
+        entry = ctk.CTkEntry(root, width = 300, text_color = "white")
+        entry.insert(0, value)  
+        entry.place(x = 235, y = start_y + i * spacing)
+        entries.append(entry)
+
+    for entry in entries:
+        entry.bind("<Control-v>", enable_paste)
+
+    button = ctk.CTkButton(master = root, text = "Start", command = processing, text_color = "white")
+    button.place(relx = 0.5, rely = 0.9, anchor = ctk.CENTER)
+    root.focus_force()
+    root.mainloop() 
\ No newline at end of file
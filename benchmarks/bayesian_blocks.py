@@ -0,0 +1,53 @@
+import argparse
+from astropy.stats import bayesian_blocks as astropy_bayesian_blocks
+import numpy as np
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import synthetic
+from ChandraPy import Blocks as blocks
+
+def timed(function, *args, **kwargs):
+    """Calls a function and returns its result along with the wall-clock time it took.
+
+    Args:
+        function (callable): Function to be timed.
+
+    Returns:
+        tuple(result, elapsed): Tuple containing the return value of the function and the time taken (s).
+    """
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark ChandraPy's pruned Bayesian Blocks against astropy.stats.bayesian_blocks")
+    parser.add_argument("--sizes", type = float, nargs = "+", default = [1e3, 1e4, 1e5, 1e6], help = "Numbers of events to time")
+    parser.add_argument("--p0", type = float, default = 5, help = "Value of p0")
+    parser.add_argument("--max-astropy", type = float, default = 1e5, help = "Largest event list to run through astropy, which is O(N^2)")
+    parser.add_argument("--max-candidates", type = int, default = None, help = "Also time the memory-bounded mode with this many candidates")
+    parser.add_argument("--seed", type = int, default = 1, help = "Random seed")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'Events':>10} {'Blocks':>8} {'ChandraPy (s)':>14} {'Bounded (s)':>12} {'Astropy (s)':>12} {'Speedup':>8} {'Same':>5}")
+    for size in args.sizes:
+        times = synthetic.flaring_times(int(size), rng)
+        edges, elapsed = timed(blocks.bayesian_blocks, times, args.p0)
+
+        bounded_text = "-"
+        if args.max_candidates is not None:
+            _, bounded_elapsed = timed(blocks.bayesian_blocks, times, args.p0, args.max_candidates)
+            bounded_text = f"{bounded_elapsed:.3f}"
+
+        astropy_text, speedup_text, same_text = "skipped", "-", "-"
+        if size <= args.max_astropy:
+            astropy_edges, astropy_elapsed = timed(astropy_bayesian_blocks, times, fitness = "events", p0 = args.p0)
+            astropy_text = f"{astropy_elapsed:.3f}"
+            speedup_text = f"{astropy_elapsed / elapsed:.1f}x"
+            same_text = str(np.array_equal(edges, astropy_edges))
+
+        print(f"{int(size):>10} {len(edges) - 1:>8} {elapsed:>14.3f} {bounded_text:>12} {astropy_text:>12} {speedup_text:>8} {same_text:>5}")
@@ -0,0 +1,63 @@
+import argparse
+import matplotlib
+matplotlib.use("agg")
+from matplotlib import pyplot as plt
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import synthetic
+from ChandraPy import Plotting as plot
+
+def render(times, binsize, image_file, max_points, dpi = None):
+    """Draws the event-level panels of the light curve figure (counts, rate and cumulative counts) at the width 'lightcurve_generation'
+       uses for the bin size, saves it and returns the time taken and the size of the file.
+
+    Args:
+        times (numpy.ndarray): Array of photon arrival times (s).
+        binsize (int/float): Size of bins (s).
+        image_file (str): Absolute path to the image to be saved, its extension sets the format.
+        max_points (int): Number of points above which lines are decimated, None plots every point.
+        dpi (int, optional): Resolution of raster figures (dots per inch). Defaults to None.
+
+    Returns:
+        tuple(elapsed, size): Tuple containing the time taken to draw and save the figure (s) and the size of the file (bytes).
+    """
+
+    start = time.perf_counter()
+    edges = np.arange(times[0], times[-1] + binsize, binsize)
+    counts, _ = np.histogram(times, edges)
+    width = 12 * (500 / (float(binsize) if 250 <= float(binsize) < 500 else (2 * float(binsize) if float(binsize) < 250 else 500)))
+
+    fig, (counts_plot, rate_plot, cumulative_counts_plot) = plt.subplots(nrows = 3, ncols = 1, figsize = (width, 12), layout = "constrained")
+    plt.sca(counts_plot)
+    plot.counts_plotter(plt, edges[:-1] / 1000, counts, "purple", max_points = max_points)
+    plt.sca(rate_plot)
+    plot.rate_plotter(plt, edges[:-1] / 1000, counts / binsize, "black", max_points = max_points)
+    plt.sca(cumulative_counts_plot)
+    plot.cumulative_counts_plotter(plt, times / 1000, max_points = max_points)
+    fig.savefig(image_file, bbox_inches = "tight", dpi = dpi)
+    plt.close(fig)
+
+    return time.perf_counter() - start, os.path.getsize(image_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark rendering of the event-level light curve panels with and without decimation")
+    parser.add_argument("--sizes", type = float, nargs = "+", default = [1e3, 1e4, 1e5, 1e6], help = "Numbers of events to render")
+    parser.add_argument("--binsize", type = float, default = 50, help = "Size of bins (s), which sets the width of the figure")
+    parser.add_argument("--max-points", type = int, default = 4000, help = "Number of points above which lines are decimated")
+    parser.add_argument("--dpi", type = int, default = 150, help = "Resolution of PNG output")
+    parser.add_argument("--seed", type = int, default = 1, help = "Random seed")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    modes = [("Full SVG", None, "svg"), ("Decimated SVG", args.max_points, "svg"), ("Decimated PNG", args.max_points, "png")]
+    print(f"{'Events':>10} {'Mode':>14} {'Render (s)':>11} {'Size (kB)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            times = synthetic.flaring_times(int(size), rng)
+            for name, max_points, image_format in modes:
+                elapsed, file_size = render(times, args.binsize, os.path.join(directory, f"figure.{image_format}"), max_points, args.dpi)
+                print(f"{int(size):>10} {name:>14} {elapsed:>11.3f} {file_size / 1024:>10.1f}")
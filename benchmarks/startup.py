@@ -0,0 +1,93 @@
+import argparse
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import suite
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Modules timed, with the heavy dependencies each must not import. Plotting dependencies are only allowed once a figure is drawn.
+modules = {"ChandraPy": ["pandas", "astropy", "scipy", "matplotlib", "ciao_contrib"],
+           "ChandraPy.Tracing": ["pandas", "astropy", "scipy", "matplotlib", "ciao_contrib"],
+           "ChandraPy.Download": ["astropy", "scipy", "matplotlib", "ciao_contrib"],
+           "ChandraPy.Store": ["astropy", "scipy", "matplotlib", "ciao_contrib"],
+           "ChandraPy.Lightcurves": ["astropy", "scipy", "matplotlib", "ciao_contrib"],
+           "ChandraPy.Batch": ["astropy", "scipy", "matplotlib", "ciao_contrib"]
+           }
+
+_probe = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+def measure(module):
+    """Imports a module in a fresh interpreter, as a worker process or a short command line run would.
+
+    Args:
+        module (str): Name of the module.
+
+    Returns:
+        tuple(elapsed, loaded): Tuple containing the time taken by the import (s) and the names of all modules loaded afterwards.
+    """
+
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-c", _probe.format(module = module)], cwd = root, env = env, capture_output = True, text = True, check = True).stdout
+    probe = json.loads(output.strip().splitlines()[-1])
+
+    return probe["elapsed"], probe["modules"]
+
+def run(module, forbidden, repeats):
+    """Times the import of a module and checks which heavy dependencies it loads.
+
+    Args:
+        module (str): Name of the module.
+        forbidden (list): Top level packages the import must not load.
+        repeats (int): Number of fresh interpreters the import is timed in.
+
+    Returns:
+        dict: Dictionary with keys 'module', 'times' (s), 'best' (s), 'median' (s) and 'loaded' (forbidden packages that were loaded).
+    """
+
+    times = []
+    loaded = set()
+    for _ in range(repeats):
+        elapsed, names = measure(module)
+        times.append(elapsed)
+        loaded.update(name.split(".")[0] for name in names)
+
+    return {"module": module, "times": times, "best": min(times), "median": float(np.median(times)), "loaded": sorted(loaded.intersection(forbidden))}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Time 'import ChandraPy' and its modules in fresh interpreters, and check heavy dependencies are only loaded when used")
+    parser.add_argument("--budget", type = float, default = 0.1, help = "Largest median time allowed for 'import ChandraPy' (s)")
+    parser.add_argument("--repeats", type = int, default = 5, help = "Number of fresh interpreters each import is timed in")
+    parser.add_argument("--output", default = None, help = "JSON file the results are written to")
+    args = parser.parse_args()
+
+    results = [run(module, forbidden, args.repeats) for module, forbidden in modules.items()]
+    failures = []
+    print(f"{'Module':>22} {'Best (s)':>10} {'Median (s)':>11} Heavy imports")
+    for result in results:
+        print(f"{result['module']:>22} {result['best']:>10.4f} {result['median']:>11.4f} {', '.join(result['loaded']) or '-'}")
+        if result["loaded"]:
+            failures.append(f"{result['module']} imports {', '.join(result['loaded'])}")
+
+    package = results[0]
+    if package["median"] > args.budget:
+        failures.append(f"import ChandraPy took {package['median']:.4f}s, over the budget of {args.budget:.4f}s")
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"environment": suite.environment(), "parameters": vars(args), "results": results}, file, indent = 4)
+        print(f"Results written to {args.output}")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
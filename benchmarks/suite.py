@@ -0,0 +1,228 @@
+import argparse
+import datetime
+import json
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import synthetic
+
+benchmarks = ["binning", "bayesian_blocks", "merge_blocks", "hardness_ratios", "postage_stamps", "rendering"]
+
+class SkipBenchmark(Exception):
+    """Raised by 'build' when a benchmark doesn't apply to an observation, such as Hardness Ratios of HRC, which has no energy bands."""
+
+def prepare(context, rng):
+    """Adds the inputs shared by the benchmarks to the context of one simulated observation: the source's events inside its region, as the
+       pipeline extracts them, and their arrival times relative to 'TSTART' spaced out within frame times as 'compute_lightcurves' does.
+
+    Args:
+        context (dict): Dictionary with keys 'size', 'events', 'event_file', 'instrument', 'tstart', 'tstop', 'timedel', 'binsize', 'p0', 'position' and 'radius'.
+        rng (numpy.random.Generator): Random number generator.
+    """
+
+    events = context["events"]
+    x, y = context["position"]
+    inside = (events["x"] - x) ** 2 + (events["y"] - y) ** 2 <= context["radius"] ** 2
+    context["source_events"] = {column: values[inside] for column, values in events.items()}
+    context["event_times"] = context["source_events"]["time"] - context["tstart"] + rng.uniform(0, context["timedel"], int(inside.sum()))
+
+def _blocks(context):
+    if "bin_edges" not in context:
+        from astropy.stats import histogram
+        context["bin_edges"] = build("bayesian_blocks", context)()
+        context["counts_bb"], _ = histogram(context["event_times"], context["bin_edges"])
+
+    return context["bin_edges"], context["counts_bb"]
+
+def _lightcurve(context):
+    if "lightcurve" not in context:
+        context["lightcurve"] = build("binning", context)()
+
+    return context["lightcurve"]
+
+def build(name, context):
+    """Returns the call a benchmark times for one simulated observation. Everything the call depends on is computed here, outside the timing.
+
+    Args:
+        name (str): Name of the benchmark, one of 'benchmarks'.
+        context (dict): Context of the observation, after 'prepare'.
+
+    Returns:
+        callable: Function without arguments running the benchmarked step once.
+    """
+
+    source_events = context["source_events"]
+    if name == "hardness_ratios" and context["instrument"] != "ACIS":
+        raise SkipBenchmark("Energy bands are only defined for ACIS")
+
+    if name == "binning":
+        from ChandraPy import Binning as binning
+        #HRC events are binned into the Broadband light curve alone, as 'compute_lightcurves' does
+        energies = source_events["energy"] if context["instrument"] == "ACIS" else None
+        return lambda: binning.multiband_lightcurves(source_events["time"], energies, context["tstart"], context["tstop"], [context["binsize"]], context["timedel"],
+                                                     [context["tstart"]], [context["tstop"]])[context["binsize"]]
+    if name == "bayesian_blocks":
+        from ChandraPy import Blocks as blocks
+        return lambda: blocks.bayesian_blocks(context["event_times"], context["p0"])
+    if name == "merge_blocks":
+        from ChandraPy import Blocks as blocks
+        bin_edges, counts_bb = _blocks(context)
+        return lambda: blocks.merge_blocks(bin_edges.copy(), counts_bb.copy(), np.log(1e-3))
+    if name == "hardness_ratios":
+        from ChandraPy import HardnessRatios as hrs
+        lightcurve = _lightcurve(context)
+        return lambda: hrs.hardness_ratios(lightcurve)
+    if name == "postage_stamps":
+        from ChandraPy import Spatial as spatial
+        from ChandraPy import Utilities as utils
+        def stamps():
+            #The sky index is built again every time, as it would be by a job on a fresh event file
+            spatial.clear_cache()
+            return utils.postage_stamps(context["event_file"], source_events, 256, 128)
+        return stamps
+    if name == "rendering":
+        from benchmarks import rendering
+        image_file = os.path.join(context["directory"], f"figure.{context['image_format']}")
+        return lambda: rendering.render(context["source_events"]["time"], context["binsize"], image_file, context["max_points"], context["dpi"])
+
+    raise ValueError(f"Unknown benchmark {name}")
+
+def run(name, context, repeats):
+    """Times a benchmark on one simulated observation. Benchmarks that can't run here, for example because CIAO or Matplotlib is missing,
+       or that don't apply to the observation are recorded as skipped rather than stopping the suite.
+
+    Args:
+        name (str): Name of the benchmark, one of 'benchmarks'.
+        context (dict): Context of the observation, after 'prepare'.
+        repeats (int): Number of timed calls.
+
+    Returns:
+        dict: Dictionary with keys 'benchmark', 'instrument', 'size' (events asked for), 'events' (events simulated), 'source_events', 'status' ('ok'/'skipped'/'error'), 'error', 'times' (s), 'best' (s) and 'median' (s).
+    """
+
+    record = {"benchmark": name, "instrument": context["instrument"], "size": context["size"], "events": len(context["events"]["time"]), "source_events": len(context["event_times"]),
+              "status": "ok", "error": "", "times": [], "best": None, "median": None}
+    try:
+        call = build(name, context)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            call()
+            record["times"].append(time.perf_counter() - start)
+    except (ImportError, SkipBenchmark) as e:
+        record["status"] = "skipped"
+        record["error"] = f"{type(e).__name__}: {e}"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    if record["times"]:
+        record["best"] = min(record["times"])
+        record["median"] = float(np.median(record["times"]))
+
+    return record
+
+def environment():
+    """Returns a description of where the suite ran, so results from different machines and releases can be told apart.
+
+    Returns:
+        dict: Dictionary with keys 'created', 'commit', 'python', 'numpy', 'platform' and 'processor'.
+    """
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {"created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine()
+            }
+
+def compare(results, baseline, tolerance = 1.25):
+    """Compares the best times of two runs of the suite, matching benchmarks by name, instrument and number of events asked for.
+
+    Args:
+        results (dict): Output of this run.
+        baseline (dict): Output of an earlier run, such as the last release.
+        tolerance (float, optional): Ratio of best times above which a benchmark counts as a regression. Defaults to 1.25.
+
+    Returns:
+        list: List of tuples (benchmark, instrument, size, baseline best, best, ratio, regressed) for the benchmarks both runs timed.
+    """
+
+    key = lambda record: (record["benchmark"], record["instrument"], record["size"])
+    previous = {key(record): record for record in baseline["results"] if record["best"] is not None}
+    rows = []
+    for record in results["results"]:
+        old = previous.get(key(record))
+        if old is None or record["best"] is None:
+            continue
+        ratio = record["best"] / old["best"] if old["best"] > 0 else np.inf
+        rows.append((*key(record), old["best"], record["best"], ratio, ratio > tolerance))
+
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Time the steps of the light curve pipeline on synthetic event lists, without CIAO or archive data")
+    parser.add_argument("--sizes", type = float, nargs = "+", default = [1e2, 1e3, 1e4, 1e5, 1e6], help = "Numbers of events in the simulated event lists")
+    parser.add_argument("--instruments", nargs = "+", default = ["ACIS"], choices = ["ACIS", "HRC"], help = "Instruments to simulate")
+    parser.add_argument("--benchmarks", nargs = "+", default = benchmarks, choices = benchmarks, help = "Benchmarks to run")
+    parser.add_argument("--repeats", type = int, default = 3, help = "Number of timed calls of each benchmark")
+    parser.add_argument("--duration", type = float, default = 5e4, help = "Length of the simulated observations (s)")
+    parser.add_argument("--timedel", type = float, default = 3.2, help = "ACIS frame time (s)")
+    parser.add_argument("--photon-index", type = float, default = 1.7, help = "Photon index of the source's power law spectrum")
+    parser.add_argument("--binsize", type = float, default = 500, help = "Size of bins (s)")
+    parser.add_argument("--p0", type = float, default = 5, help = "Value of p0 for Bayesian Blocks Segmentation")
+    parser.add_argument("--image-format", default = "png", help = "Format of the rendered figure")
+    parser.add_argument("--dpi", type = int, default = 100, help = "Resolution of raster figures")
+    parser.add_argument("--max-points", type = int, default = 4000, help = "Number of points above which plotted lines are decimated")
+    parser.add_argument("--seed", type = int, default = 1, help = "Random seed")
+    parser.add_argument("--output", default = "benchmark_results.json", help = "JSON file the results are written to")
+    parser.add_argument("--baseline", default = None, help = "JSON file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type = float, default = 1.25, help = "Slowdown against the baseline counted as a regression")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tstart = 6e8
+    position = (4096.5, 4096.5)
+    output = {"environment": environment(), "parameters": vars(args), "results": []}
+
+    print(f"{'Benchmark':>16} {'Instrument':>10} {'Events':>9} {'Source':>9} {'Best (s)':>10} {'Median (s)':>11} Status")
+    with tempfile.TemporaryDirectory() as directory:
+        for instrument in args.instruments:
+            for i, size in enumerate(args.sizes):
+                obs_id = f"9{i:04d}"
+                event_file, events = synthetic.simulate_observation(directory, obs_id, int(size), rng, instrument, args.duration, tstart, args.timedel, photon_index = args.photon_index, position = position)
+                context = {"size": int(size), "events": events, "event_file": event_file, "instrument": instrument, "tstart": tstart, "tstop": tstart + args.duration,
+                           "timedel": args.timedel if instrument == "ACIS" else 1.5625e-5, "binsize": args.binsize, "p0": args.p0, "position": position, "radius": 6.,
+                           "directory": directory, "image_format": args.image_format, "dpi": args.dpi, "max_points": args.max_points}
+                prepare(context, rng)
+                for name in args.benchmarks:
+                    record = run(name, context, args.repeats)
+                    output["results"].append(record)
+                    best = f"{record['best']:.4f}" if record["best"] is not None else "-"
+                    median = f"{record['median']:.4f}" if record["median"] is not None else "-"
+                    status = record["status"] if record["status"] == "ok" else f"{record['status']} ({record['error']})"
+                    print(f"{name:>16} {instrument:>10} {record['events']:>9} {record['source_events']:>9} {best:>10} {median:>11} {status}")
+
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent = 4)
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows = compare(output, baseline, args.tolerance)
+        print(f"\n{'Benchmark':>16} {'Instrument':>10} {'Size':>9} {'Baseline (s)':>13} {'Now (s)':>10} {'Ratio':>7}")
+        for name, instrument, size, old, new, ratio, regressed in rows:
+            print(f"{name:>16} {instrument:>10} {size:>9} {old:>13.4f} {new:>10.4f} {ratio:>7.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
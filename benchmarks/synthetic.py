@@ -0,0 +1,263 @@
+from astropy.io import fits
+import numpy as np
+import os
+
+def source_rate(times, rate, flares = (), eclipses = ()):
+    """Returns the source count rate at given times, a constant rate with Gaussian flares on top and eclipses where it drops to zero.
+
+    Args:
+        times (numpy.ndarray): Array of times (s).
+        rate (float): Quiescent count rate (counts/s).
+        flares (list, optional): List of tuples (peak time, width, peak rate) of Gaussian flares, with times in s and rates in counts/s. Defaults to ().
+        eclipses (list, optional): List of tuples (start, stop) of eclipses (s). Defaults to ().
+
+    Returns:
+        numpy.ndarray: Array of count rates (counts/s).
+    """
+
+    rates = np.full(len(times), float(rate))
+    for peak, width, peak_rate in flares:
+        rates += peak_rate * np.exp(-0.5 * ((times - peak) / width) ** 2)
+    for start, stop in eclipses:
+        rates[(times >= start) & (times < stop)] = 0.
+
+    return rates
+
+def arrival_times(rng, tstart, tstop, rate, flares = (), eclipses = (), timedel = 3.2):
+    """Draws photon arrival times of a Poisson process with the rate of 'source_rate', by thinning a constant-rate process at the peak rate.
+       Times are put at the middle of the frame they fall in, as in ACIS event lists.
+
+    Args:
+        rng (numpy.random.Generator): Random number generator.
+        tstart (float): Start of the observation (s).
+        tstop (float): End of the observation (s).
+        rate (float): Quiescent count rate (counts/s).
+        flares (list, optional): List of tuples (peak time, width, peak rate) of Gaussian flares. Defaults to ().
+        eclipses (list, optional): List of tuples (start, stop) of eclipses (s). Defaults to ().
+        timedel (float, optional): Frame time (s), 0 leaves times continuous. Defaults to 3.2.
+
+    Returns:
+        numpy.ndarray: Sorted array of photon arrival times (s).
+    """
+
+    peak_rate = float(rate) + sum(peak for _, _, peak in flares)
+    times = rng.uniform(tstart, tstop, rng.poisson(peak_rate * (tstop - tstart)))
+    if peak_rate > 0:
+        times = times[rng.uniform(0, peak_rate, len(times)) < source_rate(times, rate, flares, eclipses)]
+    if timedel > 0:
+        times = tstart + (np.floor((times - tstart) / timedel) + 0.5) * timedel
+        times = times[times < tstop]
+
+    return np.sort(times)
+
+def flaring_times(n_events, rng, duration = 1e5):
+    """Returns sorted photon arrival times of a source with a constant rate and a flare holding a fifth of the events, without the
+       instrument details of 'simulate_events', for benchmarking functions of event times alone.
+
+    Args:
+        n_events (int): Number of events.
+        rng (numpy.random.Generator): Random number generator.
+        duration (float, optional): Length of the observation (s). Defaults to 1e5.
+
+    Returns:
+        numpy.ndarray: Array of photon arrival times (s).
+    """
+
+    quiescent = rng.uniform(0, duration, n_events - n_events // 5)
+    flare = rng.normal(0.4 * duration, 0.01 * duration, n_events // 5)
+
+    return np.sort(np.clip(np.concatenate((quiescent, flare)), 0, duration))
+
+def power_law_energies(rng, n_events, photon_index = 1.7, energy_min = 200., energy_max = 10000.):
+    """Draws photon energies from a power law spectrum by inverting its cumulative distribution.
+
+    Args:
+        rng (numpy.random.Generator): Random number generator.
+        n_events (int): Number of events.
+        photon_index (float, optional): Photon index, the number of photons falls as E^-photon_index. Defaults to 1.7.
+        energy_min (float, optional): Lowest energy (eV). Defaults to 200.
+        energy_max (float, optional): Highest energy (eV). Defaults to 10000.
+
+    Returns:
+        numpy.ndarray: Array of energies (eV).
+    """
+
+    u = rng.uniform(0, 1, n_events)
+    if np.isclose(photon_index, 1):
+        return energy_min * (energy_max / energy_min) ** u
+
+    exponent = 1 - photon_index
+
+    return (energy_min ** exponent + u * (energy_max ** exponent - energy_min ** exponent)) ** (1 / exponent)
+
+def simulate_events(n_events, rng, instrument = "ACIS", duration = 5e4, tstart = 6e8, timedel = 3.2, background_fraction = 0.2, flares = None, eclipses = None,
+                    photon_index = 1.7, position = (4096.5, 4096.5), psf_sigma = 2., field_size = 1024., ccd_id = 7):
+    """Simulates the event list of one observation with a point source and a uniform background. The source count rate is set so the list
+       holds about 'n_events' events, with a flare holding a fifth of the source's counts and an eclipse unless they're given.
+
+    Args:
+        n_events (int): Expected number of events.
+        rng (numpy.random.Generator): Random number generator.
+        instrument (str, optional): 'ACIS' or 'HRC'. Defaults to 'ACIS'.
+        duration (float, optional): Length of the observation (s). Defaults to 5e4.
+        tstart (float, optional): Start of the observation (s). Defaults to 6e8.
+        timedel (float, optional): Frame time (s). Defaults to 3.2.
+        background_fraction (float, optional): Fraction of the events coming from the background. Defaults to 0.2.
+        flares (list, optional): List of tuples (peak time, width, peak rate) of flares, with times relative to 'tstart'. Defaults to None.
+        eclipses (list, optional): List of tuples (start, stop) of eclipses, relative to 'tstart'. Defaults to None.
+        photon_index (float, optional): Photon index of the source's power law spectrum. Defaults to 1.7.
+        position (tuple, optional): Sky x and y of the source (pixels). Defaults to (4096.5, 4096.5).
+        psf_sigma (float, optional): Width of the source's Gaussian point spread function (pixels). Defaults to 2.
+        field_size (float, optional): Side of the square the background covers (pixels). Defaults to 1024.
+        ccd_id (int, optional): ACIS CCD of the events. Defaults to 7.
+
+    Returns:
+        dict: Dictionary mapping lowercase column names ('time', 'x', 'y', 'detx', 'dety', 'pi', and 'energy'/'ccd_id' for ACIS or 'samp' for HRC) to arrays, sorted by time.
+    """
+
+    tstop = tstart + duration
+    timedel = timedel if instrument == "ACIS" else 0.
+    source_counts = n_events * (1 - background_fraction)
+    if flares is None:
+        flares = [(0.4 * duration, 0.01 * duration, 0.2 * source_counts / (0.01 * duration * np.sqrt(2 * np.pi)))]
+    if eclipses is None:
+        eclipses = [(0.7 * duration, 0.75 * duration)]
+    flares = [(tstart + peak, width, peak_rate) for peak, width, peak_rate in flares]
+    eclipses = [(tstart + start, tstart + stop) for start, stop in eclipses]
+
+    #The quiescent rate makes up the rest of the source counts over the time outside eclipses
+    flare_counts = sum(peak_rate * width * np.sqrt(2 * np.pi) for _, width, peak_rate in flares)
+    visible = duration - sum(stop - start for start, stop in eclipses)
+    rate = max(source_counts - flare_counts, 0.) / max(visible, 1.)
+
+    source_times = arrival_times(rng, tstart, tstop, rate, flares, eclipses, timedel)
+    background_times = arrival_times(rng, tstart, tstop, n_events * background_fraction / duration, timedel = timedel)
+    n_source = len(source_times)
+    n_background = len(background_times)
+
+    times = np.concatenate((source_times, background_times))
+    x = np.concatenate((rng.normal(position[0], psf_sigma, n_source), rng.uniform(position[0] - field_size / 2, position[0] + field_size / 2, n_background)))
+    y = np.concatenate((rng.normal(position[1], psf_sigma, n_source), rng.uniform(position[1] - field_size / 2, position[1] + field_size / 2, n_background)))
+    energies = np.concatenate((power_law_energies(rng, n_source, photon_index), rng.uniform(200., 10000., n_background)))
+    order = np.argsort(times, kind = "stable")
+
+    #Detector coordinates follow the sky with a fixed offset and a small dither
+    events = {"time": times[order],
+              "x": x[order],
+              "y": y[order],
+              "detx": x[order] + 10. + rng.normal(0, 8, len(times)),
+              "dety": y[order] - 10. + rng.normal(0, 8, len(times)),
+              "pi": np.clip(np.rint(energies[order] / 14.6), 1, 1024).astype(np.int32)
+              }
+    if instrument == "ACIS":
+        events["energy"] = energies[order]
+        events["ccd_id"] = np.full(len(times), ccd_id, dtype = np.int16)
+    else:
+        events["samp"] = np.clip(energies[order] / 40., 1, 500)
+
+    return events
+
+def write_event_file(data_dir, obs_id, events, instrument = "ACIS", tstart = 6e8, tstop = None, timedel = 3.2, ra_targ = 10.68, dec_targ = 41.27, ccd_id = 7, dtf = 0.98):
+    """Writes an event list as '{data_dir}/{Obs. ID}/{Obs. ID}_evt2.fits', with the EVENTS columns, header keywords and GTI extension
+       'lightcurve_generation' reads. For HRC, a dead time factor file '{Obs. ID}_dtf1.fits' is written too.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        events (dict): Dictionary of event columns, as returned by 'simulate_events'.
+        instrument (str, optional): 'ACIS' or 'HRC'. Defaults to 'ACIS'.
+        tstart (float, optional): Value of 'TSTART' (s). Defaults to 6e8.
+        tstop (float, optional): Value of 'TSTOP' (s). Defaults to None, in which case the time of the last event is used.
+        timedel (float, optional): Value of 'TIMEDEL' (s). Defaults to 3.2.
+        ra_targ (float, optional): Value of 'RA_TARG' (deg). Defaults to 10.68.
+        dec_targ (float, optional): Value of 'DEC_TARG' (deg). Defaults to 41.27.
+        ccd_id (int, optional): 'CCD_ID' of the GTI extension for ACIS. Defaults to 7.
+        dtf (float, optional): Dead time factor, written as 'DTCOR' and in the dead time factor file for HRC. Defaults to 0.98.
+
+    Returns:
+        str: Absolute path to the event file.
+    """
+
+    obs_id = str(obs_id)
+    tstop = float(tstop if tstop is not None else (events["time"][-1] if len(events["time"]) > 0 else tstart + 1))
+    timedel = timedel if instrument == "ACIS" else 1.5625e-5
+    directory = os.path.join(data_dir, obs_id)
+    os.makedirs(directory, exist_ok = True)
+
+    formats = {"time": "D", "x": "E", "y": "E", "detx": "E", "dety": "E", "pi": "J", "energy": "E", "ccd_id": "I", "samp": "E"}
+    columns = [fits.Column(name = column.upper(), format = formats[column], array = values) for column, values in events.items()]
+    events_hdu = fits.BinTableHDU.from_columns(columns, name = "EVENTS")
+    #Chandra-like tangent plane WCS of the sky pixels, centred on the target, so positions and off-axis angles can be found
+    names = [column.lower() for column in events_hdu.columns.names]
+    for column, ctype, cdelt, crval in [("x", "RA---TAN", -0.492 / 3600, ra_targ), ("y", "DEC--TAN", 0.492 / 3600, dec_targ)]:
+        if column in names:
+            index = names.index(column) + 1
+            for keyword, value in [("TCTYP", ctype), ("TCRPX", 4096.5), ("TCDLT", cdelt), ("TCRVL", crval), ("TCUNI", "deg")]:
+                events_hdu.header[f"{keyword}{index}"] = value
+    keywords = {"OBS_ID": obs_id, "INSTRUME": instrument, "TSTART": tstart, "TSTOP": tstop, "TIMEDEL": timedel, "RA_TARG": ra_targ, "DEC_TARG": dec_targ,
+                "RA_PNT": ra_targ, "DEC_PNT": dec_targ, "ROLL_PNT": 0., "TIMEREF": "SOLARSYS", "ASOLFILE": f"{obs_id}_asol1.fits"}
+    if instrument != "ACIS":
+        keywords["DTCOR"] = dtf
+    primary = fits.PrimaryHDU()
+    for keyword, value in keywords.items():
+        primary.header[keyword] = value
+        events_hdu.header[keyword] = value
+
+    gti_hdu = fits.BinTableHDU.from_columns([fits.Column(name = "START", format = "D", array = [tstart]), fits.Column(name = "STOP", format = "D", array = [tstop])], name = "GTI")
+    if instrument == "ACIS":
+        gti_hdu.header["CCD_ID"] = ccd_id
+
+    event_file = os.path.join(directory, f"{obs_id}_evt2.fits")
+    fits.HDUList([primary, events_hdu, gti_hdu]).writeto(event_file, overwrite = True)
+
+    if instrument != "ACIS":
+        dtf_times = np.arange(tstart, tstop, 1.025)
+        dtf_hdu = fits.BinTableHDU.from_columns([fits.Column(name = "TIME", format = "D", array = dtf_times), fits.Column(name = "DTF", format = "E", array = np.full(len(dtf_times), dtf))], name = "DTF")
+        fits.HDUList([fits.PrimaryHDU(), dtf_hdu]).writeto(os.path.join(directory, f"{obs_id}_dtf1.fits"), overwrite = True)
+
+    return event_file
+
+def write_region_file(obs_dir, source, obs_id, x = 4096.5, y = 4096.5, radius = 6.):
+    """Writes the circular source region 'lightcurve_generation' expects as '{source}_{Obs. ID}.reg', in place of 'Utilities.save_source_region'.
+
+    Args:
+        obs_dir (str): Absolute path to directory where light curves are to be saved.
+        source (str): Name of source.
+        obs_id (str): The Obs. ID Number.
+        x (float, optional): Sky x of the center (pixels). Defaults to 4096.5.
+        y (float, optional): Sky y of the center (pixels). Defaults to 4096.5.
+        radius (float, optional): Radius of the circle (pixels). Defaults to 6.
+
+    Returns:
+        str: Absolute path to the region file.
+    """
+
+    os.makedirs(obs_dir, exist_ok = True)
+    region_file = os.path.join(obs_dir, f"{source}_{obs_id}.reg")
+    with open(region_file, "w") as file:
+        file.write(f"circle({x},{y},{radius})\n")
+
+    return region_file
+
+def simulate_observation(data_dir, obs_id, n_events, rng, instrument = "ACIS", duration = 5e4, tstart = 6e8, timedel = 3.2, **kwargs):
+    """Simulates an observation with 'simulate_events' and writes it with 'write_event_file'.
+
+    Args:
+        data_dir (str): Absolute path to directory where data is saved.
+        obs_id (str): The Obs. ID Number.
+        n_events (int): Expected number of events.
+        rng (numpy.random.Generator): Random number generator.
+        instrument (str, optional): 'ACIS' or 'HRC'. Defaults to 'ACIS'.
+        duration (float, optional): Length of the observation (s). Defaults to 5e4.
+        tstart (float, optional): Start of the observation (s). Defaults to 6e8.
+        timedel (float, optional): Frame time (s). Defaults to 3.2.
+        **kwargs: Other arguments of 'simulate_events'.
+
+    Returns:
+        tuple(event_file, events): Tuple containing the absolute path to the event file and the dictionary of event columns.
+    """
+
+    events = simulate_events(n_events, rng, instrument, duration, tstart, timedel, **kwargs)
+    event_file = write_event_file(data_dir, obs_id, events, instrument, tstart, tstart + duration, timedel)
+
+    return event_file, events
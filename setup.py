@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name = "ChandraPy",
     version = "1.0",
-    packages = find_packages(),
+    packages = find_packages(exclude = ["benchmarks", "benchmarks.*"]),
     install_requires = [],
     license = "MIT",
     description = "ChandraPy is an open-source Python Package that simplifies and speeds up data processing using the Chandra X-Ray Observation",